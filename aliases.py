@@ -0,0 +1,156 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+import numpy as np
+
+# --- 發生單位名稱對照表：同一單位在不同年度的不同寫法（例如「7A病房」「7A 病房」「內科7A」）對應到同一個標準名稱 ---
+# 對照表存成 JSON，所有 session 共用；套用時只處理不重複的單位名稱，再以類別代碼查表換算
+DEPARTMENT_COLUMN = "發生單位"
+WARD_SUFFIX = "病房"
+SPACES = re.compile(r"\s+")
+CONTAIN_MAX_EXTRA = 2  # 較長的名稱最多多幾個字才視為包含關係（「急診」→「急診室」、「7A」→「內科7A」）
+SIMILAR_CUTOFF = 0.85
+MAX_CHAIN = 16  # 對照鏈（A→B→C）最多追幾層，避免循環
+
+
+# 比對用的名稱：全形半形統一、不分大小寫、去掉空白與結尾的「病房」
+def alias_key(name):
+    key = SPACES.sub("", unicodedata.normalize("NFKC", str(name))).lower()
+    return key.removesuffix(WARD_SUFFIX) or key
+
+
+# --- 自動建議：正規化後相同、名稱互相包含或字串相似的單位歸為一組 ---
+# 每組以件數最多的寫法為標準名稱；回傳 [(別名, 標準名稱, 理由)]，依標準名稱排列
+# 只比較不重複的單位名稱，成本與單位數有關，與資料筆數無關
+def suggest_aliases(counts, existing=None):
+    existing = existing or {}
+    names = [name for name in counts if name not in existing]
+    keys = {name: alias_key(name) for name in names}
+    parent = {name: name for name in names}
+    reasons = {}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(a, b, reason):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+            reasons.setdefault(a, reason)
+            reasons.setdefault(b, reason)
+
+    by_key = {}
+    for name in names:
+        by_key.setdefault(keys[name], []).append(name)
+    for group in by_key.values():
+        for name in group[1:]:
+            union(group[0], name, "寫法相同")
+
+    unique_keys = sorted(by_key, key=len)
+    for i, short in enumerate(unique_keys):
+        if len(short) < 2:
+            continue
+        # 英數代碼要完整出現：「7a」不算包含在「17a」中、「icu」不算包含在「micu」中
+        pattern = re.compile(rf"(?<![0-9a-z]){re.escape(short)}(?![0-9a-z])")
+        for long in unique_keys[i + 1:]:
+            if len(long) - len(short) > CONTAIN_MAX_EXTRA:
+                break
+            if pattern.search(long):
+                union(by_key[short][0], by_key[long][0], "名稱包含")
+    for key in unique_keys:
+        for match in difflib.get_close_matches(key, unique_keys, n=3, cutoff=SIMILAR_CUTOFF):
+            if match != key:
+                union(by_key[key][0], by_key[match][0], "字串相似")
+
+    groups = {}
+    for name in names:
+        groups.setdefault(find(name), []).append(name)
+    suggestions = []
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        # 件數最多的寫法當標準名稱，同數時取較短的名稱
+        canonical = min(group, key=lambda name: (-counts[name], len(name), name))
+        suggestions.extend((name, canonical, reasons.get(name, "")) for name in group if name != canonical)
+    return sorted(suggestions, key=lambda s: (s[1], s[0]))
+
+
+# --- 對照表：別名 -> 標準名稱，存成 JSON；衍生結果以 fingerprint 判斷是否過期 ---
+class AliasTable:
+    def __init__(self, path=None):
+        self.path = path
+        self.aliases = {}
+        self._resolved = {}  # 原始名稱 -> 標準名稱，跨資料集共用，對照表修改時清空
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.aliases = dict(json.load(f).get(DEPARTMENT_COLUMN, {}))
+        self.fingerprint = self._fingerprint()
+
+    # 對照表內容的雜湊：套用結果的快取鍵，內容相同時重新啟動後也相同
+    def _fingerprint(self):
+        text = json.dumps(sorted(self.aliases.items()), ensure_ascii=False)
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def _save(self):
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # 先寫暫存檔再換上，讀取端不會看到寫到一半的檔案
+        fd, staging = tempfile.mkstemp(prefix=".aliases-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({DEPARTMENT_COLUMN: self.aliases}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(staging, self.path)
+        except BaseException:
+            os.remove(staging)
+            raise
+
+    # 新增或修改別名；標準名稱為空或與別名相同時刪除該筆。replace 為 True 時以 mapping 取代整張表
+    def update(self, mapping, replace=False):
+        with self._lock:
+            if replace:
+                self.aliases = {}
+            for alias, canonical in mapping.items():
+                canonical = str(canonical).strip() if canonical is not None else ""
+                if not canonical or canonical == alias:
+                    self.aliases.pop(alias, None)
+                else:
+                    self.aliases[alias] = canonical
+            self._resolved = {}
+            self.fingerprint = self._fingerprint()
+            self._save()
+
+    def canonical(self, name):
+        with self._lock:
+            if name not in self._resolved:
+                target, seen = name, {name}
+                for _ in range(MAX_CHAIN):
+                    target = self.aliases.get(target, target)
+                    if target in seen:
+                        break
+                    seen.add(target)
+                self._resolved[name] = target
+            return self._resolved[name]
+
+    # 類別清單換算：回傳 (舊類別代碼 -> 新類別代碼, 新類別清單)；沒有任何名稱改變時回傳 None
+    def remap(self, categories):
+        targets = [self.canonical(name) for name in categories]
+        if targets == list(categories):
+            return None
+        new_categories = sorted(set(targets))
+        position = {name: i for i, name in enumerate(new_categories)}
+        return np.array([position[name] for name in targets], dtype=np.int32), new_categories
@@ -1,7 +1,21 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import re
+import os
+import datetime
+import hashlib
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from zoneinfo import ZoneInfo
+
+# 這裡只匯入不依賴 pandas 的模組；資料處理（pipeline、pandas、openpyxl、plotly）在需要時才載入，
+# 首頁不必等待這些套件匯入
+from cache import LRUCache
+from registry import DatasetRegistry
+from jobs import SHEET_DONE, SHEET_EMPTY, SHEET_FAILED, SHEET_PENDING, IngestJob, IngestJobs
+from store import DatasetStore
+from export import EXPORT_FORMATS, cached_export
+from diagnostics import Tracer
 
 # --- 頁面設定 ---
 st.set_page_config(page_title="異常事件戰情室 V7", layout="wide", page_icon="📈", initial_sidebar_state="collapsed")
@@ -16,6 +30,16 @@ if 'selected_year' not in st.session_state:
 if 'active_tab' not in st.session_state:
     st.session_state.active_tab = 0
 
+# --- 效能診斷：每次 rerun 開始時重設，結束時寫入這個 session 的歷史紀錄 ---
+if 'tracer' not in st.session_state:
+    st.session_state.tracer = Tracer()
+st.session_state.tracer.begin_run(
+    st.session_state.get("diagnostics_enabled", False), st.session_state.get("diagnostics_memory", False)
+)
+
+def trace_stage(name):
+    return st.session_state.tracer.stage(name)
+
 # --- 六版風格 CSS 樣式 ---
 st.markdown("""
     <style>
@@ -258,58 +282,883 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- 核心邏輯：事件類別清洗 ---
-def clean_event_category(text):
-    text = str(text).strip()
-    # 使用正則表達式只抓取「某某事件」這四個字
-    match = re.search(r'[\u4e00-\u9fa5]{2}事件', text)
-    return match.group(0) if match else "其他事件"
+# --- 資料集登錄表：以檔案內容雜湊 + 解析設定為鍵，所有 session 共用同一份唯讀資料集 ---
+# 記憶體預算涵蓋所有 session；正在被使用的資料集不會被淘汰
+def session_alive(session_id):
+    try:
+        from streamlit.runtime import Runtime
+        return not Runtime.exists() or Runtime.instance().is_active_session(session_id)
+    except Exception:
+        return True
+
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+@st.cache_resource
+def get_dataset_registry():
+    return DatasetRegistry(
+        max_entries=int(os.environ.get("INGEST_CACHE_MAX_ENTRIES", 8)),
+        max_bytes=int(float(os.environ.get("DATASET_MEMORY_BUDGET_MB", os.environ.get("INGEST_CACHE_MAX_MB", 512))) * 1024 * 1024),
+        is_alive=session_alive,
+    )
+
+# 增量合併用的單一工作表解析結果，以工作表指紋為鍵
+@st.cache_resource
+def get_sheet_cache():
+    return LRUCache(
+        max_entries=int(os.environ.get("INGEST_SHEET_CACHE_MAX_ENTRIES", 64)),
+        max_bytes=int(float(os.environ.get("INGEST_CACHE_MAX_MB", 512)) * 1024 * 1024),
+    )
+
+# --- 平行解析設定：小於門檻的檔案一律循序解析 ---
+DEFAULT_WORKERS = int(os.environ.get("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+PARALLEL_MIN_BYTES = int(float(os.environ.get("INGEST_PARALLEL_MIN_MB", 2)) * 1024 * 1024)
+CSV_CHUNK_ROWS = int(os.environ.get("INGEST_CSV_CHUNK_ROWS", 100_000))
+
+# 行程池跨 rerun 共用；改變工作數時關閉舊的池
+@st.cache_resource(max_entries=1, on_release=lambda pool: pool.shutdown(wait=False, cancel_futures=True))
+def get_process_pool(workers):
+    # Streamlit 伺服器是多執行緒的，用 spawn 避免 fork 複製到鎖住的狀態
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def render_ingest_settings():
+    with st.sidebar.expander("⚙️ 解析設定", expanded=False):
+        parallel = st.toggle("平行解析工作表", value=False, key="ingest_parallel", help="大型活頁簿可將各工作表分配到多個核心同時解析")
+        workers = st.number_input(
+            "工作行程數", min_value=1, max_value=max(1, os.cpu_count() or 1),
+            value=min(DEFAULT_WORKERS, max(1, os.cpu_count() or 1)), step=1,
+            key="ingest_workers", disabled=not parallel
+        )
+        incremental = st.toggle(
+            "增量合併（依單號去除重複）", value=False, key="ingest_incremental",
+            help="重新上傳同一份活頁簿時只解析有變動的工作表，並與上一版合併；單號重複時以較新的資料為準（僅適用 Excel）"
+        )
+        if incremental and st.button("清除合併結果", key="incremental_reset_btn"):
+            st.session_state.pop("incremental_state", None)
+        background = st.toggle(
+            "背景解析（先顯示已完成的工作表）", value=True, key="ingest_background", disabled=incremental,
+            help="活頁簿在背景逐表解析，統計與圖表先以已完成的工作表顯示；重複上傳同一份檔案會接上進行中的解析（僅適用 Excel）"
+        )
+    return parallel, int(workers), incremental, background and not incremental
+
+# 增量合併的結果依附在 session 上：每次上傳都以上一版資料集為基礎
+def load_incremental_data(data):
+    from incremental import load_incremental
+    from pipeline import INGEST_OPTIONS
+
+    source = hashlib.sha256(data).hexdigest()
+    state = st.session_state.get("incremental_state")
+    if state is None or state[0] != source:
+        previous = state[1] if state is not None else None
+        dataset, warnings, summary = load_incremental(data, INGEST_OPTIONS, previous, sheet_cache=get_sheet_cache())
+        state = (source, dataset if dataset is not None else previous, warnings, summary)
+        st.session_state.incremental_state = state
+    _, dataset, warnings, _ = state
+    # 合併結果只由工作表指紋決定，內容相同時各 session 共用同一份
+    if dataset is not None:
+        dataset = get_dataset_registry().acquire(("incremental", dataset.key), current_session_id(), lambda: dataset)
+    return dataset, warnings
+
+def render_incremental_panel():
+    state = st.session_state.get("incremental_state")
+    if state is None:
+        return
+    summary = state[3]
+    with st.sidebar.expander("🧩 增量合併", expanded=False):
+        st.caption(f"重新解析：{'、'.join(summary['parsed']) or '無'}")
+        st.caption(f"沿用：{'、'.join(summary['reused']) or '無'}")
+        if summary["kept"]:
+            st.caption(f"保留上一版：{'、'.join(summary['kept'])}")
+        st.caption(f"新增 {summary['added']:,} 筆、移除 {summary['removed']:,} 筆，重複單號 {summary['duplicates']:,} 筆")
+
+# --- 背景解析：進行中的工作跨 session 共用，同一份檔案重複上傳時接上同一個工作 ---
+INGEST_POLL_SECONDS = float(os.environ.get("INGEST_POLL_SECONDS", 1))
+SHEET_ICONS = {SHEET_PENDING: "⏳", SHEET_DONE: "✅", SHEET_EMPTY: "➖", SHEET_FAILED: "⚠️"}
+
+@st.cache_resource
+def get_ingest_jobs():
+    return IngestJobs(retention_seconds=int(os.environ.get("INGEST_JOB_RETENTION_SECONDS", 600)))
+
+# 進度每隔一段時間更新；有新的工作表完成時重跑整頁，KPI 與圖表改用新的部分資料集
+@st.fragment(run_every=INGEST_POLL_SECONDS)
+def render_ingest_progress(job):
+    sheets, _ = job.progress()
+    finished = sum(status != SHEET_PENDING for _, status, _ in sheets)
+    st.progress(
+        finished / max(len(sheets), 1),
+        text=f"背景解析中：已完成 {finished} / {len(sheets)} 個工作表，以下統計只包含已完成的工作表"
+    )
+    st.caption("　".join(
+        f"{SHEET_ICONS[status]} {sheet}" + (f"（{rows:,} 筆）" if rows is not None else "")
+        for sheet, status, rows in sheets
+    ))
+    if job.version != st.session_state.get("ingest_seen_version"):
+        st.rerun(scope="app")
+
+# 解析中回傳已完成工作表的部分資料集；完成後交給資料集登錄表，之後與同步解析的快取命中相同
+def load_in_background(key, data, parallel, workers):
+    from pipeline import sheet_steps
+
+    jobs = get_ingest_jobs()
+    executor = get_process_pool(workers) if parallel and workers > 1 and len(data) >= PARALLEL_MIN_BYTES else None
+    job = jobs.start(key, lambda: IngestJob(key, key[0], data, lambda: sheet_steps(data, executor)))
+    registry = get_dataset_registry()
+    if job.done:
+        try:
+            return registry.acquire(key, current_session_id(), job.result)
+        finally:
+            jobs.discard(key, job)
+    # 解析完成前不持有先前開啟的資料集，讓它可以被淘汰
+    registry.release(current_session_id())
+    st.session_state.ingest_seen_version = job.version
+    render_ingest_progress(job)
+    snapshot = job.snapshot()
+    # 第一個工作表完成前還沒有資料可顯示，由主畫面顯示載入中而不是讀取失敗
+    st.session_state.ingest_waiting = snapshot is None
+    return snapshot, list(job.warnings)
+
+def load_data(file, parallel=False, workers=1, incremental=False, background=False):
+    from pipeline import is_csv, parse_upload, upload_key
 
-def load_data(file):
     try:
-        xl = pd.ExcelFile(file)
-        all_data = []
-        
-        for sheet in xl.sheet_names:
-            try:
-                df_temp = pd.read_excel(file, sheet_name=sheet, header=None, nrows=25)
-                header_row = -1
-                for i, row in df_temp.iterrows():
-                    if "單號" in [str(x) for x in row.values]:
-                        header_row = i
-                        break
-                
-                if header_row != -1:
-                    df = pd.read_excel(file, sheet_name=sheet, header=header_row)
-                    df = df.loc[:, ~df.columns.duplicated()] # 刪除重複標題
-                    
-                    # 智慧對應：114年叫新事件類別，其他叫事件類別
-                    target_col = "新事件類別" if "新事件類別" in df.columns else "事件類別"
-                    
-                    if target_col in df.columns:
-                        # 重點：清理事件類別，只留「XX事件」
-                        df["事件類別"] = df[target_col].apply(clean_event_category)
-                    
-                    # 統一必要欄位
-                    rename_map = {"發生部門": "發生單位", "通報日期": "日期"}
-                    df.rename(columns=rename_map, inplace=True)
-                    
-                    # 篩選出需要的欄位並合併
-                    keep = ["單號", "日期", "事件類別", "發生單位", "事件描述"]
-                    valid_cols = [c for c in keep if c in df.columns]
-                    if valid_cols:  # 確保有有效欄位
-                        temp_df = df[valid_cols].copy()
-                        temp_df["年度"] = sheet
-                        all_data.append(temp_df)
-            except Exception as e:
-                st.warning(f"讀取工作表 '{sheet}' 時發生錯誤，已跳過：{str(e)}")
-                continue
+        data = file.getvalue()
+        csv_file = is_csv(file.name)
+        if incremental and not csv_file:
+            dataset, warnings = load_incremental_data(data)
+            for message in warnings:
+                st.warning(message)
+            return dataset
+        # CSV 沒有工作表名稱，年度預設取檔名，因此檔名也在快取鍵中
+        key = upload_key(data, file.name)
+        if background and not csv_file and key not in get_dataset_registry():
+            dataset, warnings = load_in_background(key, data, parallel, workers)
+            for message in warnings:
+                st.warning(message)
+            return dataset
 
-        return pd.concat(all_data, ignore_index=True) if all_data else None
+        def parse():
+            executor = get_process_pool(workers) if parallel and workers > 1 else None
+            return parse_upload(data, file.name, executor, min_bytes=PARALLEL_MIN_BYTES, csv_chunk_rows=CSV_CHUNK_ROWS)
+
+        # 同一份檔案同時被多個 session 上傳時只解析一次
+        result = get_dataset_registry().acquire(key, current_session_id(), parse)
+        # 快取命中時也要重新顯示各工作表的警告
+        dataset, warnings = result
+        for message in warnings:
+            st.warning(message)
+        return dataset
     except Exception as e:
-        st.error(f"讀取 Excel 檔案時發生錯誤：{str(e)}")
+        st.error(f"讀取檔案時發生錯誤：{str(e)}")
         return None
 
+# --- 資料集儲存區：上傳解析後可存成具名資料集，之後不必上傳即可開啟 ---
+STORE_DIR = os.environ.get("DATASET_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets"))
+
+@st.cache_resource
+def get_dataset_store():
+    return DatasetStore(STORE_DIR)
+
+# 只載入選取的年度：年度條件下推到 Parquet，其他年度不會讀進記憶體
+def render_store_picker():
+    manifests = get_dataset_store().list()
+    if not manifests:
+        return None, []
+    with st.sidebar.expander("🗄️ 已儲存的資料集", expanded=True):
+        names = [m["name"] for m in manifests]
+        name = st.selectbox(
+            "開啟資料集（未上傳檔案時使用）", [None] + names, index=1, key="store_dataset",
+            format_func=lambda n: "（不開啟）" if n is None else n
+        )
+        if name is None:
+            return None, []
+        manifest = manifests[names.index(name)]
+        saved_at = datetime.datetime.fromtimestamp(manifest["saved_at"], ZoneInfo("Asia/Taipei"))
+        st.caption(f"{manifest['rows']:,} 筆 · 儲存於 {saved_at:%Y-%m-%d %H:%M}")
+        years = st.multiselect("只載入年度", manifest["categories"].get("年度", []), key="store_years", placeholder="全部年度")
+    return name, years
+
+# 已儲存資料集在登錄表中的鍵與衍生結果的快取鍵；只載入部分年度時也要區分
+def stored_dataset_keys(manifest, years):
+    key = ("store", manifest["name"], manifest["saved_at"], tuple(sorted(years)))
+    dataset_key = manifest["key"] if not years else f"{manifest['key']}:{'|'.join(sorted(years))}"
+    return key, dataset_key
+
+def open_stored_dataset(name, years):
+    from dataset import EventDataset
+
+    try:
+        store = get_dataset_store()
+        manifest = store.manifest(name)
+        if manifest is None:
+            st.error(f"找不到資料集「{name}」")
+            return None
+        key, dataset_key = stored_dataset_keys(manifest, years)
+        return get_dataset_registry().acquire(
+            key, current_session_id(), lambda: EventDataset(store.load(name, filters={"年度": years}), key=dataset_key)
+        )
+    except Exception as e:
+        st.error(f"開啟資料集時發生錯誤：{str(e)}")
+        return None
+
+# --- 啟動預熱：第一個畫面送出後，在背景匯入資料處理模組並預先開啟資料集 ---
+# WARMUP_DATASET 設為 last 時開啟最近儲存的資料集，也可以指定名稱；未設定時只預先匯入模組
+WARMUP_DATASET = os.environ.get("WARMUP_DATASET", "").strip()
+
+def _warmup(registry, store, name):
+    import pipeline  # noqa: F401  pandas、openpyxl 等在這裡先載入
+    from dataset import EventDataset
+
+    if not name:
+        return
+    manifests = store.list()
+    manifest = manifests[0] if name == "last" and manifests else store.manifest(name)
+    if manifest is None:
+        return
+    key, dataset_key = stored_dataset_keys(manifest, [])
+    # 放進登錄表後立即釋放：之後開啟同一個資料集的 session 直接命中，記憶體不足時可被淘汰
+    registry.acquire(key, "warmup", lambda: EventDataset(store.load(manifest["name"]), key=dataset_key))
+    registry.release("warmup")
+
+# 每個伺服器行程只預熱一次
+@st.cache_resource
+def start_warmup():
+    thread = threading.Thread(
+        target=_warmup, args=(get_dataset_registry(), get_dataset_store(), WARMUP_DATASET), name="warmup", daemon=True
+    )
+    thread.start()
+    return thread
+
+def render_store_save(dataset, default_name):
+    with st.sidebar.expander("💾 儲存資料集", expanded=False):
+        name = st.text_input("資料集名稱", value=default_name, key="store_save_name")
+        if st.button("儲存", key="store_save_btn", disabled=not name.strip()):
+            try:
+                manifest = get_dataset_store().save(name, dataset.df, key=dataset.key)
+                st.success(f"已儲存「{manifest['name']}」（{manifest['rows']:,} 筆）")
+            except Exception as e:
+                st.error(f"儲存資料集時發生錯誤：{str(e)}")
+
+# --- 發生單位名稱對照表：存在資料集儲存區，所有 session 共用；套用時只換算類別代碼 ---
+ALIAS_FILE = os.environ.get("DEPARTMENT_ALIAS_FILE", os.path.join(STORE_DIR, "department_aliases.json"))
+
+@st.cache_resource
+def get_alias_table():
+    from aliases import AliasTable
+
+    return AliasTable(ALIAS_FILE)
+
+# 回傳套用對照表後的資料集；建議以原始的單位名稱與件數產生，已在對照表中的名稱不再建議
+def render_alias_panel(dataset):
+    import pandas as pd
+    from aliases import DEPARTMENT_COLUMN, suggest_aliases
+    from pipeline import apply_aliases
+
+    if DEPARTMENT_COLUMN not in dataset.df.columns:
+        return dataset
+    table = get_alias_table()
+    with st.sidebar.expander("🏷️ 單位名稱對照", expanded=False):
+        apply = st.toggle(
+            "套用單位名稱對照", value=True, key="aliases_apply",
+            help="同一單位的不同寫法（例如「7A病房」「7A 病房」「內科7A」）合併為標準名稱，單位排名與篩選都以標準名稱計算"
+        )
+        with trace_stage("單位名稱對照"):
+            aliased = apply_aliases(dataset, table) if apply else dataset
+        st.caption(
+            f"對照表 {len(table):,} 筆 · 本資料集 {len(dataset.df[DEPARTMENT_COLUMN].cat.categories):,} 種寫法"
+            f" → {len(aliased.df[DEPARTMENT_COLUMN].cat.categories):,} 個單位"
+        )
+
+        counts = cached_aggregate(dataset, {}, "department_counts", lambda: dataset.cube.select({}).counts_by(DEPARTMENT_COLUMN))
+        suggestions = cached_aggregate(
+            dataset, {"對照表": [table.fingerprint]}, "alias_suggestions",
+            lambda: suggest_aliases(counts.to_dict(), table.aliases)
+        )
+        if suggestions:
+            st.markdown("**建議合併**")
+            edited = st.data_editor(
+                pd.DataFrame([{"採用": True, "別名": a, "標準名稱": c, "理由": r} for a, c, r in suggestions]),
+                key=f"alias_suggestions_{table.fingerprint}", hide_index=True, use_container_width=True,
+                disabled=["別名", "理由"], column_config={"採用": st.column_config.CheckboxColumn(width="small")},
+            )
+            if st.button("加入對照表", key="alias_accept_btn", use_container_width=True):
+                table.update({row["別名"]: row["標準名稱"] for row in edited.to_dict("records") if row["採用"]})
+                st.rerun()
+
+        st.markdown("**對照表**")
+        edited_table = st.data_editor(
+            pd.DataFrame(sorted(table.aliases.items()), columns=["別名", "標準名稱"], dtype=object),
+            key=f"alias_table_{table.fingerprint}", num_rows="dynamic", hide_index=True, use_container_width=True,
+            column_config={"別名": st.column_config.TextColumn(), "標準名稱": st.column_config.TextColumn()},
+        )
+        if st.button("儲存對照表", key="alias_save_btn", use_container_width=True):
+            table.update({
+                row["別名"].strip(): row["標準名稱"] for row in edited_table.to_dict("records")
+                if isinstance(row["別名"], str) and row["別名"].strip()
+            }, replace=True)
+            st.rerun()
+    return aliased
+
+def render_cache_panel(cache):
+    stats = cache.stats()
+    with st.sidebar.expander("🧊 共用資料集", expanded=False):
+        st.caption(
+            f"命中 {stats['hits']} · 未命中 {stats['misses']} · "
+            f"命中率 {stats['hit_rate']:.0%} · 淘汰 {stats['evictions']}"
+        )
+        st.caption(
+            f"使用 {stats['bytes'] / 1024 ** 2:,.1f} / {stats['max_bytes'] / 1024 ** 2:,.0f} MB · "
+            f"{stats['entries']} / {stats['max_entries']} 筆"
+        )
+        st.caption(f"{stats['sessions']} 個 session 使用中 · 使用中的資料集 {stats['pinned_bytes'] / 1024 ** 2:,.1f} MB（不會被淘汰）")
+        entries = cache.entries()
+        if entries:
+            st.dataframe(
+                [
+                    {"資料集": str(key[1] if key[0] in ("store", "incremental") else key[0])[:12],
+                     "大小 (MB)": round(size / 1024 ** 2, 2), "使用中": refs}
+                    for key, size, refs in entries
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+def render_memory_panel(df):
+    with st.sidebar.expander("🧮 記憶體配置", expanded=False):
+        st.caption("比較原本 object 欄位與精簡格式（類別編碼 / Arrow 字串 / 日期）")
+        if st.button("產生記憶體報告", key="memory_report_btn", use_container_width=True):
+            from schema import memory_report
+
+            st.dataframe(memory_report(df), use_container_width=True, hide_index=True)
+
+# --- 表格欄位設定：日期欄位用日期格式顯示，其餘維持文字欄位 ---
+def table_column_config(df, cols):
+    import pandas as pd
+
+    config = {}
+    for col in cols:
+        width = "large" if col == "事件描述" else "medium"
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            config[col] = st.column_config.DateColumn(col, width=width, format="YYYY-MM-DD")
+        else:
+            config[col] = st.column_config.TextColumn(col, width=width)
+    return config
+
+# --- 匯出檔案快取：依資料列與格式快取在暫存目錄，被淘汰時刪除檔案 ---
+@st.cache_resource
+def get_export_cache():
+    return LRUCache(
+        max_entries=int(os.environ.get("EXPORT_CACHE_MAX_ENTRIES", 16)),
+        max_bytes=int(float(os.environ.get("EXPORT_CACHE_MAX_MB", 256)) * 1024 * 1024),
+        on_evict=lambda path: os.path.exists(path) and os.remove(path),
+    )
+
+def export_file(dataset, rows, fmt):
+    rows_key = "all" if rows is None else hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest()
+    return cached_export(get_export_cache(), (dataset.key, rows_key, fmt), fmt, lambda: dataset.view(rows))
+
+# 下載按鈕只在使用者點擊時才產生檔案（延遲下載），平常 rerun 不做任何編碼
+def render_download(dataset, rows, label, file_stem, key):
+    fmt_col, btn_col = st.columns([1, 2])
+    with fmt_col:
+        fmt = st.selectbox(
+            "格式", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0],
+            key=f"{key}_format", label_visibility="collapsed"
+        )
+    name, mime, ext = EXPORT_FORMATS[fmt]
+    with btn_col:
+        st.download_button(
+            f"{label} ({name})",
+            lambda: export_file(dataset, rows, fmt),
+            f"{file_stem}{ext}",
+            mime,
+            key=key,
+            use_container_width=True,
+        )
+
+# --- 分頁表格：只把目前頁面的資料列序列化送到瀏覽器 ---
+# 排序欄位、排序方向與頁碼存在 session state；總筆數直接由列號得到
+PAGE_SIZES = [50, 100, 200, 500]
+
+# 事件清單中的疑似重複標示：同一組的列標示相同組號，最早的一列以外加註「重複」
+DUPLICATE_COLUMN = "疑似重複"
+
+def duplicate_labels(duplicates, window):
+    clusters, repeats = duplicates.cluster[window], duplicates.repeat[window]
+    return [
+        None if cluster < 0 else f"#{cluster + 1} 重複" if repeat else f"#{cluster + 1}"
+        for cluster, repeat in zip(clusters.tolist(), repeats.tolist())
+    ]
+
+# flags：欄位名稱 -> 依列號產生標示的函式，只計算顯示中的列，放在表格最前面
+def render_paged_table(dataset, rows, cols, key, height, flags=None):
+    # 使用更好的表格容器支援完整滾動
+    st.markdown("""
+        <div class="dataframe-container">
+    """, unsafe_allow_html=True)
+    if not st.session_state.get("paged_tables", True):
+        with trace_stage(f"表格：{key}"):
+            view = dataset.view(rows)[cols]
+            for i, (name, label) in enumerate((flags or {}).items()):
+                view.insert(i, name, label(slice(None) if rows is None else rows))
+            st.dataframe(view, use_container_width=True, height=height, hide_index=True, column_config=table_column_config(view, cols))
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    total = dataset.count(rows)
+    c_sort, c_order, c_size, c_page = st.columns([2, 1, 1, 2])
+    with c_sort:
+        sort_col = st.selectbox(
+            "排序欄位", [None] + cols, format_func=lambda c: "（原始順序）" if c is None else c, key=f"{key}_sort"
+        )
+    with c_order:
+        ascending = st.selectbox(
+            "順序", [True, False], format_func=lambda a: "遞增" if a else "遞減",
+            key=f"{key}_ascending", disabled=sort_col is None
+        )
+    with c_size:
+        page_size = st.selectbox("每頁筆數", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    n_pages = max(1, math.ceil(total / page_size))
+    # 篩選條件改變後總頁數可能變少，先把頁碼夾回有效範圍
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    with c_page:
+        page = st.number_input(f"頁碼（共 {n_pages:,} 頁）", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+
+    start = (int(page) - 1) * page_size
+    with trace_stage(f"排序分頁：{key}"):
+        window = dataset.page(rows, sort_col, ascending, start, start + page_size)
+        page_df = dataset.df.take(window)[cols]
+        for i, (name, label) in enumerate((flags or {}).items()):
+            page_df.insert(i, name, label(window))
+    with trace_stage(f"表格：{key}"):
+        st.dataframe(page_df, use_container_width=True, height=height, hide_index=True, column_config=table_column_config(page_df, cols))
+    st.caption(f"顯示第 {start + 1:,}–{start + len(window):,} 筆，共 {total:,} 筆")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def render_diagnostics_panel(tracer):
+    with st.sidebar.expander("🩺 效能診斷", expanded=False):
+        st.toggle("記錄各階段耗時", value=False, key="diagnostics_enabled", help="關閉時不做任何紀錄，幾乎沒有額外成本")
+        st.toggle(
+            "追蹤記憶體配置（tracemalloc）", value=False, key="diagnostics_memory",
+            disabled=not st.session_state.get("diagnostics_enabled", False),
+            help="記錄各階段的峰值配置量；會拖慢解析等純 Python 的階段，且對整個伺服器行程生效"
+        )
+        run = tracer.last_run()
+        if run is None:
+            st.caption("尚無紀錄，開啟後下一次操作開始記錄")
+            return
+        st.caption(f"最近一次 rerun（{run['label']}）")
+        st.dataframe([{
+            "階段": "　" * r["depth"] + r["stage"],
+            "耗時 (ms)": round(r["seconds"] * 1000, 1),
+            "常駐記憶體變化 (MB)": None if r["rss_delta_mb"] is None else round(r["rss_delta_mb"], 2),
+            "峰值配置 (MB)": None if r["peak_alloc_mb"] is None else round(r["peak_alloc_mb"], 2),
+        } for r in run["stages"]], use_container_width=True, hide_index=True)
+        st.caption(f"最近 {len(tracer.runs)} 次 rerun 的百分位數")
+        st.dataframe(tracer.percentiles(), use_container_width=True, hide_index=True)
+        payloads = st.session_state.get("figure_payloads")
+        if payloads:
+            stats = get_figure_cache().stats()
+            st.caption(f"圖表 JSON 大小（圖表快取命中率 {stats['hit_rate']:.0%}，{stats['entries']} 張）")
+            st.dataframe(
+                [{"圖表": kind, "JSON (KB)": round(size / 1024, 1)} for kind, size in payloads.items()],
+                use_container_width=True, hide_index=True
+            )
+        c1, c2 = st.columns(2)
+        c1.download_button(
+            "匯出 JSON", tracer.to_json, file_name="dashboard_trace.json", mime="application/json",
+            key="diagnostics_download", help="Chrome trace 格式，可用 chrome://tracing 或 Perfetto 開啟"
+        )
+        if c2.button("清除紀錄", key="diagnostics_clear"):
+            tracer.clear()
+
+# --- 圖表快取：以彙總資料 + 版面設定的雜湊為鍵，所有 session 共用 ---
+@st.cache_resource
+def get_figure_cache():
+    from charts import FigureCache
+
+    return FigureCache(
+        max_entries=int(os.environ.get("FIGURE_CACHE_MAX_ENTRIES", 256)),
+        max_bytes=int(float(os.environ.get("FIGURE_CACHE_MAX_MB", 64)) * 1024 * 1024),
+    )
+
+# 取得（或建立）圖表，並記下送往瀏覽器的 JSON 大小
+def cached_figure(kind, *arrays):
+    with trace_stage(f"建立圖表：{kind}"):
+        fig, payload = get_figure_cache().figure(kind, *arrays)
+    st.session_state.setdefault("figure_payloads", {})[kind] = payload
+    return fig
+
+# --- 頁籤 ---
+TAB_LABELS = ["📌 統計總覽", "📈 趨勢分析", "📋 資料明細", "🔍 點擊詳情"]
+
+# 彙總結果依資料集與篩選條件快取在 session 中，切換頁籤時直接沿用
+def cached_aggregate(dataset, selections, name, compute):
+    if "aggregate_cache" not in st.session_state:
+        st.session_state.aggregate_cache = LRUCache(max_entries=64, max_bytes=64 * 1024 * 1024)
+    store = st.session_state.aggregate_cache
+    key = (dataset.key, tuple((col, tuple(values or ())) for col, values in sorted(selections.items())), name)
+    value = store.get(key)
+    if value is None:
+        value = compute()
+        store.put(key, value)
+    return value
+
+# --- 疑似重複通報：事件描述的 MinHash 簽章跨上傳共用，重新上傳時只計算新描述 ---
+@st.cache_resource
+def get_signature_store():
+    from duplicates import SignatureStore
+
+    return SignatureStore(max_bytes=int(float(os.environ.get("DUPLICATE_SIGNATURE_MAX_MB", 128)) * 1024 * 1024))
+
+def render_duplicate_settings():
+    with st.sidebar.expander("🧬 疑似重複通報", expanded=False):
+        detect = st.toggle(
+            "偵測疑似重複", value=False, key="duplicates_detect",
+            help="以事件描述的相似度找出同一事件被重複通報（不同單號或不同年度工作表）的資料列，並在事件清單中標示"
+        )
+        collapse = st.toggle(
+            "收合疑似重複（KPI 與圖表只計一次）", value=False, key="duplicates_collapse", disabled=not detect,
+            help="每組疑似重複只保留最早出現的一列"
+        )
+        threshold = st.slider(
+            "相似度門檻", min_value=0.6, max_value=0.95, value=0.8, step=0.05, key="duplicates_threshold", disabled=not detect,
+            help="兩則描述的字元片段重疊比例（Jaccard 相似度）達門檻即視為疑似重複"
+        )
+    return detect, collapse and detect, round(threshold, 2)
+
+def render_display_settings():
+    with st.sidebar.expander("🖥️ 顯示設定", expanded=False):
+        st.toggle("只計算目前頁籤", value=True, key="lazy_tabs", help="關閉後會在每次互動時計算全部四個頁籤的內容")
+        st.toggle("分頁顯示表格", value=True, key="paged_tables", help="關閉後會把整份篩選結果一次送到瀏覽器")
+
+# --- 圖表點選：圖表與點選處理包在片段中，點選只重跑這個片段，不會觸發整頁重跑 ---
+# 選取狀態會保留在元件上，只有選取內容改變時才更新 session state
+@st.fragment
+def selectable_chart(fig, key, handle_point):
+    with trace_stage(f"圖表：{key}"):
+        selected = st.plotly_chart(fig, use_container_width=True, key=key, on_select="rerun")
+    points = selected.selection.points if selected and hasattr(selected, 'selection') else []
+    signature = repr(points[0]) if points else None
+    # 整頁重跑前留下的提示訊息
+    message = st.session_state.pop(f"{key}_message", None)
+    if signature != st.session_state.get(f"{key}_handled"):
+        st.session_state[f"{key}_handled"] = signature
+        message = handle_point(points[0]) if points else None
+        # 傳統頁籤切換時不會重跑，點擊詳情頁籤已經畫好了，選取改變時要整頁重跑才會更新
+        if message and not st.session_state.get("lazy_tabs", True):
+            st.session_state[f"{key}_message"] = message
+            st.rerun(scope="app")
+    if message:
+        st.success(message)
+
+# 各圖表的點選處理：更新點選條件並回傳提示訊息
+def select_from_pie(point):
+    if hasattr(point, 'label') and point.label:
+        st.session_state.selected_event = point.label
+        return f"✅ 已選擇：{point.label}，請切換到「🔍 點擊詳情」頁籤查看"
+
+def select_from_dept_bar(point):
+    if hasattr(point, 'y') and point.y:
+        st.session_state.selected_dept = point.y
+        return f"✅ 已選擇：{point.y}，請切換到「🔍 點擊詳情」頁籤查看"
+
+def select_from_year_bar(point):
+    if hasattr(point, 'x') and point.x:
+        st.session_state.selected_year = str(point.x)
+        return f"✅ 已選擇：{point.x} 年，請切換到「🔍 點擊詳情」頁籤查看"
+
+def select_from_trend(point):
+    if hasattr(point, 'fullData') and hasattr(point.fullData, 'name'):
+        st.session_state.selected_event = point.fullData.name
+    if hasattr(point, 'x'):
+        st.session_state.selected_year = str(point.x)
+    return "✅ 已選擇圖表資料，請切換到「🔍 點擊詳情」頁籤查看"
+
+# --- 篩選下拉選單：預設全選 ---
+# 類別清單變動時（例如背景解析陸續加入工作表），原本全選的條件自動涵蓋新的類別
+def filter_multiselect(label, options, key):
+    previous = st.session_state.get(f"{key}_options")
+    if previous is not None and previous != options and set(st.session_state.get(key, [])) == set(previous):
+        st.session_state[key] = options
+    elif key in st.session_state and not set(st.session_state[key]) <= set(options):
+        # 選項改變（例如套用單位名稱對照）後，移除已不存在的選項
+        st.session_state[key] = [value for value in st.session_state[key] if value in options]
+    st.session_state[f"{key}_options"] = options
+    selected = st.multiselect(label, options, default=options if key not in st.session_state else None, key=key)
+    # 全選視同不篩選：欄位空白的列不屬於任何選項，全選時也要算進去
+    return [] if set(selected) == set(options) else selected
+
+# --- 各頁籤內容：只有目前顯示的頁籤會被執行 ---
+# 圖表的彙總表（pipeline.chart_tables）：第一欄為類別、「件數」欄為件數
+def table_arrays(table):
+    return table.iloc[:, 0].to_numpy(dtype=object), table["件數"].to_numpy()
+
+def render_overview(tables):
+    # 第一行：兩個主要圖表
+    col_l, col_r = st.columns([1, 1])
+
+    with col_l:
+        st.markdown("### 🎯 事件分布比率")
+        if not tables["event_counts"].empty:
+            fig_pie = cached_figure("pie", *table_arrays(tables["event_counts"]))
+            # 使用 on_select 處理點擊事件，點選時只重跑圖表所在的片段
+            selectable_chart(fig_pie, "pie_chart", select_from_pie)
+
+        else:
+            st.info("無資料可顯示")
+
+    with col_r:
+        st.markdown("### 🏢 單位發生次數排名")
+        if not tables["dept_rank"].empty:
+            fig_bar = cached_figure("dept_bar", *table_arrays(tables["dept_rank"]))
+            selectable_chart(fig_bar, "bar_chart", select_from_dept_bar)
+
+        else:
+            st.info("無資料可顯示")
+
+    # 第二行：年度分布和事件類別趨勢
+    st.markdown("<br>", unsafe_allow_html=True)
+    col_l2, col_r2 = st.columns([1, 1])
+
+    with col_l2:
+        st.markdown("### 📅 年度案件分布")
+        if not tables["year_counts"].empty:
+            fig_year = cached_figure("year_bar", *table_arrays(tables["year_counts"]))
+            selectable_chart(fig_year, "year_chart", select_from_year_bar)
+        else:
+            st.info("無資料可顯示")
+
+    with col_r2:
+        st.markdown("### 📊 事件類別統計")
+        if not tables["event_rank"].empty:
+            fig_event = cached_figure("event_bar", *table_arrays(tables["event_rank"]))
+            with trace_stage("圖表：event_chart"):
+                st.plotly_chart(fig_event, use_container_width=True, key="event_chart")
+        else:
+            st.info("無資料可顯示")
+
+# 月 / 週趨勢：由預先分箱的期間立方體切片，不必每次重新分組資料列
+TREND_UNITS = ["年度", "月", "週"]
+PERIOD_FIGURES = {"月": "month_trend", "週": "week_trend"}
+TREND_TOP_GROUPS = 10
+
+def render_period_trend(dataset, selections, counts, unit, group):
+    import numpy as np
+    import pandas as pd
+    from cube import PERIOD_AXIS
+
+    if counts is None:
+        st.info("資料中沒有日期欄位，無法依月 / 週顯示趨勢")
+        return
+    table = cached_aggregate(dataset, selections, f"{unit}_{group}_table", lambda: counts.pivot(group, PERIOD_AXIS))
+    totals = table.sum(axis=1)
+    active = np.flatnonzero(table.sum(axis=0).to_numpy())
+    if active.size == 0:
+        st.info("篩選結果中沒有可辨識的日期")
+        return
+    # 只畫件數最多的幾個分組，橫軸裁到第一個與最後一個有件數的期間
+    top = totals[totals > 0].sort_values(ascending=False, kind="stable").index[:TREND_TOP_GROUPS]
+    table = table.iloc[:, active[0]:active[-1] + 1]
+    per_period = table.to_numpy().sum(axis=0)
+    table = table.loc[top]
+    periods = pd.DatetimeIndex(table.columns).to_numpy()
+    matrix = table.to_numpy()
+
+    fig = cached_figure(PERIOD_FIGURES[unit], periods, table.index.to_numpy(dtype=object), matrix)
+    with trace_stage("圖表：period_trend"):
+        st.plotly_chart(fig, use_container_width=True, key="period_trend_chart")
+    if (totals > 0).sum() > TREND_TOP_GROUPS:
+        st.caption(f"圖中只顯示件數最多的 {TREND_TOP_GROUPS} 個{group}")
+
+    dated = int(counts.counts_by(PERIOD_AXIS, sort=False).sum())
+    peak = pd.Timestamp(periods[per_period.argmax()])
+    peak_label = peak.strftime("%Y-%m") if unit == "月" else peak.strftime("%Y-%m-%d 當週")
+    st.markdown(f"""
+    <div class="info-card">
+        <p><strong>期間數：</strong>{len(periods)}</p>
+        <p><strong>件數最多的{unit}：</strong>{peak_label}（{per_period.max()} 件）</p>
+        <p><strong>平均每{unit}件數：</strong>{round(per_period.mean(), 1)}</p>
+        <p><strong>日期空白或無法辨識：</strong>{counts.total() - dated} 件</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_trend(dataset, selections, tables, period_counts):
+    st.markdown("### 📈 跨年度案件趨勢分析")
+
+    col_unit, col_group = st.columns([1, 1])
+    unit = col_unit.radio("時間單位", TREND_UNITS, horizontal=True, key="trend_unit")
+    if unit != "年度":
+        group = col_group.radio("分組", ["事件類別", "發生單位"], horizontal=True, key="trend_group")
+        render_period_trend(dataset, selections, period_counts(unit), unit, group)
+        return
+
+    # 事件類別 × 年度的件數矩陣（不含空值），折線圖、熱力圖與統計都由這張表而來
+    table = tables["trend"].set_index("事件類別")
+    if not table.empty:
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        if not table.empty:
+            years = table.columns.to_numpy(dtype=object)
+            categories = table.index.to_numpy(dtype=object)
+            matrix = table.to_numpy()
+
+            # 折線圖
+            fig_trend = cached_figure("trend", years, categories, matrix)
+            selectable_chart(fig_trend, "trend_chart", select_from_trend)
+
+            st.markdown("<br>", unsafe_allow_html=True)
+
+            # 熱力圖
+            col_l3, col_r3 = st.columns([2, 1])
+            with col_l3:
+                st.markdown("#### 🔥 年度-事件類別熱力圖")
+                fig_heatmap = cached_figure("heatmap", years, categories, matrix)
+                with trace_stage("圖表：heatmap"):
+                    st.plotly_chart(fig_heatmap, use_container_width=True, key="heatmap")
+
+            with col_r3:
+                # 與 groupby().size() 的長表相同：只統計有件數的 (年度, 事件類別) 組合
+                present = matrix[matrix > 0]
+                st.markdown("#### 📊 趨勢統計")
+                st.markdown(f"""
+                <div class="info-card">
+                    <p><strong>總事件類別數：</strong>{len(categories)}</p>
+                    <p><strong>涵蓋年度數：</strong>{len(years)}</p>
+                    <p><strong>最高單年件數：</strong>{present.max()}</p>
+                    <p><strong>平均年度件數：</strong>{round(present.mean(), 1)}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("無資料可顯示")
+    else:
+        st.info("無資料可顯示")
+
+def render_data(dataset, filter_rows, duplicates=None):
+    st.markdown("### 📋 完整事件清單")
+
+    # 顯示資料統計：筆數直接由索引的列號得到，不需取出子表
+    n_rows = dataset.count(filter_rows)
+    col_info1, col_info2, col_info3 = st.columns(3)
+    with col_info1:
+        st.metric("顯示筆數", f"{n_rows:,}")
+    with col_info2:
+        st.metric("總欄位數", f"{len(dataset.df.columns)}")
+    with col_info3:
+        if n_rows > 0:
+            render_download(dataset, filter_rows, "📥 下載", "filtered_data", key="download_filtered")
+
+    if duplicates is not None:
+        st.caption(
+            f"🧬 疑似重複 {duplicates.n_clusters:,} 組、共 {duplicates.n_grouped:,} 筆（收合時排除 {duplicates.n_repeats:,} 筆）"
+            f" · 比對 {duplicates.docs:,} 則描述，其中 {duplicates.hashed:,} 則為新計算的簽章"
+        )
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # 資料表格
+    if n_rows > 0:
+        # 重新排列欄位順序
+        display_cols = ["年度", "單號", "日期", "事件類別", "發生單位", "事件描述"]
+        available_cols = [col for col in display_cols if col in dataset.df.columns]
+        other_cols = [col for col in dataset.df.columns if col not in display_cols]
+        final_cols = available_cols + other_cols
+
+        flags = None
+        if duplicates is not None:
+            flags = {DUPLICATE_COLUMN: lambda window: duplicate_labels(duplicates, window)}
+        render_paged_table(dataset, filter_rows, final_cols, key="data_table", height=500, flags=flags)
+    else:
+        st.warning("目前篩選條件下無資料可顯示")
+
+# 點擊詳情自成一個片段：快速選擇按鈕只重跑這個區塊
+@st.fragment
+def render_detail(dataset, filter_rows, counts):
+    st.markdown("### 🔍 圖表點擊詳情")
+    st.markdown("**提示：** 點擊上方圖表中的資料點，或使用下方快速選擇按鈕來查看詳細資料")
+
+    # 快速選擇按鈕區域
+    st.markdown("---")
+    st.markdown("#### 🎯 快速選擇")
+
+    col_quick1, col_quick2 = st.columns(2)
+
+    with col_quick1:
+        st.markdown("**事件類別快速選擇：**")
+        event_counts = counts.counts_by("事件類別")
+        if not event_counts.empty:
+            quick_cols = st.columns(min(3, len(event_counts)))
+            for idx, (event_name, count) in enumerate(event_counts.head(6).items()):
+                with quick_cols[idx % len(quick_cols)]:
+                    if st.button(f"{event_name}\n({count})", key=f"quick_event_{event_name}", use_container_width=True):
+                        st.session_state.selected_event = event_name
+                        st.session_state.selected_dept = None
+                        st.session_state.selected_year = None
+
+    with col_quick2:
+        st.markdown("**單位快速選擇：**")
+        dept_rank = counts.counts_by("發生單位").head(6)
+        if not dept_rank.empty:
+            quick_cols = st.columns(min(3, len(dept_rank)))
+            for idx, (dept_name, count) in enumerate(dept_rank.items()):
+                with quick_cols[idx % len(quick_cols)]:
+                    if st.button(f"{dept_name}\n({count})", key=f"quick_dept_{dept_name}", use_container_width=True):
+                        st.session_state.selected_dept = dept_name
+                        st.session_state.selected_event = None
+                        st.session_state.selected_year = None
+
+    st.markdown("---")
+
+    detail_rows = None
+    drill_down = {}
+
+    # 根據點擊的項目顯示對應資料
+    if st.session_state.selected_event:
+        st.success(f"✅ 已選擇事件類別：**{st.session_state.selected_event}**")
+        drill_down["事件類別"] = [st.session_state.selected_event]
+
+    if st.session_state.selected_dept:
+        st.info(f"🏢 已選擇單位：**{st.session_state.selected_dept}**")
+        drill_down["發生單位"] = [st.session_state.selected_dept]
+
+    if st.session_state.selected_year:
+        st.info(f"📅 已選擇年度：**{st.session_state.selected_year}**")
+        drill_down["年度"] = [st.session_state.selected_year]
+
+    # 在目前篩選結果的列號上再套用點選條件，同樣走索引
+    if drill_down:
+        detail_rows = dataset.rows(drill_down, base=filter_rows)
+
+    if detail_rows is not None and len(detail_rows) > 0:
+        st.markdown(f"#### 📊 符合條件的資料（共 {len(detail_rows)} 筆）")
+
+        # 顯示統計
+        stat_col1, stat_col2, stat_col3 = st.columns(3)
+        with stat_col1:
+            st.metric("案件數", len(detail_rows))
+        with stat_col2:
+            st.metric("涉及單位", dataset.nunique("發生單位", detail_rows))
+        with stat_col3:
+            st.metric("事件類型", dataset.nunique("事件類別", detail_rows))
+
+        # 顯示資料
+        display_cols = ["年度", "單號", "日期", "事件類別", "發生單位", "事件描述"]
+        available_cols = [col for col in display_cols if col in dataset.df.columns]
+
+        render_paged_table(dataset, detail_rows, available_cols, key="detail_table", height=400)
+
+        # 下載按鈕
+        render_download(
+            dataset,
+            detail_rows,
+            "📥 下載此篩選結果",
+            f"detail_{st.session_state.selected_event or 'data'}",
+            key="download_detail",
+        )
+    else:
+        st.info("👆 請使用上方的快速選擇按鈕，或點擊圖表中的資料點來查看詳細資訊")
+
 # --- UI 介面 - 六版風格 ---
 col_header1, col_header2 = st.columns([3, 1])
 with col_header1:
@@ -329,15 +1178,39 @@ with col_header2:
         st.session_state.selected_event = None
         st.session_state.selected_dept = None
         st.session_state.selected_year = None
-        st.rerun()
 
-uploaded_file = st.file_uploader("📁 上傳 Excel / CSV 檔案", type=["xlsx"], help="支援 .xlsx 格式，系統將自動分析多個工作表")
+uploaded_file = st.file_uploader("📁 上傳 Excel / CSV 檔案", type=["xlsx", "csv"], help="支援 .xlsx 與 .csv 格式，Excel 會自動分析多個工作表；CSV 以檔名作為年度（若檔案沒有年度欄位）")
+
+ingest_parallel, ingest_workers, ingest_incremental, ingest_background = render_ingest_settings()
+detect_duplicates, collapse_duplicates, duplicate_threshold = render_duplicate_settings()
+render_display_settings()
+stored_name, stored_years = render_store_picker() if not uploaded_file else (None, [])
+
+if uploaded_file or stored_name:
+    from pipeline import chart_tables, cube_view, kpi_summary, period_view, select_rows
 
-if uploaded_file:
-    with st.spinner("正在讀取和分析 Excel 檔案..."):
-        df = load_data(uploaded_file)
+    with st.spinner("正在讀取和分析檔案..."), trace_stage("載入資料"):
+        if uploaded_file:
+            dataset = load_data(
+                uploaded_file, parallel=ingest_parallel, workers=ingest_workers,
+                incremental=ingest_incremental, background=ingest_background
+            )
+        else:
+            dataset = open_stored_dataset(stored_name, stored_years)
+    ingest_waiting = st.session_state.pop("ingest_waiting", False)
+    render_cache_panel(get_dataset_registry())
+    if uploaded_file and dataset is not None and not dataset.partial:
+        render_store_save(dataset, os.path.splitext(os.path.basename(uploaded_file.name))[0])
+    if ingest_incremental:
+        render_incremental_panel()
+    # 儲存的資料集保留原始寫法，單位名稱對照在開啟時才套用
+    if dataset is not None and not dataset.df.empty:
+        dataset = render_alias_panel(dataset)
+    df = dataset.df if dataset is not None else None
     
     if df is not None and not df.empty:
+        render_memory_panel(df)
+        
         # --- 頂部篩選區 (簡潔下拉樣式 - 六版風格) ---
         st.markdown("""
             <div class="filter-container" style="padding: 1.5rem 2rem;">
@@ -351,493 +1224,133 @@ if uploaded_file:
         # 簡潔的三欄布局
         c1, c2, c3 = st.columns(3)
         with c1:
-            years = st.multiselect(
-                "年度", 
-                sorted(df["年度"].unique()), 
-                default=sorted(df["年度"].unique()),
-                key="filter_years"
-            )
+            years = filter_multiselect("年度", df["年度"].cat.categories.tolist(), "filter_years")
         with c2:
-            types = st.multiselect(
-                "事件類別", 
-                sorted(df["事件類別"].unique()), 
-                default=sorted(df["事件類別"].unique()),
-                key="filter_types"
-            )
+            types = filter_multiselect("事件類別", df["事件類別"].cat.categories.tolist(), "filter_types")
         with c3:
-            depts = st.multiselect(
-                "發生單位", 
-                sorted(df["發生單位"].unique()), 
-                default=sorted(df["發生單位"].unique()),
-                key="filter_depts"
-            )
+            depts = filter_multiselect("發生單位", df["發生單位"].cat.categories.tolist(), "filter_depts")
         
         # 重置按鈕單獨一行，右對齊
         col_reset1, col_reset2 = st.columns([5, 1])
+        with col_reset1:
+            query = st.text_input(
+                "🔎 搜尋事件描述",
+                key="filter_query",
+                placeholder='搜尋事件描述，例如：約束　管路滑脫 OR 跌倒　"病人 自拔"',
+                label_visibility="collapsed",
+                help="空白分隔的關鍵字須同時出現；以 OR 或 | 分隔表示任一組符合；以雙引號包住完整片語",
+            ).strip()
         with col_reset2:
             if st.button("🔄 重置", use_container_width=True, key="filter_reset_btn"):
                 st.session_state.selected_event = None
                 st.session_state.selected_dept = None
                 st.session_state.selected_year = None
-                st.rerun()
         
         # 智能篩選邏輯：如果某個條件有選擇就套用，沒選擇就不篩選該條件
-        filter_conditions = []
-        
-        # 年度篩選
-        if years and len(years) > 0:
-            filter_conditions.append(df["年度"].isin(years))
-        
-        # 事件類別篩選
-        if types and len(types) > 0:
-            filter_conditions.append(df["事件類別"].isin(types))
-        
-        # 發生單位篩選
-        if depts and len(depts) > 0:
-            filter_conditions.append(df["發生單位"].isin(depts))
-        
-        # 如果沒有任何條件，顯示全部資料；否則套用所有選中的條件（AND邏輯）
-        if len(filter_conditions) == 0:
-            f_df = df.copy()
-        else:
-            # 合併所有條件（AND邏輯）
-            combined_condition = filter_conditions[0]
-            for condition in filter_conditions[1:]:
-                combined_condition = combined_condition & condition
-            f_df = df[combined_condition]
+        # 同一維度內取聯集、不同維度之間取交集（AND邏輯），再與全文搜尋的命中列取交集；
+        # 篩選、彙總與 KPI 都走 pipeline，與批次報表的流程相同
+        selections = {"年度": years, "事件類別": types, "發生單位": depts}
+        signature_store = get_signature_store()
+
+        # 疑似重複通報：偵測結果存在資料集上；收合時每組只保留最早的一列
+        duplicates = None
+        if detect_duplicates:
+            with trace_stage("疑似重複"):
+                duplicates = dataset.near_duplicates(signature_store, duplicate_threshold)
+        collapse = collapse_duplicates and duplicates is not None
+        restricted = bool(query) or collapse
+        filter_state = dict(selections, 搜尋=[query] if query else [], 收合重複=[duplicate_threshold] if collapse else [])
+
+        def filtered_rows(collapsed_only):
+            state = dict(filter_state, 收合重複=filter_state["收合重複"] if collapsed_only else [])
+            return cached_aggregate(
+                dataset, state, "rows",
+                lambda: select_rows(dataset, selections, query, collapsed_only, signature_store, duplicate_threshold)
+            )
+
+        with trace_stage("篩選"):
+            filter_rows = filtered_rows(collapse)
+            collapsed = dataset.count(filtered_rows(False)) - dataset.count(filter_rows) if collapse else 0
+        with trace_stage("彙總"):
+            # 圖表與 KPI 的件數都從預先建立的件數立方體切片加總，不再掃描資料列；
+            # 搜尋或收合重複時只需就剩下的資料列建立件數立方體
+            counts = cached_aggregate(
+                dataset, filter_state, "counts",
+                lambda: cube_view(dataset, selections, filter_rows, restricted=restricted)
+            )
+            kpis = kpi_summary(counts)
+
+        # 各圖表的彙總表：第一次顯示用到的頁籤時才計算
+        def tables():
+            return cached_aggregate(dataset, filter_state, "charts", lambda: chart_tables(counts))
+
+        # 月 / 週件數：與上面相同，搜尋或收合重複時只就剩下的資料列建立
+        def period_counts(unit):
+            with trace_stage(f"彙總：{unit}"):
+                return cached_aggregate(
+                    dataset, filter_state, f"counts_{unit}",
+                    lambda: period_view(dataset, unit, selections, filter_rows, restricted=restricted)
+                )
 
         # --- KPI 卡片 (專業儀表板風格) ---
         st.markdown("<br>", unsafe_allow_html=True)
         k1, k2 = st.columns(2)
         
-        total_cases = len(f_df)
-        k1.metric("📊 總案件數", f"{total_cases:,}", delta=None)
+        total_cases = kpis["總案件數"]
+        if collapse:
+            k1.metric("📊 總案件數", f"{total_cases:,}", delta=f"已收合 {collapsed:,} 筆疑似重複", delta_color="off")
+        else:
+            k1.metric("📊 總案件數", f"{total_cases:,}", delta=None)
         
-        if not f_df.empty and "事件類別" in f_df.columns and not f_df["事件類別"].mode().empty:
-            main_risk = f_df["事件類別"].mode()[0]
-            risk_count = len(f_df[f_df["事件類別"] == main_risk])
-            k2.metric("⚠️ 主要風險", main_risk, delta=f"{risk_count} 件")
+        if kpis["主要風險"] is not None:
+            k2.metric("⚠️ 主要風險", kpis["主要風險"], delta=f"{kpis['主要風險件數']} 件")
         else:
             k2.metric("⚠️ 主要風險", "-", delta=None)
 
         # --- 主要內容區 ---
-        tab_total, tab_trend, tab_data, tab_detail = st.tabs(["📌 統計總覽", "📈 趨勢分析", "📋 資料明細", "🔍 點擊詳情"])
+        tab_renderers = [
+            lambda: render_overview(tables()),
+            lambda: render_trend(dataset, filter_state, tables(), period_counts),
+            lambda: render_data(dataset, filter_rows, duplicates),
+            lambda: render_detail(dataset, filter_rows, counts),
+        ]
         
-        with tab_total:
-            # 第一行：兩個主要圖表
-            col_l, col_r = st.columns([1, 1])
-            
-            with col_l:
-                st.markdown("### 🎯 事件分布比率")
-                if not f_df.empty and "事件類別" in f_df.columns:
-                    event_counts = f_df["事件類別"].value_counts()
-                    # 六版風格配色
-                    category_colors = {
-                        '心跳事件': '#F43F5E', '管路事件': '#3B82F6', '跌倒事件': '#F59E0B',
-                        '公共事件': '#10B981', '藥物事件': '#8B5CF6', '其他事件': '#64748B',
-                        '輸血事件': '#BE123C', '檢查檢驗': '#06B6D4', '傷害事件': '#EF4444'
-                    }
-                    colors_list = [category_colors.get(cat, '#94a3b8') for cat in event_counts.index]
-                    
-                    fig_pie = px.pie(
-                        values=event_counts.values, 
-                        names=event_counts.index, 
-                        hole=0.72,
-                        color_discrete_sequence=colors_list
-                    )
-                    fig_pie.update_traces(
-                        textposition='inside', 
-                        textinfo='percent+label',
-                        hovertemplate='<b>%{label}</b><br>數量: %{value}<br>占比: %{percent}<extra></extra>'
-                    )
-                    fig_pie.update_layout(
-                        showlegend=True, 
-                        margin=dict(t=40, b=40, l=40, r=40, pad=10),
-                        height=400,
-                        font=dict(size=12),
-                        autosize=True
-                    )
-                    
-                    # 使用 on_select 處理點擊事件
-                    selected_pie = st.plotly_chart(
-                        fig_pie, 
-                        use_container_width=True, 
-                        key="pie_chart",
-                        on_select="rerun"
-                    )
-                    
-                    # 處理選擇事件
-                    if selected_pie and hasattr(selected_pie, 'selection') and selected_pie.selection.points:
-                        point = selected_pie.selection.points[0]
-                        if hasattr(point, 'label') and point.label:
-                            st.session_state.selected_event = point.label
-                            st.success(f"✅ 已選擇：{point.label}，請切換到「🔍 點擊詳情」頁籤查看")
-                            st.rerun()
-                    
-                else:
-                    st.info("無資料可顯示")
-            
-            with col_r:
-                st.markdown("### 🏢 單位發生次數排名")
-                if "發生單位" in f_df.columns and not f_df["發生單位"].empty:
-                    dept_rank = f_df["發生單位"].value_counts().reset_index()
-                    dept_rank.columns = ["發生單位", "count"]
-                    dept_rank = dept_rank.head(15)
-                    fig_bar = px.bar(
-                        dept_rank, 
-                        x="count", 
-                        y="發生單位", 
-                        orientation='h',
-                        text="count", 
-                        color="count", 
-                        color_continuous_scale='Blues',
-                        color_discrete_sequence=['#4f46e5']
-                    )
-                    fig_bar.update_traces(
-                        hovertemplate='<b>%{y}</b><br>案件數: %{x}<extra></extra>'
-                    )
-                    fig_bar.update_layout(
-                        showlegend=False, 
-                        yaxis={'categoryorder':'total ascending'},
-                        margin=dict(t=40, b=40, l=80, r=40, pad=10),
-                        height=400,
-                        xaxis_title="案件數量",
-                        yaxis_title="",
-                        autosize=True
-                    )
-                    selected_bar = st.plotly_chart(
-                        fig_bar, 
-                        use_container_width=True, 
-                        key="bar_chart",
-                        on_select="rerun"
-                    )
-                    
-                    # 處理選擇事件
-                    if selected_bar and hasattr(selected_bar, 'selection') and selected_bar.selection.points:
-                        point = selected_bar.selection.points[0]
-                        if hasattr(point, 'y') and point.y:
-                            st.session_state.selected_dept = point.y
-                            st.success(f"✅ 已選擇：{point.y}，請切換到「🔍 點擊詳情」頁籤查看")
-                            st.rerun()
-                    
-                else:
-                    st.info("無資料可顯示")
-            
-            # 第二行：年度分布和事件類別趨勢
-            st.markdown("<br>", unsafe_allow_html=True)
-            col_l2, col_r2 = st.columns([1, 1])
-            
-            with col_l2:
-                st.markdown("### 📅 年度案件分布")
-                if not f_df.empty and "年度" in f_df.columns:
-                    year_counts = f_df["年度"].value_counts().sort_index()
-                    fig_year = px.bar(
-                        x=year_counts.index,
-                        y=year_counts.values,
-                        labels={'x': '年度', 'y': '案件數'},
-                        color=year_counts.values,
-                        color_continuous_scale='Viridis'
-                    )
-                    fig_year.update_traces(
-                        text=year_counts.values,
-                        textposition='outside',
-                        hovertemplate='<b>%{x} 年</b><br>案件數: %{y}<extra></extra>'
-                    )
-                    fig_year.update_layout(
-                        showlegend=False,
-                        margin=dict(t=40, b=60, l=60, r=40, pad=10),
-                        height=350,
-                        xaxis_title="年度",
-                        yaxis_title="案件數量",
-                        autosize=True
-                    )
-                    selected_year_chart = st.plotly_chart(
-                        fig_year, 
-                        use_container_width=True, 
-                        key="year_chart",
-                        on_select="rerun"
-                    )
-                    
-                    # 處理選擇事件
-                    if selected_year_chart and hasattr(selected_year_chart, 'selection') and selected_year_chart.selection.points:
-                        point = selected_year_chart.selection.points[0]
-                        if hasattr(point, 'x') and point.x:
-                            st.session_state.selected_year = str(point.x)
-                            st.success(f"✅ 已選擇：{point.x} 年，請切換到「🔍 點擊詳情」頁籤查看")
-                            st.rerun()
-                else:
-                    st.info("無資料可顯示")
-            
-            with col_r2:
-                st.markdown("### 📊 事件類別統計")
-                if not f_df.empty and "事件類別" in f_df.columns:
-                    event_stats = f_df["事件類別"].value_counts().head(10)
-                    fig_event = px.bar(
-                        x=event_stats.index,
-                        y=event_stats.values,
-                        labels={'x': '事件類別', 'y': '案件數'},
-                        color=event_stats.values,
-                        color_continuous_scale='Reds'
-                    )
-                    fig_event.update_traces(
-                        text=event_stats.values,
-                        textposition='outside',
-                        hovertemplate='<b>%{x}</b><br>案件數: %{y}<extra></extra>'
-                    )
-                    fig_event.update_layout(
-                        showlegend=False,
-                        margin=dict(t=40, b=100, l=60, r=40, pad=10),
-                        height=350,
-                        xaxis_title="事件類別",
-                        yaxis_title="案件數量",
-                        xaxis_tickangle=-45,
-                        autosize=True
-                    )
-                    st.plotly_chart(fig_event, use_container_width=True, key="event_chart")
-                else:
-                    st.info("無資料可顯示")
-
-        with tab_trend:
-            st.markdown("### 📈 跨年度案件趨勢分析")
-            
-            if not f_df.empty and "年度" in f_df.columns and "事件類別" in f_df.columns:
-                trend = f_df.groupby(["年度", "事件類別"]).size().reset_index(name="件數")
-                if not trend.empty:
-                    # 折線圖
-                    fig_trend = px.line(
-                        trend, 
-                        x="年度", 
-                        y="件數", 
-                        color="事件類別", 
-                        markers=True,
-                        line_shape='spline',
-                        title="各事件類別跨年度趨勢"
-                    )
-                    fig_trend.update_traces(
-                        line=dict(width=3),
-                        marker=dict(size=8),
-                        hovertemplate='<b>%{fullData.name}</b><br>年度: %{x}<br>件數: %{y}<extra></extra>'
-                    )
-                    fig_trend.update_layout(
-                        height=500,
-                        margin=dict(t=50, b=60, l=60, r=50, pad=10),
-                        hovermode='x unified',
-                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                        autosize=True
-                    )
-                    selected_trend = st.plotly_chart(
-                        fig_trend, 
-                        use_container_width=True, 
-                        key="trend_chart",
-                        on_select="rerun"
-                    )
-                    
-                    # 處理選擇事件
-                    if selected_trend and hasattr(selected_trend, 'selection') and selected_trend.selection.points:
-                        point = selected_trend.selection.points[0]
-                        if hasattr(point, 'fullData') and hasattr(point.fullData, 'name'):
-                            st.session_state.selected_event = point.fullData.name
-                        if hasattr(point, 'x'):
-                            st.session_state.selected_year = str(point.x)
-                        st.success("✅ 已選擇圖表資料，請切換到「🔍 點擊詳情」頁籤查看")
-                        st.rerun()
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    
-                    # 熱力圖
-                    col_l3, col_r3 = st.columns([2, 1])
-                    with col_l3:
-                        st.markdown("#### 🔥 年度-事件類別熱力圖")
-                        pivot_trend = trend.pivot(index="事件類別", columns="年度", values="件數").fillna(0)
-                        fig_heatmap = px.imshow(
-                            pivot_trend,
-                            labels=dict(x="年度", y="事件類別", color="件數"),
-                            color_continuous_scale='YlOrRd',
-                            aspect="auto"
-                        )
-                        fig_heatmap.update_layout(height=400)
-                        st.plotly_chart(fig_heatmap, use_container_width=True, key="heatmap")
-                    
-                    with col_r3:
-                        st.markdown("#### 📊 趨勢統計")
-                        st.markdown(f"""
-                        <div class="info-card">
-                            <p><strong>總事件類別數：</strong>{trend['事件類別'].nunique()}</p>
-                            <p><strong>涵蓋年度數：</strong>{trend['年度'].nunique()}</p>
-                            <p><strong>最高單年件數：</strong>{trend['件數'].max()}</p>
-                            <p><strong>平均年度件數：</strong>{round(trend['件數'].mean(), 1)}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.info("無資料可顯示")
-            else:
-                st.info("無資料可顯示")
-
-        with tab_data:
-            st.markdown("### 📋 完整事件清單")
-            
-            # 顯示資料統計
-            col_info1, col_info2, col_info3 = st.columns(3)
-            with col_info1:
-                st.metric("顯示筆數", f"{len(f_df):,}")
-            with col_info2:
-                st.metric("總欄位數", f"{len(f_df.columns)}")
-            with col_info3:
-                if not f_df.empty:
-                    csv = f_df.to_csv(index=False).encode('utf-8-sig')
-                    st.download_button("📥 下載 CSV", csv, "filtered_data.csv", "text/csv", use_container_width=True)
-            
-            st.markdown("<br>", unsafe_allow_html=True)
-            
-            # 資料表格
-            if not f_df.empty:
-                # 重新排列欄位順序
-                display_cols = ["年度", "單號", "日期", "事件類別", "發生單位", "事件描述"]
-                available_cols = [col for col in display_cols if col in f_df.columns]
-                other_cols = [col for col in f_df.columns if col not in display_cols]
-                final_cols = available_cols + other_cols
-                
-                # 使用更好的表格容器支援完整滾動
-                st.markdown("""
-                    <div class="dataframe-container">
-                """, unsafe_allow_html=True)
-                st.dataframe(
-                    f_df[final_cols], 
-                    use_container_width=True, 
-                    height=500,
-                    hide_index=True,
-                    column_config={
-                        col: st.column_config.TextColumn(
-                            col, 
-                            width="large" if col == "事件描述" else "medium"
-                        ) 
-                        for col in final_cols
-                    }
-                )
-                st.markdown("</div>", unsafe_allow_html=True)
-            else:
-                st.warning("目前篩選條件下無資料可顯示")
-        
-        with tab_detail:
-            st.markdown("### 🔍 圖表點擊詳情")
-            st.markdown("**提示：** 點擊上方圖表中的資料點，或使用下方快速選擇按鈕來查看詳細資料")
-            
-            # 快速選擇按鈕區域
-            st.markdown("---")
-            st.markdown("#### 🎯 快速選擇")
-            
-            col_quick1, col_quick2 = st.columns(2)
-            
-            with col_quick1:
-                st.markdown("**事件類別快速選擇：**")
-                if not f_df.empty and "事件類別" in f_df.columns:
-                    event_counts = f_df["事件類別"].value_counts()
-                    quick_cols = st.columns(min(3, len(event_counts)))
-                    for idx, (event_name, count) in enumerate(event_counts.head(6).items()):
-                        with quick_cols[idx % len(quick_cols)]:
-                            if st.button(f"{event_name}\n({count})", key=f"quick_event_{event_name}", use_container_width=True):
-                                st.session_state.selected_event = event_name
-                                st.session_state.selected_dept = None
-                                st.session_state.selected_year = None
-                                st.rerun()
-            
-            with col_quick2:
-                st.markdown("**單位快速選擇：**")
-                if not f_df.empty and "發生單位" in f_df.columns:
-                    dept_rank = f_df["發生單位"].value_counts().head(6)
-                    quick_cols = st.columns(min(3, len(dept_rank)))
-                    for idx, (dept_name, count) in enumerate(dept_rank.items()):
-                        with quick_cols[idx % len(quick_cols)]:
-                            if st.button(f"{dept_name}\n({count})", key=f"quick_dept_{dept_name}", use_container_width=True):
-                                st.session_state.selected_dept = dept_name
-                                st.session_state.selected_event = None
-                                st.session_state.selected_year = None
-                                st.rerun()
-            
-            st.markdown("---")
-            
-            detail_df = None
-            
-            # 根據點擊的項目顯示對應資料
-            if st.session_state.selected_event:
-                st.success(f"✅ 已選擇事件類別：**{st.session_state.selected_event}**")
-                detail_df = f_df[f_df["事件類別"] == st.session_state.selected_event].copy()
-            
-            if st.session_state.selected_dept:
-                st.info(f"🏢 已選擇單位：**{st.session_state.selected_dept}**")
-                if detail_df is not None:
-                    detail_df = detail_df[detail_df["發生單位"] == st.session_state.selected_dept]
-                else:
-                    detail_df = f_df[f_df["發生單位"] == st.session_state.selected_dept].copy()
-            
-            if st.session_state.selected_year:
-                st.info(f"📅 已選擇年度：**{st.session_state.selected_year}**")
-                if detail_df is not None:
-                    detail_df = detail_df[detail_df["年度"] == st.session_state.selected_year]
-                else:
-                    detail_df = f_df[f_df["年度"] == st.session_state.selected_year].copy()
-            
-            if detail_df is not None and not detail_df.empty:
-                st.markdown(f"#### 📊 符合條件的資料（共 {len(detail_df)} 筆）")
-                
-                # 顯示統計
-                stat_col1, stat_col2, stat_col3 = st.columns(3)
-                with stat_col1:
-                    st.metric("案件數", len(detail_df))
-                with stat_col2:
-                    if "發生單位" in detail_df.columns:
-                        st.metric("涉及單位", detail_df["發生單位"].nunique())
-                with stat_col3:
-                    if "事件類別" in detail_df.columns:
-                        st.metric("事件類型", detail_df["事件類別"].nunique())
-                
-                # 顯示資料
-                display_cols = ["年度", "單號", "日期", "事件類別", "發生單位", "事件描述"]
-                available_cols = [col for col in display_cols if col in detail_df.columns]
-                
-                # 使用更好的表格容器支援完整滾動
-                st.markdown("""
-                    <div class="dataframe-container">
-                """, unsafe_allow_html=True)
-                st.dataframe(
-                    detail_df[available_cols],
-                    use_container_width=True,
-                    height=400,
-                    hide_index=True,
-                    column_config={
-                        col: st.column_config.TextColumn(
-                            col, 
-                            width="large" if col == "事件描述" else "medium"
-                        ) 
-                        for col in available_cols
-                    }
-                )
-                st.markdown("</div>", unsafe_allow_html=True)
-                
-                # 下載按鈕
-                csv_detail = detail_df.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    "📥 下載此篩選結果 (CSV)", 
-                    csv_detail, 
-                    f"detail_{st.session_state.selected_event or 'data'}.csv", 
-                    "text/csv"
-                )
-            else:
-                st.info("👆 請使用上方的快速選擇按鈕，或點擊圖表中的資料點來查看詳細資訊")
+        if st.session_state.get("lazy_tabs", True):
+            # 以單選列切換頁籤，只計算目前頁籤的彙總、圖表與表格
+            st.radio(
+                "頁籤", list(range(len(TAB_LABELS))), format_func=lambda i: TAB_LABELS[i],
+                horizontal=True, key="active_tab", label_visibility="collapsed"
+            )
+            with trace_stage(f"頁籤：{TAB_LABELS[st.session_state.active_tab]}"):
+                tab_renderers[st.session_state.active_tab]()
+        else:
+            for label, tab, render in zip(TAB_LABELS, st.tabs(TAB_LABELS), tab_renderers):
+                with tab, trace_stage(f"頁籤：{label}"):
+                    render()
     
     elif df is not None and df.empty:
-        st.warning("Excel 檔案已讀取，但未找到符合格式的資料。請確認檔案包含「單號」欄位。")
+        st.warning("檔案已讀取，但未找到符合格式的資料。請確認檔案包含「單號」欄位。")
+    elif ingest_waiting:
+        st.info("⏳ 正在解析活頁簿，第一個工作表完成後會先顯示已完成工作表的統計。")
     else:
-        st.error("無法讀取 Excel 檔案，請確認檔案格式是否正確。")
+        st.error("無法讀取檔案，請確認檔案格式是否正確，且包含「單號」欄位。")
 
 else:
+    # 沒有開啟任何資料集時，釋放這個 session 先前持有的資料集
+    get_dataset_registry().release(current_session_id())
     # 未上傳時的導引畫面
-    st.info("請上傳 Excel 檔案以啟用儀表板。系統將自動合併多個工作表數據並清理格式。")
+    st.info("請上傳 Excel 或 CSV 檔案以啟用儀表板。系統將自動合併多個工作表數據並清理格式。")
     st.markdown("""
     ### 📋 使用說明
-    1. **上傳 Excel 檔案**：支援 .xlsx 格式
+    1. **上傳檔案**：支援 .xlsx 與 .csv 格式（CSV 會分段讀取，適合大型匯出檔）
     2. **自動識別**：系統會自動尋找包含「單號」的標題列
     3. **多工作表處理**：自動合併所有工作表資料
     4. **資料清理**：自動統一欄位名稱並清理事件類別格式
     5. **即時分析**：上傳後立即顯示統計圖表和資料明細
+    6. **儲存資料集**：解析後可於側邊欄存成具名資料集，之後不必重新上傳即可開啟
     """)
+
+# --- 效能診斷面板：放在最後，才能顯示這次 rerun 所有階段的紀錄 ---
+st.session_state.tracer.end_run()
+render_diagnostics_panel(st.session_state.tracer)
+start_warmup()
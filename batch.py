@@ -0,0 +1,137 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from aliases import AliasTable
+from export import EXPORT_FORMATS, write_export
+from pipeline import apply_aliases, chart_tables, cube_view, kpi_summary, parse_upload, select_rows
+
+# --- 批次報表：不經過 Streamlit，直接以相同的解析、清洗與彙總流程處理整個目錄的活頁簿 ---
+# 每個活頁簿在行程池中的一個子行程內處理，輸出 KPI 摘要、各圖表的彙總表與篩選後的資料
+INPUT_SUFFIXES = (".xlsx", ".csv")
+SUMMARY_FILE = "summary.csv"
+
+
+def find_workbooks(input_dir):
+    paths = []
+    for name in sorted(os.listdir(input_dir)):
+        # Excel 開啟中的檔案會留下 ~$ 開頭的暫存檔
+        if name.lower().endswith(INPUT_SUFFIXES) and not name.startswith("~$"):
+            paths.append(os.path.join(input_dir, name))
+    return paths
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    dataset, warnings = parse_upload(data, path)
+    return dataset, warnings, len(data)
+
+
+def process_workbook(path, output_dir, selections, query, formats, collapse=False, aliases=None):
+    start = time.perf_counter()
+    dataset, warnings, file_bytes = load_file(path)
+    if dataset is not None and aliases is not None:
+        dataset = apply_aliases(dataset, AliasTable(aliases))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    result = {"檔案": os.path.basename(path), "檔案大小 (MB)": round(file_bytes / 1024 ** 2, 2), "warnings": warnings}
+    if dataset is None or len(dataset) == 0:
+        result.update({"資料筆數": 0, "耗時 (秒)": round(time.perf_counter() - start, 2)})
+        return result
+
+    rows = select_rows(dataset, selections, query, collapse)
+    counts = cube_view(dataset, selections, rows, restricted=bool(query) or collapse)
+    out = os.path.join(output_dir, stem)
+    os.makedirs(out, exist_ok=True)
+
+    kpis = kpi_summary(counts)
+    with open(os.path.join(out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(kpis, 篩選條件=selections, 搜尋=query, 收合疑似重複=collapse, 警告=warnings), f, ensure_ascii=False, indent=2)
+    for name, table in chart_tables(counts).items():
+        # utf-8-sig：Excel 才能正確辨識中文
+        table.to_csv(os.path.join(out, f"{name}.csv"), index=False, encoding="utf-8-sig")
+    filtered = dataset.view(rows)
+    for fmt in formats:
+        with open(os.path.join(out, f"events{EXPORT_FORMATS[fmt][2]}"), "wb") as f:
+            write_export(filtered, fmt, f)
+
+    result.update(kpis)
+    result.update({"資料筆數": len(dataset), "篩選後筆數": len(filtered), "耗時 (秒)": round(time.perf_counter() - start, 2)})
+    return result
+
+
+def _values(text):
+    return [v.strip() for v in text.split(",") if v.strip()] if text else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次產生各單位活頁簿的統計報表（不需啟動儀表板）")
+    parser.add_argument("input_dir", help="活頁簿所在目錄（.xlsx / .csv）")
+    parser.add_argument("output_dir", help="輸出目錄；每個活頁簿一個子目錄")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="同時處理的活頁簿數")
+    parser.add_argument("--years", default="", help="只統計這些年度，以逗號分隔")
+    parser.add_argument("--types", default="", help="只統計這些事件類別，以逗號分隔")
+    parser.add_argument("--depts", default="", help="只統計這些發生單位，以逗號分隔")
+    parser.add_argument("--query", default="", help="事件描述全文搜尋，語法與儀表板相同")
+    parser.add_argument("--collapse-duplicates", action="store_true", help="疑似重複通報只計一次（事件描述相似度達門檻者）")
+    parser.add_argument("--aliases", default=None, help="發生單位名稱對照表（儀表板存下的 JSON 檔）")
+    parser.add_argument("--formats", default="csv,parquet", help="篩選後資料的輸出格式，例如 csv,parquet,xlsx")
+    args = parser.parse_args()
+
+    if args.aliases is not None and not os.path.isfile(args.aliases):
+        parser.error(f"找不到對照表 {args.aliases}")
+    formats = _values(args.formats)
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        parser.error(f"不支援的輸出格式：{', '.join(unknown)}")
+    selections = {"年度": _values(args.years), "事件類別": _values(args.types), "發生單位": _values(args.depts)}
+    paths = find_workbooks(args.input_dir)
+    if not paths:
+        parser.error(f"{args.input_dir} 中沒有 .xlsx 或 .csv 檔案")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    results, failures = [], []
+    workers = max(1, min(args.workers, len(paths)))
+    # 與儀表板的平行解析相同，用 spawn 啟動子行程
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(
+                process_workbook, path, args.output_dir, selections, args.query.strip(), formats,
+                args.collapse_duplicates, args.aliases
+            ): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            name = os.path.basename(futures[future])
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(name)
+                print(f"✗ {name}：{e}")
+                continue
+            results.append(result)
+            for message in result["warnings"]:
+                print(f"  ⚠ {name}：{message}")
+            print(f"✓ {name}：{result['資料筆數']:,} 筆，{result['耗時 (秒)']:.1f} 秒")
+    elapsed = time.perf_counter() - start
+
+    if results:
+        summary = pd.DataFrame([{k: v for k, v in r.items() if k != "warnings"} for r in results]).sort_values("檔案")
+        summary.to_csv(os.path.join(args.output_dir, SUMMARY_FILE), index=False, encoding="utf-8-sig")
+    total_rows = sum(r["資料筆數"] for r in results)
+    total_mb = sum(r["檔案大小 (MB)"] for r in results)
+    print(
+        f"\n完成 {len(results)} / {len(paths)} 個檔案，共 {total_rows:,} 筆，耗時 {elapsed:.1f} 秒"
+        f"（{len(results) / elapsed:.2f} 檔/秒，{total_rows / elapsed:,.0f} 筆/秒，{total_mb / elapsed:.1f} MB/秒，{workers} 個行程）"
+    )
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from cube import PERIOD_FREQS
+from dataset import EventDataset
+from duplicates import NearDuplicates, SignatureStore
+from export import write_export
+from ingest import normalize_event_categories, parse_workbook
+from pipeline import INGEST_OPTIONS
+from synthetic import RAW_EVENT_LABELS, write_workbook
+from text_index import TextIndex
+
+# --- 效能基準測試：以合成活頁簿量測資料處理流程各階段的耗時與峰值記憶體 ---
+# 結果逐次附加到 JSON Lines 檔，之後可以用 --compare 比較最近兩次相同筆數的結果
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DATA_DIR = "bench_data"
+RESULTS_FILE = "bench_results.jsonl"
+REGRESSION_RATIO = 1.10
+REGRESSION_MIN_SECONDS = 0.005  # 差距小於這個值的階段視為誤差，不標示
+
+# 篩選階段使用的條件組合：單一維度、多個維度、全文搜尋
+FILTER_CASES = [
+    {"年度": ["113"]},
+    {"事件類別": ["跌倒事件", "藥物事件"]},
+    {"年度": ["112", "113"], "發生單位": ["急診", "ICU"]},
+    {"年度": ["114"], "事件類別": ["管路事件"], "發生單位": ["7A病房"]},
+]
+SEARCH_QUERIES = ["跌倒", "鼻胃管 拔除", "輸血 OR 血袋", '"通知值班醫師"']
+
+
+def measure(fn, repeat=1, memory=True):
+    # 計時不開 tracemalloc（會拖慢純 Python 的程式碼），峰值記憶體另外跑一次量測
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+    return result, {"seconds": min(seconds), "peak_mb": peak_mb}
+
+
+def build_figures(dataset, rows):
+    import charts
+
+    counts = dataset.cube_for(rows) if rows is not None else dataset.cube.select({})
+    event_counts = counts.counts_by("事件類別")
+    dept_rank = counts.counts_by("發生單位").head(15)
+    year_counts = counts.counts_by("年度", sort=False)
+    table = counts.pivot("事件類別", "年度")
+    years, categories, matrix = table.columns.to_numpy(dtype=object), table.index.to_numpy(dtype=object), table.to_numpy()
+    figures = [
+        charts.pie_figure(event_counts.index.to_numpy(dtype=object), event_counts.to_numpy()),
+        charts.dept_bar_figure(dept_rank.index.to_numpy(dtype=object), dept_rank.to_numpy()),
+        charts.year_bar_figure(year_counts.index.to_numpy(dtype=object), year_counts.to_numpy()),
+        charts.event_bar_figure(event_counts.index[:10].to_numpy(dtype=object), event_counts.to_numpy()[:10]),
+        charts.trend_figure(years, categories, matrix),
+        charts.heatmap_figure(years, categories, matrix),
+    ]
+    # 圖表送到瀏覽器前會序列化成 JSON，這部分也算在圖表成本內
+    return sum(len(fig.to_json()) for fig in figures)
+
+
+def run_size(path, repeat=1, memory=True, formats=("csv", "parquet")):
+    with open(path, "rb") as f:
+        data = f.read()
+    stages = {}
+
+    (df, _), stages["ingest"] = measure(lambda: parse_workbook(data, INGEST_OPTIONS), 1, memory)
+
+    rng = np.random.default_rng(0)
+    labels = [label for label, _ in RAW_EVENT_LABELS]
+    raw = pd.Series([labels[i] for i in rng.integers(len(labels), size=len(df))], dtype=object)
+    _, stages["clean"] = measure(lambda: normalize_event_categories(raw), repeat, memory)
+
+    dataset, stages["index"] = measure(lambda: EventDataset(df), repeat, memory)
+    _, stages["filter"] = measure(lambda: [dataset.rows(case) for case in FILTER_CASES], repeat, memory)
+    _, stages["search_index"] = measure(lambda: TextIndex(df["事件描述"]), 1, memory)
+    dataset.text_index  # 全文索引是第一次搜尋時才建立，先建好再量測查詢
+    _, stages["search"] = measure(lambda: [dataset.search(q) for q in SEARCH_QUERIES], repeat, memory)
+    signatures = SignatureStore()
+    _, stages["dedup"] = measure(lambda: NearDuplicates(df["事件描述"], signatures), 1, memory)
+    # 簽章都已在快取中，相當於重新上傳同一份活頁簿
+    _, stages["dedup_cached"] = measure(lambda: NearDuplicates(df["事件描述"], signatures), repeat, memory)
+
+    def aggregate():
+        for case in [{}] + FILTER_CASES:
+            counts = dataset.cube.select(case)
+            counts.counts_by("事件類別")
+            counts.counts_by("發生單位")
+            counts.counts_by("年度", sort=False)
+            counts.long("年度", "事件類別")
+    _, stages["aggregate"] = measure(aggregate, repeat, memory)
+    _, stages["periods"] = measure(lambda: [dataset.period_cube_for(unit, None) for unit in PERIOD_FREQS], repeat, memory)
+
+    payload, stages["figures"] = measure(lambda: build_figures(dataset, None), repeat, memory)
+    stages["figures"]["payload_kb"] = payload / 1024
+
+    for fmt in formats:
+        _, stages[f"export_{fmt}"] = measure(lambda: write_export(df, fmt, io.BytesIO()), 1, memory)
+    return {"rows": len(df), "file_mb": len(data) / 1024 ** 2, "stages": stages}
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    import openpyxl
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_result(result):
+    print(f"\n{result['rows']:,} 筆（{result['file_mb']:.1f} MB）")
+    for stage, values in result["stages"].items():
+        peak = f"{values['peak_mb']:9.1f} MB" if values.get("peak_mb") is not None else ""
+        print(f"  {stage:<14}{values['seconds'] * 1000:12.1f} ms {peak}")
+
+
+# 比較每種筆數最近兩次的結果，變慢超過門檻的階段標示出來
+def compare(results):
+    by_size = {}
+    for result in results:
+        by_size.setdefault(result["target_rows"], []).append(result)
+    regressions = 0
+    for size, runs in sorted(by_size.items()):
+        if len(runs) < 2:
+            continue
+        before, after = runs[-2], runs[-1]
+        print(f"\n{size:,} 筆：{before.get('commit')} ({before['run_at']}) → {after.get('commit')} ({after['run_at']})")
+        for stage, values in after["stages"].items():
+            old = before["stages"].get(stage)
+            if old is None:
+                continue
+            ratio = values["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+            slower = ratio > REGRESSION_RATIO and values["seconds"] - old["seconds"] > REGRESSION_MIN_SECONDS
+            flag = "  ⚠ 變慢" if slower else ""
+            regressions += bool(flag)
+            print(f"  {stage:<14}{old['seconds'] * 1000:10.1f} → {values['seconds'] * 1000:10.1f} ms  ×{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="儀表板資料處理流程的效能基準測試")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="總筆數，以逗號分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="快速階段重複次數（取最快的一次）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="合成活頁簿的存放目錄（已存在就直接使用）")
+    parser.add_argument("--results", default=RESULTS_FILE, help="結果檔（JSON Lines，每次執行附加一行）")
+    parser.add_argument("--formats", default="csv,parquet", help="要量測的匯出格式，例如 csv,parquet,xlsx")
+    parser.add_argument("--no-memory", action="store_true", help="不量測峰值記憶體（省下一次額外執行）")
+    parser.add_argument("--compare", action="store_true", help="只比較結果檔中最近兩次的結果，不執行測試")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(load_results(args.results))
+        raise SystemExit(1 if regressions else 0)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    commit, environment = _commit(), _environment()
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        path = os.path.join(args.data_dir, f"synthetic_{size}_s{args.seed}.xlsx")
+        if not os.path.exists(path):
+            print(f"產生 {path} ...")
+            write_workbook(path, size, seed=args.seed)
+        result = run_size(path, repeat=args.repeat, memory=not args.no_memory, formats=args.formats.split(","))
+        result.update({
+            "run_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "target_rows": size,
+            "seed": args.seed,
+            "environment": environment,
+        })
+        print_result(result)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    compare(load_results(args.results))
+
+
+if __name__ == "__main__":
+    main()
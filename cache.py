@@ -0,0 +1,121 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+# --- 估計快取項目佔用的記憶體（位元組） ---
+def estimate_size(value):
+    if value is None:
+        return 0
+    # 有資料可估計時 pandas 一定已經載入，這裡才匯入，不拖慢啟動
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+# --- 有上限的 LRU 快取：超過筆數或記憶體上限時淘汰最久未使用的項目 ---
+# Streamlit 的多個 session 共用同一個行程，所以所有操作都要上鎖
+class LRUCache:
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # 項目被移除時呼叫，例如刪除快取在磁碟上的檔案
+        self._items = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=None):
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if key in self._items:
+                old_value, old_size = self._items.pop(key)
+                self.total_bytes -= old_size
+                if old_value is not value:
+                    self._release(old_value)
+            # 不放入時項目仍歸呼叫端所有，不呼叫 on_evict
+            if not self._admits(key, size):
+                return False
+            self._items[key] = (value, size)
+            self.total_bytes += size
+            self._evict()
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value, size = self._items.pop(key)
+            self.total_bytes -= size
+            return value
+
+    def clear(self):
+        with self._lock:
+            for value, _ in self._items.values():
+                self._release(value)
+            self._items.clear()
+            self.total_bytes = 0
+
+    # 單一項目就超過上限時不放入快取，避免把其他項目全部擠掉
+    def _admits(self, key, size):
+        return size <= self.max_bytes
+
+    def _release(self, value):
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+    def _evict(self):
+        while self._items and (len(self._items) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, (value, size) = self._items.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            self._release(value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._items),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # 由最近使用到最久未使用排列，供側邊欄顯示各項目大小
+    def entries(self):
+        with self._lock:
+            return [(key, size) for key, (_, size) in reversed(self._items.items())]
@@ -0,0 +1,171 @@
+import hashlib
+
+import numpy as np
+import plotly.graph_objects as go
+
+from cache import LRUCache
+
+# --- 圖表：直接由彙總後的陣列建立 graph_objects 圖表，不經過 plotly.express ---
+# plotly.express 每次都要驗證 DataFrame、展開參數並套用樣板，成本遠高於要畫的幾十個點；
+# 這裡的圖表外觀與原本 express 版本相同，並以「彙總資料 + 版面設定」的雜湊快取
+CATEGORY_COLORS = {
+    '心跳事件': '#F43F5E', '管路事件': '#3B82F6', '跌倒事件': '#F59E0B',
+    '公共事件': '#10B981', '藥物事件': '#8B5CF6', '其他事件': '#64748B',
+    '輸血事件': '#BE123C', '檢查檢驗': '#06B6D4', '傷害事件': '#EF4444'
+}
+DEFAULT_COLOR = '#94a3b8'
+
+PIE_LAYOUT = dict(showlegend=True, margin=dict(t=40, b=40, l=40, r=40, pad=10), height=400, font=dict(size=12), autosize=True)
+DEPT_BAR_LAYOUT = dict(
+    showlegend=False, yaxis={'categoryorder': 'total ascending'}, margin=dict(t=40, b=40, l=80, r=40, pad=10),
+    height=400, xaxis_title="案件數量", yaxis_title="", autosize=True
+)
+YEAR_BAR_LAYOUT = dict(
+    showlegend=False, margin=dict(t=40, b=60, l=60, r=40, pad=10), height=350,
+    xaxis_title="年度", yaxis_title="案件數量", xaxis_type="category", autosize=True
+)
+EVENT_BAR_LAYOUT = dict(
+    showlegend=False, margin=dict(t=40, b=100, l=60, r=40, pad=10), height=350,
+    xaxis_title="事件類別", yaxis_title="案件數量", xaxis_tickangle=-45, autosize=True
+)
+TREND_LAYOUT = dict(
+    title="各事件類別跨年度趨勢", height=500, margin=dict(t=50, b=60, l=60, r=50, pad=10), hovermode='x unified',
+    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    xaxis_title="年度", yaxis_title="件數", xaxis_type="category", autosize=True
+)
+PERIOD_TREND_LAYOUT = dict(
+    height=450, margin=dict(t=30, b=60, l=60, r=50, pad=10), hovermode='x unified',
+    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    yaxis_title="件數", xaxis_type="date", autosize=True
+)
+MONTH_TREND_LAYOUT = dict(PERIOD_TREND_LAYOUT, xaxis_title="月份", xaxis_tickformat="%Y-%m", xaxis_hoverformat="%Y-%m")
+WEEK_TREND_LAYOUT = dict(PERIOD_TREND_LAYOUT, xaxis_title="週（起始日）", xaxis_hoverformat="%Y-%m-%d 當週")
+HEATMAP_LAYOUT = dict(height=400, xaxis_title="年度", yaxis_title="事件類別", yaxis_autorange="reversed")
+
+
+def _color_axis(colorscale, title):
+    return dict(colorscale=colorscale, colorbar=dict(title=dict(text=title)))
+
+
+def pie_figure(labels, values):
+    fig = go.Figure(go.Pie(
+        labels=labels, values=values, hole=0.72,
+        marker=dict(colors=[CATEGORY_COLORS.get(label, DEFAULT_COLOR) for label in labels]),
+        textposition='inside', textinfo='percent+label',
+        hovertemplate='<b>%{label}</b><br>數量: %{value}<br>占比: %{percent}<extra></extra>'
+    ))
+    fig.update_layout(**PIE_LAYOUT)
+    return fig
+
+
+def dept_bar_figure(labels, values):
+    fig = go.Figure(go.Bar(
+        x=values, y=labels, orientation='h', text=values,
+        marker=dict(color=values, coloraxis="coloraxis"),
+        hovertemplate='<b>%{y}</b><br>案件數: %{x}<extra></extra>'
+    ))
+    fig.update_layout(coloraxis=_color_axis('Blues', "count"), **DEPT_BAR_LAYOUT)
+    return fig
+
+
+def year_bar_figure(labels, values):
+    fig = go.Figure(go.Bar(
+        x=labels, y=values, text=values, textposition='outside',
+        marker=dict(color=values, coloraxis="coloraxis"),
+        hovertemplate='<b>%{x} 年</b><br>案件數: %{y}<extra></extra>'
+    ))
+    fig.update_layout(coloraxis=_color_axis('Viridis', "案件數"), **YEAR_BAR_LAYOUT)
+    return fig
+
+
+def event_bar_figure(labels, values):
+    fig = go.Figure(go.Bar(
+        x=labels, y=values, text=values, textposition='outside',
+        marker=dict(color=values, coloraxis="coloraxis"),
+        hovertemplate='<b>%{x}</b><br>案件數: %{y}<extra></extra>'
+    ))
+    fig.update_layout(coloraxis=_color_axis('Reds', "案件數"), **EVENT_BAR_LAYOUT)
+    return fig
+
+
+# 每個事件類別一條線；與 groupby().size() 相同，沒有件數的年度不畫點
+def trend_figure(years, categories, counts):
+    fig = go.Figure()
+    for category, row in zip(categories, counts):
+        present = row > 0
+        fig.add_trace(go.Scatter(
+            x=np.asarray(years, dtype=object)[present], y=row[present], name=category,
+            mode='lines+markers', line=dict(width=3, shape='spline'), marker=dict(size=8),
+            hovertemplate='<b>%{fullData.name}</b><br>年度: %{x}<br>件數: %{y}<extra></extra>'
+        ))
+    fig.update_layout(**TREND_LAYOUT)
+    return fig
+
+
+# 月 / 週趨勢：每個分組一條線，沒有件數的期間畫成 0，橫軸為各期間的起始日
+def _period_trend_figure(layout, periods, groups, counts):
+    fig = go.Figure()
+    for group, row in zip(groups, counts):
+        fig.add_trace(go.Scatter(
+            x=periods, y=row, name=group, mode='lines', line=dict(width=2),
+            hovertemplate='<b>%{fullData.name}</b>: %{y}<extra></extra>'
+        ))
+    fig.update_layout(**layout)
+    return fig
+
+
+def month_trend_figure(periods, groups, counts):
+    return _period_trend_figure(MONTH_TREND_LAYOUT, periods, groups, counts)
+
+
+def week_trend_figure(periods, groups, counts):
+    return _period_trend_figure(WEEK_TREND_LAYOUT, periods, groups, counts)
+
+
+def heatmap_figure(years, categories, counts):
+    fig = go.Figure(go.Heatmap(
+        z=counts, x=years, y=categories, coloraxis="coloraxis",
+        hovertemplate='年度: %{x}<br>事件類別: %{y}<br>件數: %{z}<extra></extra>'
+    ))
+    fig.update_layout(coloraxis=_color_axis('YlOrRd', "件數"), **HEATMAP_LAYOUT)
+    return fig
+
+
+BUILDERS = {
+    "pie": (pie_figure, PIE_LAYOUT),
+    "dept_bar": (dept_bar_figure, DEPT_BAR_LAYOUT),
+    "year_bar": (year_bar_figure, YEAR_BAR_LAYOUT),
+    "event_bar": (event_bar_figure, EVENT_BAR_LAYOUT),
+    "trend": (trend_figure, TREND_LAYOUT),
+    "heatmap": (heatmap_figure, HEATMAP_LAYOUT),
+    "month_trend": (month_trend_figure, MONTH_TREND_LAYOUT),
+    "week_trend": (week_trend_figure, WEEK_TREND_LAYOUT),
+}
+
+
+# 快取鍵：圖表種類 + 版面設定 + 每個輸入陣列的內容
+def figure_key(kind, *arrays):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(kind.encode())
+    digest.update(repr(sorted(BUILDERS[kind][1].items())).encode())
+    for values in arrays:
+        values = np.asarray(values)
+        if values.dtype == object:
+            digest.update("\x1f".join(map(str, values.ravel())).encode())
+        else:
+            digest.update(str(values.dtype).encode() + values.tobytes())
+        digest.update(str(values.shape).encode())
+    return digest.hexdigest()
+
+
+# --- 圖表快取：同樣的彙總資料（不論哪個 session）直接取回已建立的圖表與 JSON 大小 ---
+class FigureCache(LRUCache):
+    def figure(self, kind, *arrays):
+        key = figure_key(kind, *arrays)
+        cached = self.get(key)
+        if cached is None:
+            fig = BUILDERS[kind][0](*arrays)
+            payload = len(fig.to_json().encode("utf-8"))
+            cached = (fig, payload)
+            self.put(key, cached, size=payload)
+        return cached
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+CUBE_AXES = ["年度", "事件類別", "發生單位"]
+PERIOD_AXIS = "期間"
+PERIOD_FREQS = {"月": "M", "週": "W-SUN"}  # 週一到週日為一週
+
+
+# --- 日期分箱：日期換成期間的類別欄位，類別為最早到最晚日期之間每一期的起始日 ---
+# 中間沒有件數的期間也保留，趨勢圖的橫軸才是連續的
+def period_bins(dates, unit):
+    periods = pd.PeriodIndex(dates, freq=PERIOD_FREQS[unit])
+    valid = ~periods.isna()
+    if not valid.any():
+        return pd.Categorical.from_codes(np.full(len(dates), -1), categories=pd.DatetimeIndex([]))
+    ordinals = periods.asi8
+    first, last = ordinals[valid].min(), ordinals[valid].max()
+    starts = pd.period_range(
+        pd.Period(ordinal=first, freq=periods.freq), pd.Period(ordinal=last, freq=periods.freq)
+    ).start_time
+    codes = np.where(valid, ordinals - first, -1)
+    dtype = np.int16 if len(starts) < np.iinfo(np.int16).max else np.int32
+    return pd.Categorical.from_codes(codes.astype(dtype), categories=starts)
+
+
+# --- 件數立方體：(年度 × 事件類別 × 發生單位) 的件數，在載入時建立一次 ---
+# 每個軸的第 0 格是空值，其餘依類別代碼排列（與 FilterIndex 相同）
+class CountCube:
+    def __init__(self, counts, labels):
+        self.counts = counts
+        self.labels = labels  # 軸名稱 -> 類別清單（不含空值格）
+
+    @classmethod
+    def from_frame(cls, df, rows=None, axes=CUBE_AXES):
+        labels = {col: df[col].cat.categories for col in axes}
+        shape = tuple(len(labels[col]) + 1 for col in axes)
+        codes = []
+        for col in axes:
+            col_codes = df[col].cat.codes.to_numpy()
+            codes.append((col_codes if rows is None else col_codes[rows]).astype(np.int64) + 1)
+        flat = np.ravel_multi_index(codes, shape)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(counts.astype(np.int32), labels)
+
+    @property
+    def axes(self):
+        return list(self.labels)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    # 篩選邏輯與 isin 相同：該維度有選值時排除空值格，沒選值時全部保留
+    def _axis_mask(self, col, values):
+        categories = self.labels[col]
+        if not values:
+            return np.ones(len(categories) + 1, dtype=bool)
+        mask = np.zeros(len(categories) + 1, dtype=bool)
+        codes = categories.get_indexer(list(values))
+        mask[codes[codes >= 0] + 1] = True
+        return mask
+
+    def select(self, selections):
+        masks = [self._axis_mask(col, selections.get(col)) for col in self.axes]
+        return CubeView(self.counts[np.ix_(*masks)], {
+            col: pd.Index([None] + list(self.labels[col]), dtype=object)[mask]
+            for col, mask in zip(self.axes, masks)
+        })
+
+    # 增量更新：扣掉被移除的列（舊類別清單），再換算到新的類別清單並加上新增的列
+    # removed 以舊資料表建立、added 以新資料表建立；成本只和異動列數與立方體大小有關
+    # 舊類別在新清單中消失但仍有件數時無法換算，回傳 None 由呼叫端重建
+    def patch(self, removed, added):
+        base = self.counts - removed.counts
+        targets, sources = [], []
+        for col in self.axes:
+            position = added.labels[col].get_indexer(self.labels[col])
+            found = np.concatenate([[True], position >= 0])  # 空值格一定對得到
+            if base.compress(~found, axis=self.axes.index(col)).any():
+                return None
+            targets.append(np.concatenate([[0], position[position >= 0] + 1]))
+            sources.append(np.flatnonzero(found))
+        counts = added.counts.copy()
+        counts[np.ix_(*targets)] += base[np.ix_(*sources)]
+        return CountCube(counts, dict(added.labels))
+
+    # 合併同一軸上的類別（例如單位名稱對照）：lookup 為舊類別代碼 -> 新類別代碼
+    # 只在立方體上加總，成本與立方體大小有關，與資料筆數無關
+    def remap(self, col, lookup, categories):
+        axis = self.axes.index(col)
+        shape = list(self.counts.shape)
+        shape[axis] = len(categories) + 1
+        counts = np.zeros(shape, dtype=self.counts.dtype)
+        target = np.concatenate([[0], np.asarray(lookup) + 1])  # 空值格不變
+        np.add.at(np.moveaxis(counts, axis, 0), target, np.moveaxis(self.counts, axis, 0))
+        labels = dict(self.labels)
+        labels[col] = pd.Index(categories)
+        return CountCube(counts, labels)
+
+
+# --- 期間立方體：(年度, 期間) × 事件類別 × 發生單位 ---
+# 每個年度工作表只涵蓋自己的期間，年度 × 期間的完整格子大多是 0；
+# 這裡只保留資料中出現過的 (年度, 期間) 組合（slot），記憶體約為完整格子的 1 / 年度數
+# 切片時依年度挑出 slot，再把同一期間的 slot 加總，回傳 事件類別 × 發生單位 × 期間 的子立方體
+class PeriodCube(CountCube):
+    def __init__(self, counts, labels, slot_years, slot_periods):
+        super().__init__(counts, labels)
+        self.slot_years = slot_years  # 每個 slot 的年度代碼 + 1（0 為空值）
+        self.slot_periods = slot_periods  # 每個 slot 的期間代碼 + 1，slot 依期間排列
+
+    @classmethod
+    def from_frame(cls, df, rows=None, axes=CUBE_AXES):
+        year_axis, inner = axes[0], axes[1:]
+        labels = {col: df[col].cat.categories for col in axes + [PERIOD_AXIS]}
+
+        def codes_of(col):
+            col_codes = df[col].cat.codes.to_numpy()
+            return (col_codes if rows is None else col_codes[rows]).astype(np.int64) + 1
+
+        n_years = len(labels[year_axis]) + 1
+        pairs, slots = np.unique(codes_of(PERIOD_AXIS) * n_years + codes_of(year_axis), return_inverse=True)
+        shape = (len(pairs),) + tuple(len(labels[col]) + 1 for col in inner)
+        flat = np.ravel_multi_index([slots.ravel()] + [codes_of(col) for col in inner], shape)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype(np.int32)
+        return cls(counts, labels, pairs % n_years, pairs // n_years)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.slot_years.nbytes + self.slot_periods.nbytes
+
+    def select(self, selections):
+        year_axis, *inner = self.axes[:-1]
+        masks = {col: self._axis_mask(col, selections.get(col)) for col in self.axes}
+        period_mask = masks[PERIOD_AXIS]
+        keep = masks[year_axis][self.slot_years] & period_mask[self.slot_periods]
+        sub = self.counts[np.ix_(keep, *(masks[col] for col in inner))]
+        # 各年度同一期間的 slot 相鄰，依期間分段加總
+        periods = self.slot_periods[keep]
+        folded = np.zeros((int(period_mask.sum()),) + sub.shape[1:], dtype=self.counts.dtype)
+        if len(periods):
+            starts = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+            folded[(np.cumsum(period_mask) - 1)[periods[starts]]] = np.add.reduceat(sub, starts, axis=0)
+        return CubeView(np.moveaxis(folded, 0, -1), {
+            col: pd.Index([None] + list(self.labels[col]), dtype=object)[masks[col]]
+            for col in inner + [PERIOD_AXIS]
+        })
+
+
+# --- 套用篩選後的子立方體：所有圖表與 KPI 的數字都從這裡加總而來 ---
+class CubeView:
+    def __init__(self, counts, labels):
+        self.counts = counts
+        self.labels = labels
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    def _axis(self, col):
+        return list(self.labels).index(col)
+
+    def total(self):
+        return int(self.counts.sum())
+
+    # 單一維度的件數（不含空值、不含 0 件），依件數由多到少排列，同數時依類別順序
+    def counts_by(self, col, sort=True):
+        axis = self._axis(col)
+        other = tuple(i for i in range(self.counts.ndim) if i != axis)
+        totals = pd.Series(self.counts.sum(axis=other), index=self.labels[col], name="count")
+        totals = totals[totals.index.notna() & (totals > 0)]
+        totals.index.name = col
+        if sort:
+            totals = totals.sort_values(ascending=False, kind="stable")
+        return totals
+
+    def mode(self, col):
+        totals = self.counts_by(col)
+        return (totals.index[0], int(totals.iloc[0])) if not totals.empty else (None, 0)
+
+    def nunique(self, col):
+        return len(self.counts_by(col, sort=False))
+
+    # 兩個維度的交叉表（不含空值），列為 row_col、欄為 column_col
+    def pivot(self, row_col, column_col):
+        row_axis, column_axis = self._axis(row_col), self._axis(column_col)
+        other = tuple(i for i in range(self.counts.ndim) if i not in (row_axis, column_axis))
+        table = self.counts.sum(axis=other)
+        if row_axis > column_axis:
+            table = table.T
+        pivot = pd.DataFrame(table, index=self.labels[row_col], columns=self.labels[column_col])
+        pivot = pivot.loc[pivot.index.notna(), pivot.columns.notna()]
+        pivot.index.name, pivot.columns.name = row_col, column_col
+        return pivot
+
+    # 與 groupby([row_col, column_col]).size() 相同的長表格式，只保留有件數的組合
+    def long(self, row_col, column_col, name="件數"):
+        stacked = self.pivot(row_col, column_col).stack()
+        return stacked[stacked > 0].rename(name).reset_index()
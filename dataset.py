@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import estimate_size
+from cube import CUBE_AXES, PERIOD_AXIS, CountCube, PeriodCube, period_bins
+from diagnostics import stage
+from duplicates import DEFAULT_THRESHOLD, NearDuplicates
+from event_index import FilterIndex
+from schema import DATE_COLUMN
+from text_index import TextIndex
+
+
+# --- 載入後的資料集：合併後的事件表、篩選索引、件數立方體與全文索引 ---
+# 資料集放在共用快取中，各 session 只讀取、不修改
+class EventDataset:
+    def __init__(self, df, key=None, cube=None, index=None):
+        self.key = key  # 檔案內容雜湊，用來當作各種衍生結果的快取鍵
+        self.df = df
+        with stage("建立篩選索引"):
+            self.index = index if index is not None else FilterIndex(df)
+        with stage("建立件數立方體"):
+            self.cube = cube if cube is not None else CountCube.from_frame(df)
+        self._text_index = None
+        self._text_index_lock = threading.Lock()  # 多個 session 同時第一次搜尋時只建立一次
+        self._sort_orders = {}
+        self._periods = {}  # 時間單位 -> 每列所屬期間（類別欄位）
+        self._period_cubes = {}  # 時間單位 -> ((年度, 期間) × 事件類別 × 發生單位) 件數立方體
+        self._near_duplicates = {}  # 相似度門檻 -> 疑似重複群組
+        self._remapped = {}  # 欄位 -> (鍵, 合併類別後的資料集)，每個欄位只保留最近一次
+        # 增量合併時才會設定：每列的來源（工作表指紋 + 列位置）與各工作表解析結果
+        self.source = None
+        self.provenance = None
+        self.sheets = []
+        self.partial = False  # 背景解析尚未完成時的部分資料集
+
+    # 全文索引在第一次搜尋時才建立，開啟資料集時不必等待
+    @property
+    def text_index(self):
+        if self._text_index is None and "事件描述" in self.df.columns:
+            with self._text_index_lock:
+                if self._text_index is None:
+                    with stage("建立全文索引"):
+                        self._text_index = TextIndex(self.df["事件描述"])
+        return self._text_index
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def nbytes(self):
+        text_bytes = self._text_index.nbytes if self._text_index is not None else 0
+        sort_bytes = sum(order.nbytes + rank.nbytes for order, rank, _ in self._sort_orders.values())
+        sheet_bytes = sum(estimate_size(frame) for _, _, frame in self.sheets)
+        period_bytes = sum(p.codes.nbytes for p in self._periods.values())
+        period_bytes += sum(cube.nbytes for cube in self._period_cubes.values())
+        period_bytes += sum(found.nbytes for found in self._near_duplicates.values())
+        # 合併類別後的資料集與這裡共用其他欄位，只計入新的類別代碼、索引與立方體
+        period_bytes += sum(
+            d.df[col].cat.codes.nbytes + d.index.nbytes + d.cube.nbytes for col, (_, d) in self._remapped.items()
+        )
+        if self.provenance is not None:
+            sheet_bytes += self.provenance.nbytes
+        return estimate_size(self.df) + self.index.nbytes + self.cube.nbytes + text_bytes + sort_bytes + sheet_bytes + period_bytes
+
+    def rows(self, selections, base=None):
+        if base is None:
+            return self.index.select(selections)
+        return self.index.refine(base, selections)
+
+    # 依列號取出子表；列號為 None 時直接回傳原表，不複製
+    def view(self, rows):
+        return self.df if rows is None else self.df.take(rows)
+
+    # 全文搜尋事件描述，回傳命中的列號；查詢為空時回傳 None
+    def search(self, query):
+        if self.text_index is None:
+            return np.empty(0, dtype=np.int64) if TextIndex.parse_query(query) else None
+        return self.text_index.search(query)
+
+    # 疑似重複通報：第一次查看時才偵測，之後所有 session 共用；沒有事件描述欄位時回傳 None
+    # store 為跨資料集共用的簽章快取，只有沒見過的描述需要計算簽章
+    def near_duplicates(self, store=None, threshold=DEFAULT_THRESHOLD):
+        if "事件描述" not in self.df.columns:
+            return None
+        if threshold not in self._near_duplicates:
+            with stage("偵測疑似重複"):
+                self._near_duplicates[threshold] = NearDuplicates(self.df["事件描述"], store, threshold)
+        return self._near_duplicates[threshold]
+
+    # 依對照表合併類別欄位的類別，回傳新的資料集；lookup 為舊類別代碼 -> 新類別代碼
+    # 每列只需查一次代碼表；篩選索引與件數立方體直接由原本的索引與立方體合併，全文索引與疑似重複結果沿用
+    # 結果依 key 保留在資料集上，所有 session 共用
+    def remap_categories(self, col, lookup, categories, key):
+        cached = self._remapped.get(col)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        codes = self.df[col].cat.codes.to_numpy()
+        # 合併後的類別數不會比原本多，沿用原本的代碼型別；codes 為 -1（空值）時取到最後補上的 -1
+        new_codes = np.append(lookup, -1).astype(codes.dtype)[codes]
+        df = self.df.copy(deep=False)
+        values = pd.Categorical.from_codes(new_codes, categories=categories)
+        df[col] = values
+        dataset = EventDataset(
+            df, key=key, cube=self.cube.remap(col, lookup, categories), index=self.index.remap(col, lookup, values)
+        )
+        dataset._text_index = self._text_index
+        dataset._near_duplicates = self._near_duplicates
+        dataset.partial = self.partial
+        self._remapped[col] = (key, dataset)
+        return dataset
+
+    # 任意列號集合的件數立方體（例如搜尋結果），只需掃描這些列
+    def cube_for(self, rows):
+        return CountCube.from_frame(self.df, rows=rows)
+
+    # --- 月 / 週件數：日期分箱與件數立方體都在第一次查看時建立，之後所有 session 共用 ---
+    # 沒有日期欄位時回傳 None
+    def _period_frame(self, unit):
+        if DATE_COLUMN not in self.df.columns:
+            return None
+        if unit not in self._periods:
+            with stage(f"日期分箱：{unit}"):
+                self._periods[unit] = period_bins(self.df[DATE_COLUMN], unit)
+        frame = self.df[CUBE_AXES].copy(deep=False)
+        frame[PERIOD_AXIS] = self._periods[unit]
+        return frame
+
+    def period_cube(self, unit):
+        if unit not in self._period_cubes:
+            frame = self._period_frame(unit)
+            if frame is None:
+                return None
+            with stage(f"建立期間立方體：{unit}"):
+                self._period_cubes[unit] = PeriodCube.from_frame(frame)
+        return self._period_cubes[unit]
+
+    def period_cube_for(self, unit, rows):
+        frame = self._period_frame(unit)
+        return None if frame is None else PeriodCube.from_frame(frame, rows=rows)
+
+    def count(self, rows):
+        return len(self.df) if rows is None else len(rows)
+
+    def nunique(self, col, rows):
+        codes = self.index.codes[col] if rows is None else self.index.codes[col][rows]
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+
+    # 欄位排序順序：每個欄位第一次排序時算一次，之後所有 session 共用
+    # 回傳 (order, rank, n_valid)：order 為遞增排序後的列號（空值在最後），rank 為每列的名次
+    def sort_order(self, col):
+        if col not in self._sort_orders:
+            order = self.df[col].reset_index(drop=True).sort_values(kind="stable", na_position="last").index.to_numpy()
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._sort_orders[col] = (order, rank, int(self.df[col].notna().sum()))
+        return self._sort_orders[col]
+
+    # 取出排序後第 start ~ stop 筆的列號；只排序候選列的名次，不重排整張表
+    def page(self, rows, sort_col, ascending, start, stop):
+        if sort_col is None:
+            return np.arange(start, min(stop, len(self.df))) if rows is None else rows[start:stop]
+        order, rank, n_valid = self.sort_order(sort_col)
+        if rows is None:
+            if ascending:
+                return order[start:stop]
+            return np.concatenate([order[:n_valid][::-1], order[n_valid:]])[start:stop]
+        key = rank[rows]
+        if not ascending:
+            key = np.where(key < n_valid, -key, key)  # 遞減時空值仍排在最後
+        if stop < len(key):
+            head = np.argpartition(key, stop - 1)[:stop]
+            head = head[np.argsort(key[head])]
+        else:
+            head = np.argsort(key)
+        return rows[head[start:stop]]
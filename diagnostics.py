@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+from contextlib import nullcontext
+
+# --- 效能診斷：記錄每次 rerun 各階段的耗時與記憶體 ---
+# 關閉時 stage() 直接回傳同一個空的 context manager，幾乎沒有額外成本
+NULL_STAGE = nullcontext()
+PERCENTILES = [50, 90, 99]
+_local = threading.local()
+
+# tracemalloc 是整個行程共用的，會拖慢所有 session：只在有 session 正在量測記憶體的 rerun 期間開啟
+# 以 WeakSet 記錄量測中的 tracer，session 結束（tracer 被回收）或 rerun 中途結束時也不會一直開著
+_memory_lock = threading.RLock()  # 回收 tracer 時的 finalize 可能在持有鎖的執行緒中觸發
+_memory_owners = weakref.WeakSet()
+_memory_started = False  # 由這裡開啟的才由這裡關閉，外部（例如 bench.py）開啟的不動
+
+
+def _sync_memory_tracing(tracer=None, hold=False):
+    global _memory_started
+    with _memory_lock:
+        if tracer is not None:
+            if hold:
+                _memory_owners.add(tracer)
+            else:
+                _memory_owners.discard(tracer)
+        if len(_memory_owners) and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_started = True
+        elif not len(_memory_owners) and _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+
+def _rss_bytes():
+    # Linux 上讀 /proc 取得常駐記憶體，其他平台不記錄
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# 給沒有 tracer 可用的模組（例如 ingest）使用：目前執行緒有啟用中的 tracer 時才記錄
+def stage(name):
+    tracer = getattr(_local, "tracer", None)
+    if tracer is None or not tracer.enabled:
+        return NULL_STAGE
+    return tracer.stage(name)
+
+
+class _Stage:
+    __slots__ = ("tracer", "name", "start", "rss", "depth", "peak")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        tracer = self.tracer
+        self.depth = len(tracer._stack)
+        if tracer.trace_memory and tracemalloc.is_tracing():
+            # 巢狀階段共用 tracemalloc 的峰值：進入內層前先把外層目前的峰值存起來
+            current, peak = tracemalloc.get_traced_memory()
+            if tracer._stack:
+                outer = tracer._stack[-1]
+                outer.peak = max(outer.peak, peak - current)
+            tracemalloc.reset_peak()
+            self.peak = 0
+        else:
+            self.peak = None
+        tracer._stack.append(self)
+        self.rss = _rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        rss = _rss_bytes()
+        tracer = self.tracer
+        tracer._stack.pop()
+        peak = None
+        if self.peak is not None and tracemalloc.is_tracing():
+            current, traced_peak = tracemalloc.get_traced_memory()
+            peak = max(self.peak, traced_peak - current)
+            if tracer._stack and tracer._stack[-1].peak is not None:
+                tracer._stack[-1].peak = max(tracer._stack[-1].peak, peak)
+        tracer._records.append({
+            "stage": self.name,
+            "depth": self.depth,
+            "start": self.start - tracer._run_start,
+            "seconds": seconds,
+            "rss_delta_mb": (rss - self.rss) / 1024 ** 2 if rss is not None and self.rss is not None else None,
+            "peak_alloc_mb": peak / 1024 ** 2 if peak is not None else None,
+        })
+        return False
+
+
+# --- 每個 session 一個 tracer：保留最近的 rerun 紀錄，用來算各階段的百分位數 ---
+class Tracer:
+    def __init__(self, history=200):
+        self.enabled = False
+        self.trace_memory = False
+        self.runs = deque(maxlen=history)
+        self._records = []
+        self._stack = []
+        self._run_start = time.perf_counter()
+        self._run_wall = time.time()
+        weakref.finalize(self, _sync_memory_tracing)
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name)
+
+    def _flush(self, label):
+        if self._records:
+            # 紀錄是在階段結束時寫入的（內層先於外層），依開始時間重新排序
+            self._records.sort(key=lambda r: r["start"])
+            self.runs.append({"label": label, "wall_time": self._run_wall, "stages": self._records})
+        self._records = []
+        self._stack = []
+
+    def begin_run(self, enabled, trace_memory=False):
+        # 上一次整頁 rerun 結束後才發生的紀錄來自片段（fragment）重跑，另外存成一筆
+        self._flush("片段")
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        _sync_memory_tracing(self, self.trace_memory)
+        self._run_start = time.perf_counter()
+        self._run_wall = time.time()
+        _local.tracer = self if enabled else None
+
+    def end_run(self):
+        self._flush("整頁")
+        _local.tracer = None
+        _sync_memory_tracing(self, False)
+
+    def last_run(self):
+        return self.runs[-1] if self.runs else None
+
+    def clear(self):
+        self.runs.clear()
+
+    # 各階段耗時的百分位數（毫秒），依第一次出現的順序排列
+    def percentiles(self):
+        import numpy as np
+        import pandas as pd
+
+        samples = {}
+        for run in self.runs:
+            for record in run["stages"]:
+                samples.setdefault(record["stage"], []).append(record["seconds"] * 1000)
+        rows = []
+        for name, values in samples.items():
+            row = {"階段": name, "次數": len(values)}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                row[f"p{p} (ms)"] = round(float(value), 1)
+            row["最近 (ms)"] = round(values[-1], 1)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    # Chrome trace 格式，可直接在 chrome://tracing 或 Perfetto 開啟
+    def to_json(self):
+        events = []
+        for tid, run in enumerate(self.runs):
+            base = run["wall_time"] * 1_000_000
+            for record in run["stages"]:
+                events.append({
+                    "name": record["stage"],
+                    "cat": run["label"],
+                    "ph": "X",
+                    "ts": base + record["start"] * 1_000_000,
+                    "dur": record["seconds"] * 1_000_000,
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {k: v for k, v in record.items() if k.endswith("_mb") and v is not None},
+                })
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
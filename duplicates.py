@@ -0,0 +1,259 @@
+import re
+import sys
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# --- 疑似重複通報：事件描述的字元 shingle MinHash 簽章 + LSH 分段 ---
+# 同一事件以不同單號、或在兩個年度工作表重複通報時，描述通常只有少量修改；
+# 兩兩比對是平方成本，這裡只比對 LSH 同一桶中的描述，再以簽章估計的相似度確認
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+ROWS_PER_BAND = 6  # 21 段、每段 6 個雜湊值：相似度 0.8 的配對成為候選的機率約 99.8%，0.3 的幾乎不會
+BANDS = NUM_PERM // ROWS_PER_BAND
+DEFAULT_THRESHOLD = 0.8
+MIN_CHARS = 10  # 太短的描述（例如「病人跌倒」）相同也不代表同一事件，不列入比對
+BUCKET_ALL_PAIRS = 16  # LSH 桶內成員數不超過此值時比對所有配對
+BATCH_CHARS = 20_000
+BATCH_PAIRS = 100_000
+NOISE = re.compile(r"[^\w\x00]+|_+")  # 空白與標點；\x00 是批次處理時的分隔字元
+
+_rng = np.random.default_rng(20240502)
+# 第 i 個雜湊函數為 (a_i × x + b_i) mod 2^32，a_i 為奇數，對 32 位元的 shingle 雜湊值是一對一的排列
+PERM_A = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint32) | np.uint32(1)
+PERM_B = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint32)
+BAND_MIX = _rng.integers(1, 2 ** 63, ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+
+
+# 比對用的描述：全形半形統一、不分大小寫，去掉空白與標點
+# 先整批去掉標點再逐則正規化：大多數描述去掉全形標點後已是 NFKC 形式，不必再轉換
+def normalize_descriptions(texts):
+    joined = "\x00".join(str(t).replace("\x00", "") for t in texts)
+    docs = NOISE.sub("", joined).split("\x00") if len(texts) else []
+    return [
+        (doc if unicodedata.is_normalized("NFKC", doc) else NOISE.sub("", unicodedata.normalize("NFKC", doc))).lower()
+        for doc in docs
+    ]
+
+
+def _mix(x):
+    # splitmix64 的最後混合步驟，讓相鄰字元組成的 shingle 雜湊值分散
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# 每則描述的 MinHash 簽章（描述數 × NUM_PERM）；描述長度須至少 SHINGLE_SIZE 個字
+def minhash_signatures(docs):
+    signatures = np.empty((len(docs), NUM_PERM), dtype=np.uint32)
+    start = 0
+    while start < len(docs):
+        # 分批處理，避免 shingle 數 × 雜湊函數數的中間陣列過大
+        stop, size = start, 0
+        while stop < len(docs) and (size < BATCH_CHARS or stop == start):
+            size += len(docs[stop]) + 1
+            stop += 1
+        text = "\x00".join(docs[start:stop]) + "\x00"
+        chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        # 以 SHINGLE_SIZE 個連續字元組成一個 shingle（每個字元 21 位元，不會碰撞）
+        codes = np.zeros(len(chars) - SHINGLE_SIZE + 1, dtype=np.uint64)
+        valid = np.ones(len(codes), dtype=bool)
+        for offset in range(SHINGLE_SIZE):
+            part = chars[offset:offset + len(codes)]
+            codes = (codes << np.uint64(21)) | part
+            valid &= part != 0
+        doc_ids = np.cumsum(chars[:len(codes)] == 0)[valid]
+        shingles = (_mix(codes[valid]) >> np.uint64(32)).astype(np.uint32)
+        # 雜湊函數 × shingle：每個雜湊函數一列，各描述取最小值時是連續記憶體
+        hashes = PERM_A[:, None] * shingles + PERM_B[:, None]
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(doc_ids)) + 1])
+        signatures[start:stop] = np.minimum.reduceat(hashes, starts, axis=1).T
+        start = stop
+    return signatures
+
+
+# 原始描述 -> (是否列入比對, 列入比對者的簽章)；正規化後太短的描述不列入比對
+def sign_descriptions(texts):
+    docs = normalize_descriptions(texts)
+    eligible = np.array([len(doc) >= MIN_CHARS for doc in docs], dtype=bool)
+    return eligible, minhash_signatures([doc for doc, ok in zip(docs, eligible) if ok])
+
+
+# --- 簽章快取：以原始描述為鍵，跨上傳與資料集共用 ---
+# 重新上傳或增量合併時只需正規化並計算新描述的簽章；超過記憶體上限時整個清空重來
+class SignatureStore:
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._rows = {}  # 原始描述 -> _signatures 的列；不列入比對的描述為 -1
+        self._signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._bytes = 0  # 簽章與鍵（描述字串）佔用的記憶體
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.reused = 0
+        self.resets = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    # 回傳與 sign_descriptions 相同的 (是否列入比對, 簽章) 以及這次新計算的描述數
+    def signatures(self, texts):
+        with self._lock:
+            rows = np.fromiter((self._rows.get(t, -2) for t in texts), dtype=np.int64, count=len(texts))
+            # 之後新增或清空都會換成新的陣列，這裡取得的參照不會被改動
+            stored = self._signatures
+        missing = np.flatnonzero(rows == -2)
+        fresh_eligible, fresh = sign_descriptions([texts[i] for i in missing])
+
+        known = rows >= 0
+        eligible = known.copy()
+        eligible[missing] = fresh_eligible
+        position = np.cumsum(eligible) - 1
+        result = np.empty((int(eligible.sum()), NUM_PERM), dtype=np.uint32)
+        result[position[known]] = stored[rows[known]]
+        result[position[missing[fresh_eligible]]] = fresh
+
+        fresh_rows = np.cumsum(fresh_eligible) - 1
+        with self._lock:
+            self.hashed += len(missing)
+            self.reused += len(texts) - len(missing)
+            new = [(texts[i], fresh_rows[k] if fresh_eligible[k] else -1) for k, i in enumerate(missing) if texts[i] not in self._rows]
+            signed = [row for _, row in new if row >= 0]
+            size = sum(sys.getsizeof(text) for text, _ in new) + len(signed) * NUM_PERM * 4
+            if self._bytes + size > self.max_bytes:
+                self._rows, self._signatures, self._bytes = {}, self._signatures[:0], 0
+                self.resets += 1
+            if new and size <= self.max_bytes:
+                base = len(self._signatures)
+                self._signatures = np.concatenate([self._signatures, fresh[signed]])
+                slots = iter(range(base, base + len(signed)))
+                self._rows.update((text, next(slots) if row >= 0 else -1) for text, row in new)
+                self._bytes += size
+        return eligible, result, len(missing)
+
+    def stats(self):
+        with self._lock:
+            return {"docs": len(self._rows), "bytes": self._bytes, "hashed": self.hashed, "reused": self.reused, "resets": self.resets}
+
+
+# LSH：每段簽章雜湊成一個桶，同一桶中的描述成為候選配對
+# 小桶比對桶內所有配對；超過 BUCKET_ALL_PAIRS 個成員的大桶（通常是套用範本的描述）只與代表成員比對，
+# 避免候選配對數隨桶大小平方成長
+def _candidate_pairs(signatures):
+    n = len(signatures)
+    bands = signatures[:, :BANDS * ROWS_PER_BAND].reshape(n, BANDS, ROWS_PER_BAND).astype(np.uint64)
+    keys = (bands * BAND_MIX).sum(axis=2)
+
+    def encode(a, b):
+        return np.minimum(a, b).astype(np.int64) * n + np.maximum(a, b)
+
+    pairs = []
+    for band in range(BANDS):
+        order = np.argsort(keys[:, band], kind="stable")
+        sorted_keys = keys[order, band]
+        first = np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])
+        group = np.cumsum(first) - 1
+        starts = np.flatnonzero(first)
+        sizes = np.diff(np.append(starts, n))
+        small = sizes[group] <= BUCKET_ALL_PAIRS
+        # 排序後同一桶的成員相鄰：相距 d 的兩個成員在同一個小桶中就是一組配對
+        largest = int(sizes[sizes <= BUCKET_ALL_PAIRS].max()) if n else 0
+        for d in range(1, largest):
+            same = (group[d:] == group[:-d]) & small[d:]
+            pairs.append(encode(order[:-d][same], order[d:][same]))
+        # 大桶：每個成員與桶內第一個成員及排序上的前一個成員比對
+        members = ~small & ~first
+        pairs.append(encode(order[starts[group[members]]], order[members]))
+        pairs.append(encode(order[:-1][members[1:]], order[1:][members[1:]]))
+    # 多個分段都落在同一桶的配對只確認一次
+    pairs = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+    return np.stack([pairs // n, pairs % n], axis=1)
+
+
+# 以簽章中相同雜湊值的比例估計 Jaccard 相似度，分批計算避免一次展開所有候選配對
+def _similarity(signatures, pairs):
+    similarity = np.empty(len(pairs))
+    for start in range(0, len(pairs), BATCH_PAIRS):
+        batch = pairs[start:start + BATCH_PAIRS]
+        similarity[start:start + len(batch)] = (signatures[batch[:, 0]] == signatures[batch[:, 1]]).mean(axis=1)
+    return similarity
+
+
+# 以確認過的描述配對合併成群組：最小編號傳遞 + 指標跳躍，回傳每則描述所屬群組的代表編號
+def _connected(n, pairs):
+    labels = np.arange(n)
+    if not len(pairs):
+        return labels
+    left, right = pairs[:, 0], pairs[:, 1]
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+# --- 每列的疑似重複群組 ---
+# cluster：所屬群組編號（依群組第一列的順序編號），不屬於任何群組時為 -1
+# repeat：群組中第一列以外的列；收合重複時排除這些列
+class NearDuplicates:
+    def __init__(self, values, store=None, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        # 以不重複的描述為單位；正規化後相同的描述簽章相同，必定歸在同一群組
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        texts = list(uniques)
+        if store is not None:
+            eligible, signatures, self.hashed = store.signatures(texts)
+        else:
+            (eligible, signatures), self.hashed = sign_descriptions(texts), len(texts)
+        eligible = np.flatnonzero(eligible)
+        self.docs = len(eligible)
+
+        labels = np.full(len(texts) + 1, -1, dtype=np.int64)  # 最後一格對應空值描述；不列入比對的描述為 -1
+        pairs = _candidate_pairs(signatures)
+        self.candidates = len(pairs)
+        pairs = pairs[_similarity(signatures, pairs) >= threshold]
+        labels[eligible] = eligible[_connected(len(eligible), pairs)]
+
+        row_labels = labels[codes]
+        grouped = row_labels >= 0
+        groups, first, sizes = np.unique(row_labels[grouped], return_index=True, return_counts=True)
+        # 只有一列的群組不是重複；群組依第一列的位置重新編號
+        multi = sizes > 1
+        first_rows = np.flatnonzero(grouped)[first[multi]]
+        rank = np.full(len(labels), -1, dtype=np.int32)
+        rank[groups[multi][np.argsort(first_rows)]] = np.arange(int(multi.sum()), dtype=np.int32)
+        self.cluster = np.where(grouped, rank[row_labels], -1).astype(np.int32)
+        self.repeat = self.cluster >= 0
+        self.repeat[first_rows] = False
+        self.n_clusters = int(multi.sum())
+        self._kept = None
+
+    @property
+    def nbytes(self):
+        kept = self._kept.nbytes if self._kept is not None else 0
+        return self.cluster.nbytes + self.repeat.nbytes + kept
+
+    @property
+    def n_grouped(self):
+        return int(np.count_nonzero(self.cluster >= 0))
+
+    @property
+    def n_repeats(self):
+        return int(np.count_nonzero(self.repeat))
+
+    # 收合重複後保留的列號（遞增排序）
+    def kept_rows(self):
+        if self._kept is None:
+            self._kept = np.flatnonzero(~self.repeat)
+        return self._kept
@@ -0,0 +1,95 @@
+import numpy as np
+
+FILTER_COLUMNS = ["年度", "事件類別", "發生單位"]
+
+
+# --- 篩選用倒排索引：每個維度的每個類別值對應到一段排序好的列號 ---
+# 同一維度內的多個值取聯集，不同維度之間取交集；
+# 交集只檢查候選列的類別代碼，不需要掃描整張表
+class FilterIndex:
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.n_rows = len(df)
+        self.columns = list(columns)
+        self.categories = {}
+        self.codes = {}
+        self.order = {}
+        self.offsets = {}
+        for col in self.columns:
+            cat = df[col].cat
+            codes = cat.codes.to_numpy()
+            # 類別代碼 c 的列號存在 order[offsets[c + 1]:offsets[c + 2]]，空值 (-1) 排在最前面
+            counts = np.bincount(codes + 1, minlength=len(cat.categories) + 1)
+            self.categories[col] = cat.categories
+            self.codes[col] = codes
+            self.order[col] = np.argsort(codes, kind="stable").astype(np.int64)
+            self.offsets[col] = np.concatenate([[0], np.cumsum(counts)])
+
+    # 合併類別（例如單位名稱對照）：其他欄位的索引直接沿用；col 的列號依 lookup（舊代碼 -> 新代碼）
+    # 把原本各類別的區段搬到新類別的位置，只有合併了多個舊類別的新類別需要重新排序該段列號
+    def remap(self, col, lookup, values):
+        index = FilterIndex.__new__(FilterIndex)
+        index.n_rows, index.columns = self.n_rows, self.columns
+        index.categories, index.codes = dict(self.categories), dict(self.codes)
+        index.order, index.offsets = dict(self.order), dict(self.offsets)
+        index.categories[col] = values.categories
+        index.codes[col] = np.asarray(values.codes)
+
+        old_offsets = self.offsets[col]
+        sizes = np.diff(old_offsets)
+        target = np.concatenate([[0], np.asarray(lookup, dtype=np.int64) + 1])  # 空值格不變
+        new_sizes = np.bincount(target, weights=sizes, minlength=len(values.categories) + 1).astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(new_sizes)])
+        # 依新代碼排列舊區段（區段數 = 類別數），再一次搬移列號
+        slots = np.argsort(target, kind="stable")
+        lengths = sizes[slots]
+        shift = old_offsets[:-1][slots] - np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        order = self.order[col][np.repeat(shift, lengths) + np.arange(self.n_rows)]
+        for slot in np.flatnonzero(np.bincount(target, minlength=len(new_sizes)) > 1):
+            order[offsets[slot]:offsets[slot + 1]].sort()
+        index.order[col], index.offsets[col] = order, offsets
+        return index
+
+    @property
+    def nbytes(self):
+        return sum(self.order[c].nbytes + self.offsets[c].nbytes for c in self.columns)
+
+    def _value_codes(self, col, values):
+        codes = self.categories[col].get_indexer(list(values))
+        return codes[codes >= 0]
+
+    def count(self, col, values):
+        offsets = self.offsets[col]
+        codes = self._value_codes(col, values)
+        return int((offsets[codes + 2] - offsets[codes + 1]).sum())
+
+    def rows_for(self, col, values):
+        order, offsets = self.order[col], self.offsets[col]
+        parts = [order[offsets[c + 1]:offsets[c + 2]] for c in self._value_codes(col, values)]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    # 以類別代碼查表：第 0 格代表空值，篩選時一律排除（與 isin 相同）
+    def allowed(self, col, values):
+        mask = np.zeros(len(self.categories[col]) + 1, dtype=bool)
+        mask[self._value_codes(col, values) + 1] = True
+        return mask
+
+    # 在既有的候選列中再套用其他維度的條件
+    def refine(self, rows, selections):
+        active = {col: values for col, values in selections.items() if values}
+        if rows is None:
+            return self.select(active)
+        for col, values in active.items():
+            rows = rows[self.allowed(col, values)[self.codes[col][rows] + 1]]
+        return rows
+
+    # 回傳符合條件的列號（遞增排序）；沒有任何條件時回傳 None 代表全部
+    def select(self, selections):
+        active = {col: values for col, values in selections.items() if values}
+        if not active:
+            return None
+        # 從命中列數最少的維度開始，其他維度只需查候選列
+        first = min(active, key=lambda col: self.count(col, active[col]))
+        rows = self.rows_for(first, active.pop(first))
+        return self.refine(rows, active)
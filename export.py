@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+# --- 匯出格式：名稱 -> (顯示名稱, MIME, 副檔名) ---
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv", ".csv"),
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", ".parquet"),
+}
+CHUNK_ROWS = 50_000
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield start, df.iloc[start:start + chunk_rows]
+
+
+# --- 分段寫出：每次只把一段資料轉成文字/列，峰值記憶體取決於分段大小 ---
+def write_csv(df, f, chunk_rows=CHUNK_ROWS):
+    for start, chunk in _chunks(df, chunk_rows):
+        text = chunk.to_csv(index=False, header=start == 0)
+        # 只有檔案開頭需要 BOM，Excel 才能正確辨識 UTF-8 中文
+        f.write(text.encode("utf-8-sig" if start == 0 else "utf-8"))
+
+
+def write_xlsx(df, f, chunk_rows=CHUNK_ROWS):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("資料")
+    ws.append([str(c) for c in df.columns])
+    for _, chunk in _chunks(df, chunk_rows):
+        # 空值（NaN / NaT / NA）在 Excel 中寫成空白儲存格
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(f)
+
+
+def write_parquet(df, f, chunk_rows=CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for _, chunk in _chunks(df, chunk_rows):
+            # 混合型別的 object 欄位（例如尚未解析的日期）一律以字串寫出
+            mixed = {col: "string" for col in chunk.columns if chunk[col].dtype == object}
+            table = pa.Table.from_pandas(chunk.astype(mixed), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(f, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def write_export(df, fmt, f, chunk_rows=CHUNK_ROWS):
+    WRITERS[fmt](df, f, chunk_rows=chunk_rows)
+
+
+# --- 匯出檔案快取：檔案寫在暫存目錄，路徑放進 LRUCache（淘汰時刪除檔案），回傳檔案內容 ---
+# 先讀出內容再交給快取：其他 session 淘汰或快取拒收（檔案太大）時刪除檔案都不影響這次下載
+def cached_export(cache, key, fmt, frame):
+    path = cache.get(key)
+    if path is not None:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass  # 剛好被其他 session 淘汰，重新產生
+    fd, path = tempfile.mkstemp(prefix="excel-app-export-", suffix=EXPORT_FORMATS[fmt][2])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_export(frame(), fmt, f)
+        with open(path, "rb") as f:
+            data = f.read()
+    except BaseException:
+        os.remove(path)
+        raise
+    if not cache.put(key, path, size=len(data)):
+        os.remove(path)
+    return data
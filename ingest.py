@@ -0,0 +1,380 @@
+import codecs
+import csv
+import io
+import os
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import as_completed, wait
+from hashlib import sha256
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import stage
+from schema import CATEGORY_COLUMNS, TEXT_COLUMNS, compact_schema, to_category, to_text
+
+# --- 欄位設定 ---
+KEEP_COLUMNS = ["單號", "日期", "事件類別", "發生單位", "事件描述"]
+RENAME_MAP = {"發生部門": "發生單位", "通報日期": "日期"}
+
+
+# --- 核心邏輯：事件類別清洗 ---
+# 使用正則表達式只抓取「某某事件」這四個字
+EVENT_PATTERN = re.compile(r'[\u4e00-\u9fa5]{2}事件')
+OTHER_EVENT = "其他事件"
+
+
+def clean_event_category(text):
+    text = str(text).strip()
+    match = EVENT_PATTERN.search(text)
+    return match.group(0) if match else OTHER_EVENT
+
+
+# --- 向量化清洗：每個不同的原始值只跑一次正則，結果存成類別欄位 ---
+# 事件類別的原始值通常只有幾十種，但資料列可能有數十萬筆
+# memo 可跨多次呼叫共用（例如 CSV 分段讀取），已清洗過的原始值不再跑正則
+def normalize_event_categories(values, memo=None):
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    if memo is None:
+        cleaned = [clean_event_category(v) for v in uniques]
+    else:
+        cleaned = []
+        for v in uniques:
+            if v not in memo:
+                memo[v] = clean_event_category(v)
+            cleaned.append(memo[v])
+    # 空值（None / NaN）經過 str() 後一定對不到「XX事件」
+    if (codes == -1).any():
+        cleaned.append(OTHER_EVENT)
+    categories = sorted(set(cleaned))
+    position = {name: i for i, name in enumerate(categories)}
+    lookup = np.array([position[name] for name in cleaned], dtype=np.int32)
+    # codes 為 -1 時剛好取到最後一個元素，也就是上面補上的「其他事件」
+    return pd.Categorical.from_codes(lookup[codes], categories=categories)
+
+
+# --- 依標題列決定要讀取的欄位：回傳 {輸出欄名: 欄位索引} ---
+def plan_columns(header):
+    first = {}
+    for idx, name in enumerate(header):
+        if name is not None and name not in first:
+            first[name] = idx  # 重複標題只保留第一個
+
+    # 智慧對應：114年叫新事件類別，其他叫事件類別
+    target_col = "新事件類別" if "新事件類別" in first else "事件類別"
+
+    plan = {}
+    for out_name in KEEP_COLUMNS:
+        if out_name == "事件類別":
+            if target_col in first:
+                plan[out_name] = first[target_col]
+            continue
+        sources = [out_name] + [src for src, dst in RENAME_MAP.items() if dst == out_name]
+        for src in sources:
+            if src in first:
+                plan[out_name] = first[src]
+                break
+    return plan
+
+
+def _is_blank(row):
+    return all(v is None or v == "" for v in row)
+
+
+# --- 單次串流讀取一個工作表：找「單號」標題列，只取需要的欄位 ---
+def read_sheet(ws, options):
+    header_key = options["header_key"]
+    scan_rows = options["scan_rows"]
+    plan = None
+    columns = None
+    pending_blank = 0
+
+    # 唯讀模式只讀到檔案中 <dimension ref> 記載的範圍，部分報表匯出工具會寫錯，
+    # 先清掉讓 openpyxl 讀完整個工作表（pd.read_excel 也是這樣做）
+    ws.reset_dimensions()
+    for pos, row in enumerate(ws.iter_rows(values_only=True)):
+        if plan is None:
+            if pos >= scan_rows:
+                return None
+            if header_key in [str(x) for x in row]:
+                plan = plan_columns(row)
+                if not plan:
+                    return None
+                columns = {name: [] for name in plan}
+            continue
+
+        # 中間的空白列保留為空值，結尾的空白列捨棄（與 pd.read_excel 相同）
+        if _is_blank(row):
+            pending_blank += 1
+            continue
+        if pending_blank:
+            for values in columns.values():
+                values.extend([None] * pending_blank)
+            pending_blank = 0
+        width = len(row)
+        for name, idx in plan.items():
+            value = row[idx] if idx < width else None
+            columns[name].append(None if value == "" else value)
+
+    if plan is None:
+        return None
+
+    df = pd.DataFrame(columns)
+    if "事件類別" in df.columns:
+        # 重點：清理事件類別，只留「XX事件」
+        with stage("清洗事件類別"):
+            df["事件類別"] = normalize_event_categories(df["事件類別"])
+    return df
+
+
+def _sheet_warning(sheet, e):
+    return f"讀取工作表 '{sheet}' 時發生錯誤，已跳過：{str(e)}"
+
+
+# 各工作表（或各分段）的類別欄位先統一類別清單，合併後才會保持 category 型別
+def align_categories(frames, col):
+    categories = sorted(set().union(*(f[col].cat.categories for f in frames if col in f.columns)))
+    if not categories:
+        return
+    for f in frames:
+        if col in f.columns:
+            f[col] = f[col].cat.set_categories(categories)
+        else:
+            f[col] = pd.Categorical([None] * len(f), categories=categories)
+
+
+# 依 (工作表, 解析結果) 的順序合併；不改動傳入的資料表（背景解析時會重複合併同一批結果）
+def combine_sheets(results):
+    all_data = []
+    for sheet, temp_df in results:
+        if temp_df is not None:
+            all_data.append(temp_df.assign(年度=sheet))
+    if not all_data:
+        return None
+    with stage("合併工作表"):
+        align_categories(all_data, "事件類別")
+        return compact_schema(pd.concat(all_data, ignore_index=True))
+
+
+# 有行程池時各工作表平行解析；結果依工作表原本的順序合併，與循序解析一致
+def parse_workbook(data, options, executor=None):
+    results = []
+    warnings = []
+    for sheet, frame, warning in iter_workbook(data, options, executor):
+        if warning is not None:
+            warnings.append((sheet, warning))
+        else:
+            results.append((sheet, frame))
+    if executor is not None:
+        order = {sheet: i for i, sheet in enumerate(workbook_sheet_names(data))}
+        results.sort(key=lambda item: order[item[0]])
+        warnings.sort(key=lambda item: order[item[0]])
+    return combine_sheets(results), [warning for _, warning in warnings]
+
+
+# --- 逐表解析：每解析完一個工作表就交出 (工作表, 解析結果, 警告)，呼叫端可以先使用已完成的部分 ---
+# 有行程池時各工作表同時解析，依完成的順序交出
+def iter_workbook(data, options, executor=None):
+    if executor is None:
+        from openpyxl import load_workbook
+
+        with stage("開啟活頁簿"):
+            wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            for sheet in wb.sheetnames:
+                try:
+                    with stage(f"解析工作表 {sheet}"):
+                        frame = read_sheet(wb[sheet], options)
+                except Exception as e:
+                    yield sheet, None, _sheet_warning(sheet, e)
+                    continue
+                yield sheet, frame, None
+        finally:
+            wb.close()
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    futures = {}
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        futures = {executor.submit(_parse_sheet_task, path, sheet, options): sheet for sheet in workbook_sheet_names(data)}
+        for future in as_completed(futures):
+            sheet = futures[future]
+            try:
+                frame = future.result()
+            except Exception as e:
+                yield sheet, None, _sheet_warning(sheet, e)
+                continue
+            yield sheet, frame, None
+    finally:
+        # 呼叫端提早結束時，還沒開始的工作表不再解析
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        os.remove(path)
+
+
+# 只解析指定的工作表（增量合併時用），活頁簿只開啟一次
+def parse_sheets(data, sheets, options):
+    results = []
+    warnings = []
+    if not sheets:
+        return results, warnings
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        for sheet in sheets:
+            try:
+                results.append((sheet, read_sheet(wb[sheet], options)))
+            except Exception as e:
+                warnings.append(_sheet_warning(sheet, e))
+    finally:
+        wb.close()
+    return results, warnings
+
+
+# --- 工作表指紋：直接讀取 xlsx 壓縮檔內的 XML，不解析任何儲存格 ---
+# 指紋 = 工作表名稱 + 工作表 XML + 該表引用到的共用字串（依引用順序），
+# 任何一格的內容改變都會改變指紋；列數取自 <row> 標籤的數量
+XLSX_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PKG_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+SHARED_STRING_TAG = re.compile(rb"<si(?:\s[^>]*)?(?:/>|>(.*?)</si>)", re.S)
+SHARED_CELL_TAG = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+ROW_TAG = re.compile(rb"<row\b")
+
+
+def _xlsx_part(target):
+    # 關聯檔中的路徑相對於 xl/，以 / 開頭則為封裝內的絕對路徑
+    return target.lstrip("/") if target.startswith("/") else "xl/" + target
+
+
+# 只讀 workbook.xml 取得工作表名稱，不必載入共用字串與樣式
+def workbook_sheet_names(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return [node.get("name") for node in ET.fromstring(zf.read("xl/workbook.xml")).iter(f"{XLSX_MAIN_NS}sheet")]
+
+
+def sheet_fingerprints(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        rels = {}
+        shared_path = None
+        for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(f"{XLSX_PKG_NS}Relationship"):
+            rels[rel.get("Id")] = _xlsx_part(rel.get("Target"))
+            if rel.get("Type", "").endswith("/sharedStrings"):
+                shared_path = rels[rel.get("Id")]
+        shared = []
+        if shared_path is not None and shared_path in zf.namelist():
+            shared = SHARED_STRING_TAG.findall(zf.read(shared_path))
+
+        fingerprints = []
+        for node in ET.fromstring(zf.read("xl/workbook.xml")).iter(f"{XLSX_MAIN_NS}sheet"):
+            sheet = node.get("name")
+            xml = zf.read(rels[node.get(f"{XLSX_REL_NS}id")])
+            n_rows = len(ROW_TAG.findall(xml))
+            digest = sha256(sheet.encode("utf-8") + b"\x00" + xml)
+            digest.update(b"\x00".join(shared[int(i)] for i in SHARED_CELL_TAG.findall(xml)))
+            digest.update(str(n_rows).encode())
+            fingerprints.append((sheet, digest.hexdigest(), n_rows))
+    return fingerprints
+
+
+# --- 平行解析：每個工作表交給行程池中的一個子行程 ---
+# 子行程各自以唯讀模式開啟同一個暫存檔，只解析被指派的工作表
+def _parse_sheet_task(path, sheet, options):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return read_sheet(wb[sheet], options)
+    finally:
+        wb.close()
+
+
+def parse_workbook_parallel(data, options, executor, min_bytes=0):
+    # 小檔案或單一工作表時，啟動子行程的成本比解析本身還高
+    if len(data) < min_bytes or len(workbook_sheet_names(data)) < 2:
+        return parse_workbook(data, options)
+    return parse_workbook(data, options, executor)
+
+
+# --- CSV：分段讀取，峰值記憶體取決於分段大小而不是檔案大小 ---
+# 與 Excel 相同的標題列偵測、欄位對應與事件類別清洗，輸出格式也相同
+CSV_ENCODINGS = ["utf-8-sig", "cp950"]
+CSV_SAMPLE_BYTES = 256 * 1024
+
+
+def _detect_encoding(sample):
+    for encoding in CSV_ENCODINGS:
+        try:
+            # final=False：取樣結尾被截斷的多位元組字元不算錯誤
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("無法辨識 CSV 檔案的文字編碼（支援 UTF-8 與 Big5）")
+
+
+def _find_csv_header(text, options):
+    for pos, row in enumerate(csv.reader(io.StringIO(text))):
+        if pos >= options["scan_rows"]:
+            break
+        if options["header_key"] in row:
+            return pos, row
+    return -1, None
+
+
+def parse_csv(data, options, year_label, chunk_rows=100_000):
+    sample = data[:CSV_SAMPLE_BYTES]
+    encoding = _detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    header_row, header = _find_csv_header(text, options)
+    if header_row == -1:
+        return None, []
+
+    header = [name if name != "" else None for name in header]
+    plan = plan_columns(header)
+    if "年度" in header:
+        plan["年度"] = header.index("年度")
+    if not plan:
+        return None, []
+    names = {idx: name for name, idx in plan.items()}
+
+    # 以 C 解析器分段讀取，只取需要的欄位，全部先當字串讀入避免各分段推斷出不同型別
+    reader = pd.read_csv(
+        io.BytesIO(data),
+        encoding=encoding,
+        header=None,
+        skiprows=header_row + 1,
+        usecols=sorted(names),
+        dtype=str,
+        chunksize=chunk_rows,
+        engine="c",
+    )
+    memo = {}
+    chunks = []
+    for chunk in reader:
+        chunk = chunk.rename(columns=names)
+        if "事件類別" in chunk.columns:
+            chunk["事件類別"] = normalize_event_categories(chunk["事件類別"], memo=memo)
+        if "年度" not in chunk.columns:
+            chunk["年度"] = year_label
+        chunk = chunk[[c for c in KEEP_COLUMNS + ["年度"] if c in chunk.columns]]
+        # 每個分段立即轉成精簡格式，原始字串物件隨分段釋放
+        for col in CATEGORY_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = to_category(chunk[col])
+        for col in TEXT_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = to_text(chunk[col])
+        chunks.append(chunk)
+
+    if not chunks:
+        return None, []
+    for col in CATEGORY_COLUMNS:
+        align_categories(chunks, col)
+    return compact_schema(pd.concat(chunks, ignore_index=True)), []
@@ -0,0 +1,126 @@
+import threading
+import time
+
+SHEET_PENDING = "等待中"
+SHEET_DONE = "完成"
+SHEET_EMPTY = "無資料"
+SHEET_FAILED = "失敗"
+
+
+# --- 背景解析工作：在背景執行緒逐表解析活頁簿，每完成一個工作表就公開一次 ---
+# 畫面可以先用已完成的工作表建立部分資料集；全部完成後 result() 回傳完整資料集
+class IngestJob:
+    def __init__(self, key, dataset_key, data, steps):
+        from ingest import workbook_sheet_names
+
+        self.key = key
+        self.dataset_key = dataset_key
+        self.sheets = workbook_sheet_names(data)
+        self.status = {sheet: SHEET_PENDING for sheet in self.sheets}
+        self.rows = {}
+        self.warnings = []
+        self.error = None
+        self.done = False
+        self.finished_at = None
+        self.version = 0  # 每公開一個工作表加一，畫面據此判斷是否要重跑
+        self._steps = steps  # 產生 (工作表, 解析結果, 警告) 的 generator
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot = None  # (version, dataset)
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{dataset_key[:8]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for sheet, frame, warning in self._steps():
+                with self._lock:
+                    if warning is not None:
+                        self.status[sheet] = SHEET_FAILED
+                        self.warnings.append(warning)
+                    elif frame is None:
+                        self.status[sheet] = SHEET_EMPTY
+                    else:
+                        self.status[sheet] = SHEET_DONE
+                        self.rows[sheet] = len(frame)
+                        self._frames[sheet] = frame
+                    self.version += 1
+        except Exception as e:
+            with self._lock:
+                self.error = e
+        finally:
+            with self._lock:
+                self.done = True
+                self.finished_at = time.time()
+                self.version += 1
+
+    def progress(self):
+        with self._lock:
+            return [(sheet, self.status[sheet], self.rows.get(sheet)) for sheet in self.sheets], self.done
+
+    # 目前已完成工作表的資料集；同一版本只建立一次，所有 session 共用
+    # 部分資料集的鍵帶有完成的工作表數，衍生結果的快取不會和完整資料集混用
+    def snapshot(self):
+        from dataset import EventDataset
+        from ingest import combine_sheets
+
+        with self._build_lock:
+            with self._lock:
+                version, done = self.version, self.done
+                results = [(sheet, self._frames[sheet]) for sheet in self.sheets if sheet in self._frames]
+            if self._snapshot is not None and self._snapshot[0] == version:
+                return self._snapshot[1]
+            df = combine_sheets(results)
+            key = self.dataset_key if done else f"{self.dataset_key}:partial:{len(results)}"
+            dataset = EventDataset(df, key=key) if df is not None else None
+            if dataset is not None:
+                dataset.partial = not done
+            self._snapshot = (version, dataset)
+            return dataset
+
+    # 與同步解析相同的 (資料集, 警告)；只能在完成後呼叫
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.snapshot(), list(self.warnings)
+
+
+# --- 進行中的背景解析工作：同一份檔案重複上傳時接上同一個工作，不重新解析 ---
+# 完成的工作交給資料集登錄表後即移除；沒有人取走的工作保留一段時間後丟棄
+class IngestJobs:
+    def __init__(self, retention_seconds=600):
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def _prune(self):
+        now = time.time()
+        for key, job in list(self._jobs.items()):
+            if job.done and now - job.finished_at > self.retention_seconds:
+                del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(key)
+
+    # 回傳進行中的工作；沒有時呼叫 create() 建立並開始
+    def start(self, key, create):
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = create().start()
+            return job
+
+    def discard(self, key, job):
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
@@ -0,0 +1,117 @@
+import os
+from hashlib import sha256
+
+import numpy as np
+
+from aliases import DEPARTMENT_COLUMN
+from dataset import EventDataset
+from duplicates import DEFAULT_THRESHOLD
+from ingest import iter_workbook, parse_csv, parse_workbook, parse_workbook_parallel
+
+# --- 資料處理流程：解析、清洗、篩選與彙總，不依賴 Streamlit ---
+# 儀表板、批次報表與效能測試共用同一套流程，結果完全相同
+INGEST_OPTIONS = {"header_key": "單號", "scan_rows": 25}
+CSV_CHUNK_ROWS = 100_000
+DEPT_RANK_TOP = 15
+EVENT_RANK_TOP = 10
+
+
+def is_csv(name):
+    return name.lower().endswith(".csv")
+
+
+# CSV 沒有工作表名稱，年度預設取檔名
+def year_label(name):
+    return os.path.splitext(os.path.basename(name))[0] if is_csv(name) else None
+
+
+# 解析結果的快取鍵：檔案內容雜湊 + 解析設定 + CSV 的年度標籤
+def upload_key(data, name):
+    return (sha256(data).hexdigest(), tuple(sorted(INGEST_OPTIONS.items())), year_label(name))
+
+
+# 解析上傳的檔案，回傳 (資料集, 警告)；有行程池時各工作表平行解析
+def parse_upload(data, name, executor=None, min_bytes=0, csv_chunk_rows=CSV_CHUNK_ROWS):
+    key = sha256(data).hexdigest()
+    if is_csv(name):
+        # 年度取自檔名：內容相同、檔名不同的 CSV 是不同的資料集，衍生結果（例如匯出檔）不可共用
+        key = f"{key}:{year_label(name)}"
+        df, warnings = parse_csv(data, INGEST_OPTIONS, year_label(name), chunk_rows=csv_chunk_rows)
+    elif executor is not None:
+        df, warnings = parse_workbook_parallel(data, INGEST_OPTIONS, executor, min_bytes=min_bytes)
+    else:
+        df, warnings = parse_workbook(data, INGEST_OPTIONS)
+    return (EventDataset(df, key=key) if df is not None else None), warnings
+
+
+# 逐表解析（背景解析用），每完成一個工作表就交出結果
+def sheet_steps(data, executor=None):
+    return iter_workbook(data, INGEST_OPTIONS, executor)
+
+
+# --- 單位名稱對照：依對照表合併發生單位的類別；沒有任何名稱改變時回傳原資料集 ---
+def apply_aliases(dataset, table):
+    if DEPARTMENT_COLUMN not in dataset.df.columns:
+        return dataset
+    remap = table.remap(dataset.df[DEPARTMENT_COLUMN].cat.categories.tolist())
+    if remap is None:
+        return dataset
+    lookup, categories = remap
+    return dataset.remap_categories(DEPARTMENT_COLUMN, lookup, categories, key=f"{dataset.key}:aliases:{table.fingerprint}")
+
+
+# --- 篩選：同一維度內取聯集、不同維度之間取交集，全文搜尋的命中列再取交集 ---
+def intersect_rows(rows, hits):
+    if hits is None:
+        return rows
+    return hits if rows is None else np.intersect1d(rows, hits, assume_unique=True)
+
+
+# 收合疑似重複：每個群組只保留第一列；沒有事件描述欄位時回傳 None 代表全部保留
+def distinct_rows(dataset, store=None, threshold=DEFAULT_THRESHOLD):
+    duplicates = dataset.near_duplicates(store, threshold)
+    return None if duplicates is None else duplicates.kept_rows()
+
+
+# store 與 threshold 為收合疑似重複時使用的簽章快取與相似度門檻
+def select_rows(dataset, selections, query="", collapse=False, store=None, threshold=DEFAULT_THRESHOLD):
+    rows = intersect_rows(dataset.rows(selections), dataset.search(query) if query else None)
+    return intersect_rows(rows, distinct_rows(dataset, store, threshold)) if collapse else rows
+
+
+# 件數都由件數立方體切片加總；有搜尋或收合重複等篩選條件以外的限制時，只就這些資料列建立立方體
+# 這些資料列已經套用過篩選條件，再切片一次只是讓各軸的類別與未受限時相同（例如未選的年度不出現）
+def cube_view(dataset, selections, rows=None, restricted=False):
+    if restricted:
+        return dataset.cube_for(rows).select(selections)
+    return dataset.cube.select(selections)
+
+
+# 月 / 週件數：與 cube_view 相同；沒有日期欄位時回傳 None
+def period_view(dataset, unit, selections, rows=None, restricted=False):
+    cube = dataset.period_cube_for(unit, rows) if restricted else dataset.period_cube(unit)
+    return cube.select(selections) if cube is not None else None
+
+
+# --- 彙總：KPI 與各圖表使用的彙總表 ---
+def kpi_summary(counts):
+    main_risk, risk_count = counts.mode("事件類別")
+    return {
+        "總案件數": counts.total(),
+        "主要風險": main_risk,
+        "主要風險件數": risk_count,
+        "事件類別數": counts.nunique("事件類別"),
+        "發生單位數": counts.nunique("發生單位"),
+        "涵蓋年度數": counts.nunique("年度"),
+    }
+
+
+# 事件分布（圓餅圖）、事件類別與單位排名、年度件數與事件類別 × 年度趨勢
+def chart_tables(counts):
+    return {
+        "event_counts": counts.counts_by("事件類別").rename("件數").reset_index(),
+        "event_rank": counts.counts_by("事件類別").head(EVENT_RANK_TOP).rename("件數").reset_index(),
+        "dept_rank": counts.counts_by("發生單位").head(DEPT_RANK_TOP).rename("件數").reset_index(),
+        "year_counts": counts.counts_by("年度", sort=False).rename("件數").reset_index(),
+        "trend": counts.pivot("事件類別", "年度").reset_index(),
+    }
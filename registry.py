@@ -0,0 +1,105 @@
+import threading
+
+from cache import LRUCache, estimate_size
+
+
+# --- 跨 session 共用的資料集登錄表：以內容雜湊為鍵，所有 session 共用同一份唯讀資料集 ---
+# 每個 session 同一時間只持有一個資料集；正在被使用的資料集不會被淘汰，
+# 超過記憶體預算時只淘汰沒有 session 使用、最久未使用的資料集
+class DatasetRegistry(LRUCache):
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024, is_alive=None):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self.is_alive = is_alive  # session_id -> bool，用來清掉已關閉的 session
+        self._holders = {}  # key -> 持有中的 session id
+        self._sessions = {}  # session id -> key
+        self._loading = {}  # key -> 載入中的鎖，同一份檔案同時上傳時只解析一次
+
+    def refcount(self, key):
+        with self._lock:
+            return len(self._holders.get(key, ()))
+
+    def _detach(self, session_id):
+        key = self._sessions.pop(session_id, None)
+        if key is not None:
+            holders = self._holders.get(key)
+            if holders is not None:
+                holders.discard(session_id)
+                if not holders:
+                    del self._holders[key]
+
+    def _prune(self):
+        if self.is_alive is None:
+            return
+        for session_id in [s for s in self._sessions if not self.is_alive(s)]:
+            self._detach(session_id)
+
+    def release(self, session_id):
+        with self._lock:
+            self._detach(session_id)
+            self._evict()
+
+    # 取得資料集並登記為 session 持有；不在登錄表中時呼叫 load() 載入
+    def acquire(self, key, session_id, load):
+        with self._lock:
+            self._prune()
+            if self._sessions.get(session_id) != key:
+                self._detach(session_id)
+            # 先登記持有，載入後放進登錄表時才不會把自己淘汰掉
+            self._sessions[session_id] = key
+            self._holders.setdefault(key, set()).add(session_id)
+            lock = self._loading.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                value = self.get(key)
+                if value is None:
+                    value = load()
+                    self.put(key, value)
+                else:
+                    self._resize(key)
+        except BaseException:
+            with self._lock:
+                self._detach(session_id)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+                self._evict()
+        return value
+
+    # 資料集的排序順序、全文索引等是第一次使用時才建立，取用時重新估計大小
+    def _resize(self, key):
+        with self._lock:
+            if key not in self._items:
+                return
+            value, size = self._items[key]
+            new_size = estimate_size(value)
+            self._items[key] = (value, new_size)
+            self.total_bytes += new_size - size
+
+    # 持有中的資料集即使單獨就超過上限也要放入，否則每次重跑都要重新解析；
+    # 沒有 session 持有後，下一次淘汰時就會移除
+    def _admits(self, key, size):
+        return bool(self._holders.get(key)) or super()._admits(key, size)
+
+    def _evict(self):
+        for key in list(self._items):
+            if len(self._items) <= self.max_entries and self.total_bytes <= self.max_bytes:
+                break
+            if self._holders.get(key):
+                continue
+            value, size = self._items.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+            self._release(value)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats["sessions"] = len(self._sessions)
+            stats["pinned_bytes"] = sum(size for key, (_, size) in self._items.items() if self._holders.get(key))
+        return stats
+
+    # (鍵, 大小, 持有的 session 數)，由最近使用到最久未使用排列
+    def entries(self):
+        with self._lock:
+            return [(key, size, len(self._holders.get(key, ()))) for key, (_, size) in reversed(self._items.items())]
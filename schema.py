@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- 合併後事件表的內部格式 ---
+# 低基數的維度欄位用類別編碼，描述等長文字用 Arrow 字串，日期解析成 datetime
+CATEGORY_COLUMNS = ["年度", "事件類別", "發生單位"]
+TEXT_COLUMNS = ["單號", "事件描述"]
+DATE_COLUMN = "日期"
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    STRING_DTYPE = pd.StringDtype("python")
+
+
+# --- 以不重複值為單位轉成類別欄位：每個原始值只做一次 str() ---
+def to_category(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    labels = [str(u).strip() for u in uniques]
+    categories = sorted(set(labels))
+    position = {name: i for i, name in enumerate(categories)}
+    lookup = np.array([position[name] for name in labels] + [-1], dtype=np.int32)
+    # codes 為 -1 時取到 lookup 最後的 -1，維持空值
+    return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=categories), index=values.index)
+
+
+def to_text(values):
+    if values.dtype == STRING_DTYPE:
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    labels = pd.array([str(u) for u in uniques] + [pd.NA], dtype=STRING_DTYPE)
+    return pd.Series(labels.take(codes), index=values.index)
+
+
+# --- 日期：每個不同的原始值只解析一次，支援民國年字串、datetime 與 Excel 日期序號 ---
+# 例如 "113/05/02"、"113.5.2"、"113年5月2日"、"1130502"、"2024-05-02 14:30"、45414
+# 年份不到四位數時視為民國年；無法辨識的值一律視為空值，欄位固定為 datetime
+ROC_YEAR_OFFSET = 1911
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+EXCEL_SERIAL_MAX = 2958465  # 9999-12-31
+DATE_PATTERN = (
+    r"^\s*(?P<year>\d{2,4})\s*[/\-.年]\s*(?P<month>\d{1,2})\s*[/\-.月]\s*(?P<day>\d{1,2})\s*日?"
+    r"(?:[ T]+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?\s*$"
+)
+COMPACT_DATE_PATTERN = r"^\s*(?P<year>\d{3,4})(?P<month>\d{2})(?P<day>\d{2})\s*$"
+DATE_PARTS = ["year", "month", "day", "hour", "minute", "second"]
+
+
+def _parse_date_strings(strings):
+    parts = strings.str.extract(DATE_PATTERN)
+    compact = parts["year"].isna()
+    if compact.any():
+        parts.loc[compact, ["year", "month", "day"]] = strings[compact].str.extract(COMPACT_DATE_PATTERN).to_numpy()
+    parts = parts.apply(pd.to_numeric).fillna({"hour": 0, "minute": 0, "second": 0})
+    parts["year"] = parts["year"].where(parts["year"] >= 1000, parts["year"] + ROC_YEAR_OFFSET)
+    parsed = pd.to_datetime(parts[DATE_PARTS], errors="coerce")
+    # 其他寫法（例如英文月份）交給 pandas 判斷
+    rest = parsed.isna() & parts["year"].isna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(strings[rest], errors="coerce", format="mixed")
+    return parsed
+
+
+def _parse_date_values(uniques):
+    parsed = pd.Series(pd.NaT, index=range(len(uniques)), dtype="datetime64[ns]")
+    if not len(uniques):
+        return parsed
+    kinds = pd.Series([type(u) for u in uniques])
+    numbers = kinds.map(lambda t: issubclass(t, (int, float, np.number)) and not issubclass(t, (bool, np.bool_))).to_numpy()
+    strings = kinds.map(lambda t: issubclass(t, str)).to_numpy()
+    others = ~numbers & ~strings
+    if numbers.any():
+        serials = pd.Series(uniques[numbers], dtype="float64")
+        # 七、八位數的整數是 1130502 / 20240502 這種沒有分隔符號的日期，其餘視為 Excel 序號
+        digits = (serials >= 1_000_000) & (serials < 100_000_000) & (serials % 1 == 0)
+        days = serials.where(~digits & (serials >= 1) & (serials <= EXCEL_SERIAL_MAX))
+        values = EXCEL_EPOCH + pd.to_timedelta(days, unit="D")
+        if digits.any():
+            values[digits] = _parse_date_strings(serials[digits].astype("int64").astype(str))
+        parsed[numbers] = values.to_numpy()
+    if strings.any():
+        parsed[strings] = _parse_date_strings(pd.Series(uniques[strings], dtype=object)).to_numpy()
+    if others.any():
+        # datetime / date / Timestamp 等物件
+        parsed[others] = pd.to_datetime(pd.Series(uniques[others], dtype=object), errors="coerce", format="mixed").to_numpy()
+    # 民國年被當成西元年等明顯不合理的結果一律視為無法辨識
+    return parsed.where(parsed.dt.year >= 1900)
+
+
+def parse_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    result = _parse_date_values(np.asarray(uniques, dtype=object)).to_numpy(dtype="datetime64[ns]")
+    out = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]")
+    valid = codes >= 0
+    out[valid] = result[codes[valid]]
+    return pd.Series(out, index=values.index)
+
+
+def compact_schema(df):
+    df = df.copy(deep=False)
+    for col in CATEGORY_COLUMNS:
+        df[col] = to_category(df[col]) if col in df.columns else pd.Categorical([None] * len(df))
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = to_text(df[col])
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = parse_dates(df[DATE_COLUMN])
+    return df
+
+
+# --- 記憶體報告：比較原本 object 欄位與精簡格式的大小與篩選/統計耗時 ---
+def _probe(series):
+    values = series.dropna().unique()[: max(1, series.nunique() // 2)]
+    start = time.perf_counter()
+    series.isin(values)
+    series.value_counts()
+    return (time.perf_counter() - start) * 1000
+
+
+def memory_report(df):
+    rows = []
+    for col in df.columns:
+        compact = df[col]
+        legacy = compact.astype(object)
+        row = {
+            "欄位": col,
+            "型別": str(compact.dtype),
+            "原始 (MB)": legacy.memory_usage(deep=True) / 1024 ** 2,
+            "精簡 (MB)": compact.memory_usage(deep=True) / 1024 ** 2,
+        }
+        if col in CATEGORY_COLUMNS:
+            row["原始 篩選+統計 (ms)"] = _probe(legacy)
+            row["精簡 篩選+統計 (ms)"] = _probe(compact)
+        rows.append(row)
+    report = pd.DataFrame(rows)
+    total = {"欄位": "合計", "型別": "", "原始 (MB)": report["原始 (MB)"].sum(), "精簡 (MB)": report["精簡 (MB)"].sum()}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report["節省"] = 1 - report["精簡 (MB)"] / report["原始 (MB)"]
+    return report.round(3)
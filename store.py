@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+# --- 資料集儲存區：合併清洗後的事件表存成 Parquet，新 session 與重新啟動後直接開啟 ---
+# 每個資料集一個目錄：events.parquet（每個年度一個 row group）+ manifest.json（摘要與類別清單）
+# 讀取時把篩選條件下推到 Parquet，不符合的年度整個 row group 都不會讀進來
+DATA_FILE = "events.parquet"
+MANIFEST_FILE = "manifest.json"
+NAME_PATTERN = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def safe_name(name):
+    name = NAME_PATTERN.sub("_", str(name)).strip().strip(".")
+    if not name:
+        raise ValueError("資料集名稱不可空白")
+    return name
+
+
+class DatasetStore:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name, *parts):
+        return os.path.join(self.root, safe_name(name), *parts)
+
+    def list(self):
+        manifests = []
+        if not os.path.isdir(self.root):
+            return manifests
+        for entry in os.listdir(self.root):
+            manifest = self.manifest(entry)
+            if manifest is not None:
+                manifests.append(manifest)
+        # 最近儲存的排在最前面
+        return sorted(manifests, key=lambda m: m["saved_at"], reverse=True)
+
+    def manifest(self, name):
+        try:
+            with open(self._path(name, MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name, df, key=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from schema import CATEGORY_COLUMNS
+
+        name = safe_name(name)
+        os.makedirs(self.root, exist_ok=True)
+        # 先寫到暫存目錄再整個換上，讀取端不會看到寫到一半的檔案
+        staging = tempfile.mkdtemp(prefix=f".{name}-", dir=self.root)
+        try:
+            # 混合型別的 object 欄位（例如尚未解析的日期）一律以字串儲存
+            mixed = {col: "string" for col in df.columns if df[col].dtype == object}
+            df = df.astype(mixed)
+            years = df["年度"]
+            writer = None
+            row_groups = {}
+            try:
+                for year in years.cat.categories.tolist() + [None]:
+                    part = df[years.isna()] if year is None else df[years == year]
+                    if part.empty:
+                        continue
+                    table = pa.Table.from_pandas(part, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(os.path.join(staging, DATA_FILE), table.schema)
+                    writer.write_table(table)
+                    row_groups[year if year is not None else ""] = len(part)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+            manifest = {
+                "name": name,
+                "key": key,
+                "rows": len(df),
+                "saved_at": time.time(),
+                "columns": list(df.columns),
+                "row_groups": row_groups,
+                "categories": {col: df[col].cat.categories.tolist() for col in CATEGORY_COLUMNS if col in df.columns},
+            }
+            with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+            target = self._path(name)
+            backup = None
+            if os.path.exists(target):
+                backup = tempfile.mkdtemp(prefix=f".{name}-old-", dir=self.root)
+                os.replace(target, os.path.join(backup, name))
+            os.replace(staging, target)
+            if backup is not None:
+                shutil.rmtree(backup, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return manifest
+
+    def delete(self, name):
+        shutil.rmtree(self._path(name), ignore_errors=True)
+
+    # 篩選條件：欄位 -> 允許的值（與 FilterIndex 相同，空清單代表不篩選）
+    @staticmethod
+    def _filter_expression(filters):
+        import pyarrow.dataset as ds
+
+        expression = None
+        for col, values in (filters or {}).items():
+            if not values:
+                continue
+            condition = ds.field(col).isin(list(values))
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def load(self, name, filters=None, columns=None):
+        import pyarrow.dataset as ds
+
+        from schema import compact_schema
+
+        dataset = ds.dataset(self._path(name, DATA_FILE), format="parquet")
+        table = dataset.to_table(columns=columns, filter=self._filter_expression(filters))
+        # 類別欄位以 dictionary 編碼儲存，讀回來直接是 category，不需要再轉換
+        return compact_schema(table.to_pandas())
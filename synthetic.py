@@ -0,0 +1,273 @@
+import argparse
+import datetime
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+# --- 合成測試資料：格式與實際通報匯出檔相同，但內容完全隨機產生，可自由分享 ---
+# 每個民國年度一個工作表；標題列上方有報表標題等雜訊列，113 年起改用「新事件類別」，
+# 部分工作表有重複的標題名稱，事件描述為長篇中文敘述
+ROC_YEARS = ["110", "111", "112", "113", "114"]
+NEW_CATEGORY_FROM = "113"
+
+# (原始事件類別, 權重)：包含清洗前常見的各種寫法
+RAW_EVENT_LABELS = [
+    ("跌倒事件", 18), ("跌倒事件-病人跌倒", 6), ("管路事件", 10), ("管路事件(滑脫)", 6), ("藥物事件", 14),
+    ("藥物事件 ", 3), ("給藥錯誤-藥物事件", 3), ("傷害行為事件", 5), ("公共意外事件", 4), ("輸血事件", 2),
+    ("檢查檢驗事件", 4), ("醫療照護事件", 6), ("治安事件", 2), ("手術事件", 3), ("其他", 5), ("不明", 1),
+    (None, 2), (123, 1),
+]
+# 舊欄位「事件類別」在新格式中改放代碼，解析時應優先使用「新事件類別」
+LEGACY_CODES = ["A01", "A02", "B01", "B02", "C01", "Z99"]
+
+# (單位名稱, 權重)：包含同一單位的不同寫法
+DEPARTMENTS = [
+    ("7A病房", 8), ("7A 病房", 2), ("7A", 1), ("7B病房", 6), ("5B病房", 6), ("5B", 1), ("急診", 12), ("急診室", 2),
+    ("ICU", 6), ("內科加護病房", 4), ("外科加護病房", 4), ("開刀房", 5), ("手術室", 1), ("洗腎室", 3), ("門診", 6),
+    ("小兒科病房", 3), ("產房", 2), ("精神科病房", 3), ("復健科", 2), ("放射科", 3), ("檢驗科", 3), ("藥劑科", 3),
+    ("呼吸照護中心", 2), ("安寧病房", 1), ("6A病房", 4), ("6B病房", 4), ("8A病房", 3), ("9A病房", 2), (None, 1),
+]
+
+DESCRIPTION_PHRASES = [
+    "病人於夜間自行下床如廁時", "跌倒於病床旁", "家屬發現後按鈴通知護理站", "護理師到場評估意識清楚",
+    "生命徵象穩定", "頭部無明顯外傷", "已通知值班醫師到場診視", "安排頭部電腦斷層檢查", "檢查結果無異常",
+    "已衛教病人及家屬下床時需有人陪同", "床欄已拉起並放置防跌標示", "病人躁動自行拔除鼻胃管", "重新置放鼻胃管並確認位置",
+    "給藥時發現藥品劑量與醫囑不符", "即時攔截未給予病人", "已與開立醫師確認並更正醫囑", "藥局調劑時標籤貼錯",
+    "輸血前核對時發現血袋編號不符", "檢驗檢體標籤與病人身分不一致", "重新採檢並完成身分核對", "病人情緒激動出手攻擊工作人員",
+    "保全人員到場協助", "已通報主管並完成事件記錄", "走廊地面濕滑未放置警示標誌", "訪客滑倒造成膝部擦傷",
+    "手術部位標記與同意書不符", "術前暫停時發現並更正", "病人對治療方式有疑慮", "已請主治醫師再次說明",
+    "交班時未完整交代管路狀況", "後續將加強交班內容完整性", "單位已召開檢討會議", "修訂標準作業流程並進行宣導",
+    "設備警示音未被即時處理", "已請工務人員檢修設備", "病人夜間譫妄", "依約束規範予以保護性約束並定時評估",
+]
+# 偶爾夾雜英文縮寫與全形字元，測試全文檢索的正規化
+DESCRIPTION_EXTRAS = ["NG tube", "IV line", "Ｖital sign", "ICU", "CT", "Foley"]
+
+
+def _weighted(rng, pairs, size):
+    values = [value for value, _ in pairs]
+    weights = np.array([weight for _, weight in pairs], dtype=float)
+    picks = rng.choice(len(values), size=size, p=weights / weights.sum())
+    return [values[i] for i in picks]
+
+
+def _description(rng, previous):
+    # 約 2% 是前一筆描述的近似重複（同一事件被重複通報）
+    if previous is not None and rng.random() < 0.02:
+        phrases = previous.split("，")
+        phrases[rng.integers(len(phrases))] = DESCRIPTION_PHRASES[rng.integers(len(DESCRIPTION_PHRASES))]
+        return "，".join(phrases)
+    count = int(rng.integers(3, 13))
+    phrases = [DESCRIPTION_PHRASES[i] for i in rng.integers(len(DESCRIPTION_PHRASES), size=count)]
+    if rng.random() < 0.1:
+        phrases.insert(int(rng.integers(count)), DESCRIPTION_EXTRAS[rng.integers(len(DESCRIPTION_EXTRAS))])
+    return "，".join(phrases) + "。"
+
+
+# 日期混合三種寫法：民國年字串、Excel 日期儲存格、Excel 序號數字
+def _date(rng, year):
+    day = datetime.date(int(year) + 1911, 1, 1) + datetime.timedelta(days=int(rng.integers(365)))
+    kind = rng.random()
+    if kind < 0.02:
+        return None
+    if kind < 0.45:
+        return f"{year}/{day.month:02d}/{day.day:02d}"
+    if kind < 0.9:
+        return datetime.datetime(day.year, day.month, day.day)
+    return (day - datetime.date(1899, 12, 30)).days
+
+
+def sheet_header(year):
+    if year >= NEW_CATEGORY_FROM:
+        return ["單號", "日期", "新事件類別", "事件類別", "發生單位", "事件描述", "處理情形", "備註", "備註"]
+    return ["單號", "通報日期", "事件類別", "發生部門", "事件描述", "備註", "單號"]
+
+
+def sheet_rows(year, n_rows, rng):
+    header = sheet_header(year)
+    new_format = year >= NEW_CATEGORY_FROM
+    categories = _weighted(rng, RAW_EVENT_LABELS, n_rows)
+    departments = _weighted(rng, DEPARTMENTS, n_rows)
+    description = None
+    for i in range(n_rows):
+        description = _description(rng, description)
+        case_id = f"{year}-{i + 1:06d}"
+        # 約 0.5% 的單號與前一筆相同（更正後重新通報）
+        if i and rng.random() < 0.005:
+            case_id = f"{year}-{i:06d}"
+        date = _date(rng, year)
+        if new_format:
+            legacy = LEGACY_CODES[rng.integers(len(LEGACY_CODES))]
+            yield [case_id, date, categories[i], legacy, departments[i], description, "已處理", None, "追蹤中"]
+        else:
+            yield [case_id, date, categories[i], departments[i], description, None, "x"]
+        # 偶爾夾雜空白列（與實際匯出檔相同）
+        if rng.random() < 0.0005:
+            yield [None] * len(header)
+
+
+def split_rows(n_rows, years):
+    # 越新的年度件數越多
+    weights = np.arange(1, len(years) + 1, dtype=float)
+    counts = np.floor(n_rows * weights / weights.sum()).astype(int)
+    counts[-1] += n_rows - counts.sum()
+    return dict(zip(years, counts.tolist()))
+
+
+# --- 串流寫出 xlsx：與 Excel 存檔相同使用共用字串表（openpyxl 的唯讀寫入模式只會寫內嵌字串，
+# 讀取速度與實際檔案差很多），產生百萬筆資料時也不必把整張表放在記憶體中 ---
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        "{sheets}</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        "</styleSheet>"
+    ),
+}
+
+
+def _column_letter(idx):
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class _XlsxWriter:
+    def __init__(self, path):
+        self.zf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.strings = {}
+        self.sheets = []
+
+    def _cell(self, ref, value):
+        if isinstance(value, str):
+            idx = self.strings.setdefault(value, len(self.strings))
+            return f'<c r="{ref}" t="s"><v>{idx}</v></c>'
+        if isinstance(value, datetime.datetime):
+            return f'<c r="{ref}" s="1"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+        return f'<c r="{ref}"><v>{value}</v></c>'
+
+    def write_sheet(self, name, rows):
+        self.sheets.append(name)
+        with self.zf.open(f"xl/worksheets/sheet{len(self.sheets)}.xml", "w") as f:
+            f.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            buffer = []
+            for r, row in enumerate(rows, start=1):
+                cells = "".join(
+                    self._cell(f"{_column_letter(c)}{r}", value) for c, value in enumerate(row) if value is not None
+                )
+                buffer.append(f'<row r="{r}">{cells}</row>')
+                if len(buffer) >= 10_000:
+                    f.write("".join(buffer).encode("utf-8"))
+                    buffer = []
+            f.write("".join(buffer).encode("utf-8"))
+            f.write(b"</sheetData></worksheet>")
+
+    def close(self):
+        sheets = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(self.sheets) + 1)
+        )
+        self.zf.writestr("[Content_Types].xml", XLSX_PARTS["[Content_Types].xml"].format(sheets=sheets))
+        self.zf.writestr("_rels/.rels", XLSX_PARTS["_rels/.rels"])
+        self.zf.writestr("xl/styles.xml", XLSX_PARTS["xl/styles.xml"])
+        self.zf.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, name in enumerate(self.sheets, start=1))
+            + "</sheets></workbook>"
+        ))
+        n = len(self.sheets)
+        self.zf.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                      f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, n + 1))
+            + f'<Relationship Id="rId{n + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            + f'<Relationship Id="rId{n + 2}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+            + "</Relationships>"
+        ))
+        with self.zf.open("xl/sharedStrings.xml", "w") as f:
+            f.write(
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" uniqueCount="{len(self.strings)}">'.encode("utf-8")
+            )
+            # 前後有空白的字串要加 xml:space，否則讀取時空白會被去掉
+            f.write("".join(
+                f'<si><t xml:space="preserve">{escape(s)}</t></si>' if s != s.strip() else f"<si><t>{escape(s)}</t></si>"
+                for s in self.strings
+            ).encode("utf-8"))
+            f.write(b"</sst>")
+        self.zf.close()
+
+
+def write_workbook(path, n_rows, years=ROC_YEARS, seed=0):
+    rng = np.random.default_rng(seed)
+    writer = _XlsxWriter(path)
+    try:
+        for year, count in split_rows(n_rows, years).items():
+            junk = [
+                [f"○○醫院 {year} 年度異常事件通報明細"],
+                [],
+                ["製表日期", datetime.datetime(int(year) + 1912, 1, 5)],
+                ["資料來源", "病人安全通報系統", None, "機密等級", "限內部使用"],
+                sheet_header(year),
+            ]
+            writer.write_sheet(year, _chain(junk, sheet_rows(year, count, rng)))
+        writer.write_sheet("填表說明", [["本活頁簿由通報系統匯出，請勿修改欄位名稱"]])
+    finally:
+        writer.close()
+    return path
+
+
+def _chain(*parts):
+    for part in parts:
+        yield from part
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生合成的異常事件通報活頁簿")
+    parser.add_argument("output", help="輸出的 .xlsx 路徑")
+    parser.add_argument("--rows", type=int, default=10_000, help="總筆數（依年度分配到各工作表）")
+    parser.add_argument("--years", default=",".join(ROC_YEARS), help="民國年度，以逗號分隔")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_workbook(args.output, args.rows, years=args.years.split(","), seed=args.seed)
+    print(f"已產生 {args.output}（{args.rows:,} 筆）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import pytest
+
+from ingest import parse_workbook
+from pipeline import INGEST_OPTIONS
+from synthetic import write_workbook
+
+
+# 各測試共用的合成活頁簿（5,000 筆，五個年度工作表）
+@pytest.fixture(scope="session")
+def workbook(tmp_path_factory):
+    path = write_workbook(tmp_path_factory.mktemp("synthetic") / "synthetic.xlsx", 5_000)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="session")
+def events(workbook):
+    df, warnings = parse_workbook(workbook, INGEST_OPTIONS)
+    assert warnings == []
+    return df
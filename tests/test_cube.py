@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import CUBE_AXES, PERIOD_AXIS, CountCube, PeriodCube
+from dataset import EventDataset
+from incremental import merge_sheets
+
+
+def filtered(df, selections):
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in selections.items():
+        if values:
+            mask &= df[col].isin(values).to_numpy()
+    return df[mask]
+
+
+# 參考答案：篩選後直接 groupby，只保留有件數的類別，依件數由多到少、同數依類別順序
+def reference_counts(df, col):
+    counts = df.groupby(col, observed=False).size()
+    counts = counts[counts > 0].sort_values(ascending=False, kind="stable")
+    return counts
+
+
+def reference_pivot(df, row_col, column_col):
+    table = pd.crosstab(df[row_col], df[column_col], dropna=True)
+    return table.reindex(index=df[row_col].cat.categories, columns=df[column_col].cat.categories, fill_value=0)
+
+
+def assert_same_cube(actual, expected):
+    assert actual.axes == expected.axes
+    for col in expected.axes:
+        assert list(actual.labels[col]) == list(expected.labels[col])
+    np.testing.assert_array_equal(actual.counts, expected.counts)
+
+
+SELECTIONS = [
+    {},
+    {"年度": ["112"]},
+    {"年度": ["111", "114"], "事件類別": ["跌倒事件", "給藥事件"]},
+    {"發生單位": ["ICU", "急診"], "事件類別": ["跌倒事件"]},
+]
+
+
+@pytest.mark.parametrize("selections", SELECTIONS)
+def test_select_matches_groupby(events, selections):
+    view = CountCube.from_frame(events).select(selections)
+    expected = filtered(events, selections)
+    assert view.total() == len(expected)
+    for col in CUBE_AXES:
+        counts = view.counts_by(col)
+        reference = reference_counts(expected, col)
+        assert counts.index.tolist() == reference.index.tolist()
+        assert counts.tolist() == reference.tolist()
+        assert view.nunique(col) == len(reference)
+    # 有選值的維度只保留選到的類別
+    pivot = view.pivot("發生單位", "事件類別")
+    reference = reference_pivot(expected, "發生單位", "事件類別").loc[pivot.index, pivot.columns]
+    np.testing.assert_array_equal(pivot.to_numpy(), reference.to_numpy())
+
+
+def test_rows_subset_matches_frame(events):
+    rows = np.flatnonzero(events["事件描述"].str.contains("跌倒", regex=False).fillna(False).to_numpy())
+    assert_same_cube(CountCube.from_frame(events, rows=rows), CountCube.from_frame(events.iloc[rows]))
+
+
+def test_patch_matches_rebuild(events):
+    sheets = [
+        (year, f"{i:08x}", frame.reset_index(drop=True))
+        for i, (year, frame) in enumerate(events.groupby("年度", observed=True))
+    ]
+    old, _, _ = merge_sheets(sheets[:-1])
+    # 移除第一個年度、保留中間、換上最後一個年度（含新的單位名稱）
+    last = sheets[-1][2].copy()
+    last["發生單位"] = last["發生單位"].cat.rename_categories(lambda name: f"新{name}")
+    new, _, _ = merge_sheets(sheets[1:-1] + [(sheets[-1][0], "ffffffff", last)])
+
+    removed = np.flatnonzero(old["年度"].to_numpy() == sheets[0][0])
+    added = np.flatnonzero(new["年度"].to_numpy() == sheets[-1][0])
+    patched = CountCube.from_frame(old).patch(CountCube.from_frame(old, rows=removed), CountCube.from_frame(new, rows=added))
+    assert_same_cube(patched, CountCube.from_frame(new))
+
+
+def test_patch_refuses_vanished_category(events):
+    cube = CountCube.from_frame(events)
+    dropped = events[events["事件類別"] != "跌倒事件"].copy()
+    dropped["事件類別"] = dropped["事件類別"].cat.remove_unused_categories()
+    empty = np.empty(0, dtype=np.int64)
+    # 舊資料仍有跌倒事件的件數卻沒有被移除，新的類別清單又找不到，只能重建
+    assert cube.patch(CountCube.from_frame(events, rows=empty), CountCube.from_frame(dropped, rows=empty)) is None
+
+
+def test_remap_matches_rebuild(events):
+    categories = events["事件類別"].cat.categories.tolist()
+    targets = ["其他" if name in categories[:3] else name for name in categories]
+    new_categories = sorted(set(targets))
+    lookup = np.array([new_categories.index(t) for t in targets], dtype=np.int32)
+    df = events.copy(deep=False)
+    df["事件類別"] = pd.Categorical(events["事件類別"].astype(object).map(dict(zip(categories, targets))), categories=new_categories)
+    assert_same_cube(CountCube.from_frame(events).remap("事件類別", lookup, new_categories), CountCube.from_frame(df))
+
+
+# 期間立方體只存出現過的 (年度, 期間)，切片結果必須與完整的四維立方體相同
+@pytest.mark.parametrize("unit", ["月", "週"])
+@pytest.mark.parametrize("selections", SELECTIONS)
+def test_period_cube_matches_dense(events, unit, selections):
+    dataset = EventDataset(events)
+    cube = dataset.period_cube(unit)
+    assert isinstance(cube, PeriodCube)
+    frame = dataset._period_frame(unit)
+    dense = CountCube.from_frame(frame, axes=CUBE_AXES + [PERIOD_AXIS]).select(selections)
+    view = cube.select(selections)
+    assert view.total() == dense.total() == len(filtered(events, selections))
+    for row_col in ["事件類別", "發生單位"]:
+        pd.testing.assert_frame_equal(view.pivot(row_col, PERIOD_AXIS), dense.pivot(row_col, PERIOD_AXIS))
+    pd.testing.assert_series_equal(view.counts_by(PERIOD_AXIS, sort=False), dense.counts_by(PERIOD_AXIS, sort=False))
+    assert cube.nbytes < CountCube.from_frame(frame, axes=CUBE_AXES + [PERIOD_AXIS]).nbytes
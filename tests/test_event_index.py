@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aliases import AliasTable
+from dataset import EventDataset
+from event_index import FilterIndex
+from pipeline import apply_aliases
+
+
+# 參考答案：各維度 isin 後取交集，沒選值的維度不篩選
+def reference_rows(df, selections):
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in selections.items():
+        if values:
+            mask &= df[col].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def frequent(df, col, n):
+    return df[col].value_counts().index[:n].tolist()
+
+
+@pytest.fixture(scope="module")
+def index(events):
+    return FilterIndex(events)
+
+
+def test_select_matches_isin(events, index):
+    cases = [
+        {"年度": ["112"]},
+        {"事件類別": frequent(events, "事件類別", 3)},
+        {"年度": ["111", "113"], "發生單位": frequent(events, "發生單位", 4)},
+        {"年度": ["114"], "事件類別": frequent(events, "事件類別", 2), "發生單位": frequent(events, "發生單位", 5)},
+        {"發生單位": ["不存在的單位"]},
+        {"年度": ["112"], "事件類別": []},
+    ]
+    for selections in cases:
+        rows = index.select(selections)
+        np.testing.assert_array_equal(rows, reference_rows(events, selections))
+        for col, values in selections.items():
+            assert index.count(col, values or []) == int(events[col].isin(values or []).sum())
+
+
+def test_no_selection_means_all_rows(index):
+    assert index.select({}) is None
+    assert index.select({"年度": [], "事件類別": None}) is None
+
+
+def test_refine_matches_isin(events, index):
+    base = np.flatnonzero(events["事件描述"].str.contains("跌倒", regex=False).fillna(False).to_numpy())
+    selections = {"年度": ["112", "113"], "發生單位": frequent(events, "發生單位", 6)}
+    expected = np.intersect1d(base, reference_rows(events, selections))
+    np.testing.assert_array_equal(index.refine(base, selections), expected)
+    np.testing.assert_array_equal(index.refine(None, selections), reference_rows(events, selections))
+
+
+# 合併類別後的索引必須與合併後重新建立的索引完全相同
+def assert_same_index(actual, expected):
+    assert actual.columns == expected.columns
+    for col in expected.columns:
+        assert actual.categories[col].equals(expected.categories[col])
+        np.testing.assert_array_equal(actual.codes[col], expected.codes[col])
+        np.testing.assert_array_equal(actual.offsets[col], expected.offsets[col])
+        np.testing.assert_array_equal(actual.order[col], expected.order[col])
+
+
+def test_remap_matches_rebuild(events, index):
+    categories = events["發生單位"].cat.categories.tolist()
+    # 前三個單位併入第一個，其餘名稱不變；另外把最後一個改成排序在最前面的新名稱
+    targets = [categories[0]] * 3 + categories[3:-1] + ["0 合併單位"]
+    new_categories = sorted(set(targets))
+    lookup = np.array([new_categories.index(t) for t in targets], dtype=np.int32)
+    codes = events["發生單位"].cat.codes.to_numpy()
+    values = pd.Categorical.from_codes(np.append(lookup, -1)[codes], categories=new_categories)
+
+    remapped = index.remap("發生單位", lookup, values)
+    df = events.copy(deep=False)
+    df["發生單位"] = values
+    assert_same_index(remapped, FilterIndex(df))
+    assert_same_index(index, FilterIndex(events))  # 原本的索引不受影響
+
+
+def test_apply_aliases_matches_rebuild(events, tmp_path):
+    dataset = EventDataset(events, key="events")
+    categories = events["發生單位"].cat.categories.tolist()
+    table = AliasTable(tmp_path / "aliases.json")
+    table.update({categories[1]: categories[0], categories[2]: categories[0], categories[-1]: "新單位"})
+
+    aliased = apply_aliases(dataset, table)
+    expected = events["發生單位"].astype(object).replace(table.aliases)
+    assert aliased.df["發生單位"].astype(object).equals(expected)
+    assert_same_index(aliased.index, FilterIndex(aliased.df))
+    assert apply_aliases(dataset, table) is aliased  # 同一份對照表沿用上次結果
+
+    selections = {"發生單位": [categories[0], "新單位"], "年度": ["113"]}
+    np.testing.assert_array_equal(aliased.rows(selections), reference_rows(aliased.df, selections))
@@ -0,0 +1,100 @@
+import io
+import os
+import tempfile
+
+import pandas as pd
+import pytest
+
+from cache import LRUCache
+from export import cached_export, write_export
+
+
+# 與 app 相同：淘汰時刪除暫存檔；暫存目錄改到 tmp_path，才能檢查留下哪些檔案
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def export_cache(max_entries=4, max_bytes=64 * 1024 * 1024):
+    return LRUCache(max_entries=max_entries, max_bytes=max_bytes, on_evict=lambda path: os.path.exists(path) and os.remove(path))
+
+
+@pytest.fixture(scope="module")
+def frame(events):
+    return events.head(300).reset_index(drop=True)
+
+
+def expected_bytes(df, fmt):
+    out = io.BytesIO()
+    write_export(df, fmt, out)
+    return out.getvalue()
+
+
+def read_back(data, fmt):
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(data), encoding="utf-8-sig", dtype=str)
+    if fmt == "xlsx":
+        return pd.read_excel(io.BytesIO(data), dtype=str)
+    return pd.read_parquet(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx", "parquet"])
+def test_export_round_trip(export_dir, frame, fmt):
+    data = cached_export(export_cache(), "k", fmt, lambda: frame)
+    df = read_back(data, fmt)
+    assert df.columns.tolist() == frame.columns.tolist()
+    assert len(df) == len(frame)
+    assert df["單號"].fillna("").tolist() == frame["單號"].fillna("").astype(str).tolist()
+    if fmt == "csv":
+        assert data == expected_bytes(frame, fmt)
+
+
+def test_cache_hit_skips_frame(export_dir, frame):
+    cache = export_cache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return frame
+
+    first = cached_export(cache, "k", "csv", build)
+    assert cached_export(cache, "k", "csv", build) == first
+    assert len(calls) == 1
+    (path,) = [path for path in export_dir.iterdir()]
+    assert cache.get("k") == str(path)
+
+
+# 超過快取上限時不放入快取：仍回傳內容，暫存檔刪除，快取維持空的
+def test_oversize_export_returns_bytes_and_removes_file(export_dir, frame):
+    cache = export_cache(max_bytes=100)
+    data = cached_export(cache, "k", "csv", lambda: frame)
+    assert data == expected_bytes(frame, "csv")
+    assert len(cache) == 0
+    assert list(export_dir.iterdir()) == []
+
+
+# 已快取的檔案被刪除（例如被其他 session 淘汰）時重新產生
+def test_missing_cached_file_regenerated(export_dir, frame):
+    cache = export_cache()
+    data = cached_export(cache, "k", "csv", lambda: frame)
+    os.remove(cache.get("k"))
+    assert cached_export(cache, "k", "csv", lambda: frame) == data
+    assert os.path.exists(cache.get("k"))
+    assert len(list(export_dir.iterdir())) == 1
+
+
+def test_evicted_exports_delete_files(export_dir, frame):
+    cache = export_cache(max_entries=2)
+    for i in range(4):
+        cached_export(cache, i, "csv", lambda: frame.head(10 + i))
+    assert sorted(str(path) for path in export_dir.iterdir()) == sorted(cache.get(i) for i in [2, 3])
+
+
+def test_failed_export_leaves_no_file(export_dir):
+    def broken():
+        raise ValueError("資料已失效")
+
+    with pytest.raises(ValueError):
+        cached_export(export_cache(), "k", "csv", broken)
+    assert list(export_dir.iterdir()) == []
@@ -0,0 +1,119 @@
+import datetime
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from cache import LRUCache
+from cube import CountCube
+from ingest import sheet_fingerprints
+from incremental import load_incremental
+from pipeline import INGEST_OPTIONS
+
+HEADER = ["單號", "日期", "事件類別", "發生單位", "事件描述"]
+
+
+# 以 openpyxl 寫出小型活頁簿：{工作表名稱: [(單號, 事件類別, 發生單位), ...]}
+def make_workbook(sheets):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        ws.append(HEADER)
+        for i, (case_id, category, department) in enumerate(rows):
+            ws.append([case_id, datetime.datetime(2024, 1, 1) + datetime.timedelta(days=i), category, department, f"{name}-{i}"])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+FIRST = {
+    "112": [("A1", "跌倒事件", "ICU"), ("A2", "給藥事件", "急診"), ("A3", "跌倒事件", "5B")],
+    "113": [("B1", "跌倒事件", "ICU"), (None, "管路事件", "急診"), ("A2", "檢查事件", "ICU")],
+}
+# 下個月的檔案：112 不變、113 多了兩列（其中一列更正了 B1），新增 114
+SECOND = {
+    "112": FIRST["112"],
+    "113": FIRST["113"] + [("B1", "給藥事件", "5B"), (None, "跌倒事件", "ICU")],
+    "114": [("C1", "手術事件", "開刀房")],
+}
+
+
+@pytest.fixture(scope="module")
+def first():
+    dataset, warnings, summary = load_incremental(make_workbook(FIRST), INGEST_OPTIONS)
+    assert warnings == []
+    return dataset, summary
+
+
+def test_first_load_parses_every_sheet(first):
+    dataset, summary = first
+    assert summary["parsed"] == ["112", "113"]
+    assert summary["reused"] == [] and summary["kept"] == []
+    assert summary["rows"] == {"112": 4, "113": 4}  # 工作表列數，含標題列
+    assert summary["added"] == len(dataset) == 5
+    assert summary["duplicates"] == 1
+
+
+# 單號重複時保留最後出現的一筆（較後面的工作表），單號空白的列一律保留
+def test_duplicate_ids_keep_last(first):
+    df = first[0].df
+    assert df["單號"].tolist()[:3] == ["A1", "A3", "B1"]
+    assert df["單號"].isna().sum() == 1
+    row = df[df["單號"] == "A2"].iloc[0]
+    assert (row["年度"], row["事件類別"]) == ("113", "檢查事件")
+
+
+def test_reupload_parses_only_changed_sheets(first):
+    previous, _ = first
+    dataset, _, summary = load_incremental(make_workbook(SECOND), INGEST_OPTIONS, previous=previous)
+    assert summary["parsed"] == ["113", "114"]
+    assert summary["reused"] == ["112"]
+    assert summary["duplicates"] == 2
+    assert dataset.sheets[0][2] is previous.sheets[0][2]  # 沿用上一版的解析結果
+
+    # 與從頭載入的結果相同，立方體由上一版增量更新而來
+    fresh, _, _ = load_incremental(make_workbook(SECOND), INGEST_OPTIONS)
+    pd.testing.assert_frame_equal(dataset.df, fresh.df)
+    np.testing.assert_array_equal(dataset.provenance, fresh.provenance)
+    expected = CountCube.from_frame(fresh.df)
+    assert dataset.cube.axes == expected.axes
+    np.testing.assert_array_equal(dataset.cube.counts, expected.counts)
+    assert dataset.key == fresh.key
+    assert summary["removed"] == 3 and summary["added"] == 5
+
+    row = dataset.df[dataset.df["單號"] == "B1"].iloc[0]
+    assert (row["事件類別"], row["發生單位"]) == ("給藥事件", "5B")
+    assert dataset.df["單號"].isna().sum() == 2
+
+
+# 這次上傳沒有的工作表沿用上一版，排在最前面
+def test_missing_sheet_kept_from_previous(first):
+    previous, _ = first
+    dataset, _, summary = load_incremental(make_workbook({"114": SECOND["114"]}), INGEST_OPTIONS, previous=previous)
+    assert summary["parsed"] == ["114"]
+    assert summary["kept"] == ["112", "113"]
+    assert dataset.df["年度"].tolist() == ["112", "112", "113", "113", "113", "114"]
+    np.testing.assert_array_equal(dataset.cube.counts, CountCube.from_frame(dataset.df).counts)
+
+
+def test_fingerprints_follow_sheet_content():
+    first = dict((sheet, fp) for sheet, fp, _ in sheet_fingerprints(make_workbook(FIRST)))
+    second = dict((sheet, fp) for sheet, fp, _ in sheet_fingerprints(make_workbook(SECOND)))
+    assert first["112"] == second["112"]
+    assert first["113"] != second["113"]
+    # 工作表順序不同、內容相同時，合併結果的快取鍵不變
+    swapped = make_workbook({"113": FIRST["113"], "112": FIRST["112"]})
+    assert dict((sheet, fp) for sheet, fp, _ in sheet_fingerprints(swapped)) == first
+
+
+def test_sheet_cache_skips_parsing():
+    cache = LRUCache()
+    data = make_workbook(FIRST)
+    load_incremental(data, INGEST_OPTIONS, sheet_cache=cache)
+    dataset, _, summary = load_incremental(data, INGEST_OPTIONS, sheet_cache=cache)
+    assert summary["parsed"] == []
+    assert summary["reused"] == ["112", "113"]
+    assert len(dataset) == 5
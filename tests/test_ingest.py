@@ -0,0 +1,55 @@
+import datetime
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest import clean_event_category, normalize_event_categories, parse_workbook
+from pipeline import INGEST_OPTIONS
+from synthetic import RAW_EVENT_LABELS
+
+
+# 把每個工作表的 <dimension ref> 改成錯誤的範圍（部分報表匯出工具會這樣寫）
+def with_dimension(data, ref):
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            content = src.read(item.filename)
+            if item.filename.startswith("xl/worksheets/"):
+                content = content.replace(b"<sheetData>", f'<dimension ref="{ref}"/><sheetData>'.encode(), 1)
+            dst.writestr(item, content)
+    return out.getvalue()
+
+
+def test_wrong_dimension_tag_reads_whole_sheet(workbook):
+    expected, _ = parse_workbook(workbook, INGEST_OPTIONS)
+    df, warnings = parse_workbook(with_dimension(workbook, "A1:C10"), INGEST_OPTIONS)
+    assert warnings == []
+    assert "事件描述" in df.columns
+    pd.testing.assert_frame_equal(df, expected)
+
+
+# 逐列 clean_event_category 是原本的寫法，向量化版本的結果必須完全相同
+@pytest.fixture(scope="module")
+def raw_categories():
+    rng = np.random.default_rng(0)
+    values = [label for label, _ in RAW_EVENT_LABELS] + [
+        np.nan, None, pd.NA, 0, 114, 3.5, datetime.datetime(2024, 5, 2), "  跌倒事件  ", "事件", "藥物事件藥物事件",
+    ]
+    return pd.Series([values[i] for i in rng.integers(len(values), size=200_000)], dtype=object)
+
+
+def test_normalize_matches_row_by_row(raw_categories):
+    expected = raw_categories.apply(clean_event_category)
+    result = normalize_event_categories(raw_categories)
+    assert list(result.astype(object)) == expected.tolist()
+
+
+def test_normalize_with_shared_memo(raw_categories):
+    memo = {}
+    halves = [raw_categories[:100_000], raw_categories[100_000:]]
+    results = [normalize_event_categories(half, memo) for half in halves]
+    expected = raw_categories.apply(clean_event_category).tolist()
+    assert [v for result in results for v in result.astype(object)] == expected
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from cache import LRUCache
+from registry import DatasetRegistry
+
+
+# 以 numpy 陣列代表資料集，估計大小就是陣列的位元組數
+def loader(size, calls):
+    def load():
+        calls.append(size)
+        return np.zeros(size, dtype=np.uint8)
+    return load
+
+
+def test_held_dataset_over_budget_is_kept_until_released():
+    registry = DatasetRegistry(max_entries=4, max_bytes=1_000)
+    calls = []
+    first = registry.acquire("big", "s1", loader(5_000, calls))
+    # 單獨就超過上限，但有 session 持有時仍放入登錄表，重跑時不必重新載入
+    assert "big" in registry
+    assert registry.acquire("big", "s1", loader(5_000, calls)) is first
+    assert registry.acquire("big", "s2", loader(5_000, calls)) is first
+    assert calls == [5_000]
+    assert registry.refcount("big") == 2
+    assert registry.stats()["pinned_bytes"] == 5_000
+
+    registry.release("s1")
+    assert "big" in registry
+    registry.release("s2")
+    assert registry.refcount("big") == 0
+    assert "big" not in registry
+    assert registry.total_bytes == 0
+
+
+def test_unheld_datasets_evicted_least_recently_used_first():
+    registry = DatasetRegistry(max_entries=8, max_bytes=1_000)
+    registry.acquire("a", "s1", loader(400, []))
+    registry.acquire("b", "s1", loader(400, []))  # s1 改看 b，a 不再被持有
+    registry.acquire("c", "s2", loader(400, []))
+    # 超過預算時只淘汰沒有人持有的 a，持有中的 b、c 即使超過預算也保留
+    assert [key for key, _, _ in registry.entries()] == ["c", "b"]
+    assert registry.evictions == 1
+    registry.acquire("d", "s3", loader(400, []))
+    assert [key for key, _, _ in registry.entries()] == ["d", "c", "b"]
+
+    registry.release("s1")
+    assert [key for key, _, _ in registry.entries()] == ["d", "c"]
+    assert registry.total_bytes == 800
+
+
+def test_switching_dataset_moves_the_pin():
+    registry = DatasetRegistry(max_entries=8, max_bytes=10_000)
+    registry.acquire("a", "s1", loader(100, []))
+    registry.acquire("b", "s1", loader(100, []))
+    assert registry.refcount("a") == 0
+    assert registry.refcount("b") == 1
+    assert registry.stats()["sessions"] == 1
+
+
+def test_closed_sessions_are_pruned():
+    alive = {"s1", "s2"}
+    registry = DatasetRegistry(max_entries=8, max_bytes=1_000, is_alive=lambda s: s in alive)
+    registry.acquire("a", "s1", loader(800, []))
+    alive.discard("s1")  # 瀏覽器關閉，沒有呼叫 release
+    registry.acquire("b", "s2", loader(800, []))
+    assert registry.refcount("a") == 0
+    assert [key for key, _, _ in registry.entries()] == ["b"]
+
+
+def test_failed_load_releases_the_pin():
+    registry = DatasetRegistry(max_entries=8, max_bytes=1_000)
+
+    def broken():
+        raise ValueError("無法解析")
+
+    with pytest.raises(ValueError):
+        registry.acquire("a", "s1", broken)
+    assert registry.refcount("a") == 0
+    assert "a" not in registry
+    assert registry.stats()["sessions"] == 0
+
+
+# 一般快取：太大的項目拒收且不呼叫 on_evict，項目仍歸呼叫端所有
+def test_cache_refuses_oversize_without_on_evict():
+    evicted = []
+    cache = LRUCache(max_entries=2, max_bytes=100, on_evict=evicted.append)
+    assert cache.put("big", "x", size=500) is False
+    assert "big" not in cache and evicted == []
+
+    assert cache.put("a", "a", size=10)
+    assert cache.put("a", "a", size=10)  # 同一個物件重新放入不算淘汰
+    assert evicted == []
+    cache.put("b", "b", size=10)
+    cache.put("c", "c", size=10)
+    assert evicted == ["a"]
+    cache.put("b", "B", size=10)
+    assert evicted == ["a", "b"]
+    assert cache.entries() == [("b", 10), ("c", 10)]
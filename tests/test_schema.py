@@ -0,0 +1,67 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from schema import parse_dates
+
+
+def test_parse_date_formats():
+    values = pd.Series([
+        "113/05/02",
+        "113.5.2",
+        "113年5月2日",
+        " 113 / 5 / 2 ",
+        "1130502",
+        "20240502",
+        "2024/05/02",
+        "2024-05-02 14:30",
+        "113/05/02 08:05:09",
+        1130502,
+        20240502,
+        45414,
+        45414.5,
+        datetime.datetime(2024, 5, 2, 14, 30),
+        datetime.date(2024, 5, 2),
+        pd.Timestamp("2024-05-02"),
+    ], dtype=object)
+    expected = pd.to_datetime([
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02 14:30",
+        "2024-05-02 08:05:09",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02",
+        "2024-05-02 12:00",
+        "2024-05-02 14:30",
+        "2024-05-02",
+        "2024-05-02",
+    ], format="mixed")
+    parsed = parse_dates(values)
+    assert parsed.dtype == "datetime64[ns]"
+    np.testing.assert_array_equal(parsed.to_numpy(), expected.to_numpy())
+
+
+# 無法辨識、民國年被當成西元年等不合理的值一律為空值
+def test_unparseable_dates_are_nat():
+    values = pd.Series(["", "待補", "113/13/40", "1800-01-01", "99999999", None, np.nan, True, 0, -5], dtype=object)
+    assert parse_dates(values).isna().all()
+
+
+def test_repeated_values_parsed_once_keep_index():
+    values = pd.Series(["113/05/02", None, "113/05/02", "112/01/31"] * 1_000, index=range(10, 4_010))
+    parsed = parse_dates(values)
+    assert parsed.index.equals(values.index)
+    expected = pd.to_datetime(["2024-05-02", None, "2024-05-02", "2023-01-31"] * 1_000)
+    np.testing.assert_array_equal(parsed.to_numpy(), expected.to_numpy())
+
+
+def test_datetime_column_unchanged():
+    values = pd.Series(pd.to_datetime(["2024-05-02", None]))
+    assert parse_dates(values) is values
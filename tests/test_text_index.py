@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from text_index import TextIndex, normalize_text
+
+
+# 參考答案：正規化後逐列 str.contains，群組內取交集、群組之間取聯集
+def reference_search(values, query):
+    texts = pd.Series([normalize_text(v) if isinstance(v, str) else "" for v in values])
+    matched = np.zeros(len(texts), dtype=bool)
+    for group in TextIndex.parse_query(query):
+        mask = np.ones(len(texts), dtype=bool)
+        for term in group:
+            if term.strip():
+                mask &= texts.str.contains(normalize_text(term), regex=False).to_numpy() & pd.notna(values).to_numpy()
+        matched |= mask
+    return np.flatnonzero(matched)
+
+
+@pytest.fixture(scope="module")
+def descriptions(events):
+    values = events["事件描述"].astype(object)
+    # 加上全形英數、大小寫與空值，確認與參考答案使用相同的正規化
+    extra = pd.Series(["ＩＣＵ病人跌倒", "icu 給藥錯誤", "Pump 異常，已更換", None, "病人跌倒 跌倒", ""], dtype=object)
+    return pd.concat([values, extra], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def index(descriptions):
+    return TextIndex(descriptions)
+
+
+QUERIES = [
+    "跌",  # 單一字元
+    "跌倒",  # bigram
+    "床欄已拉起",  # 三個字以上需再確認連續出現
+    "病人 跌倒",
+    "跌倒 OR 給藥",
+    "跌倒 | 保全 設備",
+    '"保全人員到場"',
+    '"病人 跌倒"',
+    "icu",
+    "ＩＣＵ",
+    "PUMP",
+    "不存在的字詞",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_str_contains(descriptions, index, query):
+    np.testing.assert_array_equal(index.search(query), reference_search(descriptions, query))
+
+
+def test_empty_query_means_all_rows(index):
+    assert index.search("") is None
+    assert index.search("   ") is None
+    assert index.search("OR |") is None
+
+
+def test_parse_query():
+    assert TextIndex.parse_query('跌倒 "保全 到場" OR 給藥 | ICU') == [["跌倒", "保全 到場"], ["給藥"], ["ICU"]]
+
+
+# 分批建立索引時，跨批次合併的結果必須與一次建立相同
+def test_batches_match_single_build(descriptions, monkeypatch):
+    import text_index
+
+    expected = TextIndex(descriptions)
+    monkeypatch.setattr(text_index, "BATCH_CHARS", 5_000)
+    batched = TextIndex(descriptions)
+    for attr in ["codes", "keys", "offsets", "postings"]:
+        np.testing.assert_array_equal(getattr(batched, attr), getattr(expected, attr))
@@ -0,0 +1,143 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# 查詢語法：空白分隔的詞彙取交集，OR 或 | 分隔的群組取聯集，"..." 為完整片語
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+OR_TOKENS = {"OR", "|"}
+BATCH_CHARS = 500_000
+
+
+def normalize_text(text):
+    # 全形半形統一、英文字母不分大小寫
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+
+def _unigram_key(chars):
+    return chars.astype(np.uint64) << np.uint64(32)
+
+
+def _bigram_key(first, second):
+    return (first.astype(np.uint64) << np.uint64(32)) | second.astype(np.uint64)
+
+
+# --- 事件描述的字元 n-gram 倒排索引 ---
+# 以不重複的描述為文件單位，索引每個字元（unigram）與相鄰兩字（bigram），
+# 查詢時先取 bigram 倒排串列交集得到候選文件，再以子字串比對確認
+class TextIndex:
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        self.codes = codes.astype(np.int32)
+        self.docs = [normalize_text(u) for u in uniques]
+        self.keys, self.offsets, self.postings = self._build(self.docs)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.keys.nbytes + self.offsets.nbytes + self.postings.nbytes
+
+    # 分批建立：每批得到排序好的 (n-gram, 文件) 配對，只保留文件編號與該批各 n-gram 的件數，
+    # 最後依各 n-gram 的總件數配置倒排串列，再把各批的文件編號依序填入；
+    # 不必把全部配對接起來做一次大排序，峰值記憶體約為倒排串列大小的兩倍
+    @staticmethod
+    def _build(docs):
+        batches = []
+        start = 0
+        while start < len(docs):
+            # 分批處理，避免一次把全部文字展開成字元陣列
+            stop, size = start, 0
+            while stop < len(docs) and (size < BATCH_CHARS or stop == start):
+                size += len(docs[stop]) + 1
+                stop += 1
+            text = "\x00".join(docs[start:stop]) + "\x00"
+            chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+            doc_ids = start + np.concatenate([[0], np.cumsum(chars[:-1] == 0)]).astype(np.int32)
+            valid = chars != 0
+            pair_valid = valid[:-1] & valid[1:]
+            keys = np.concatenate([_unigram_key(chars[valid]), _bigram_key(chars[:-1][pair_valid], chars[1:][pair_valid])])
+            ids = np.concatenate([doc_ids[valid], doc_ids[:-1][pair_valid]])
+            # 同一文件內重複的 n-gram 只保留一次
+            order = np.lexsort((ids, keys))
+            keys, ids = keys[order], ids[order]
+            keep = np.ones(len(keys), dtype=bool)
+            keep[1:] = (keys[1:] != keys[:-1]) | (ids[1:] != ids[:-1])
+            keys, ids = keys[keep], ids[keep]
+            batch_keys, counts = np.unique(keys, return_counts=True)
+            batches.append((batch_keys, counts, ids))
+            start = stop
+
+        if not batches:
+            return np.empty(0, dtype=np.uint64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+        unique_keys = np.unique(np.concatenate([batch_keys for batch_keys, _, _ in batches]))
+        totals = np.zeros(len(unique_keys), dtype=np.int64)
+        for batch_keys, counts, _ in batches:
+            totals[np.searchsorted(unique_keys, batch_keys)] += counts
+        offsets = np.concatenate([[0], np.cumsum(totals)]).astype(np.int64)
+        postings = np.empty(int(offsets[-1]), dtype=np.int32)
+        filled = offsets[:-1].copy()
+        # 各批依文件順序填入，同一個 n-gram 的文件編號維持遞增
+        for i, (batch_keys, counts, ids) in enumerate(batches):
+            slots = np.searchsorted(unique_keys, batch_keys)
+            group_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            within = np.arange(len(ids)) - np.repeat(group_start, counts)
+            postings[np.repeat(filled[slots], counts) + within] = ids
+            filled[slots] += counts
+            batches[i] = None
+        return unique_keys, offsets, postings
+
+    def _posting(self, key):
+        pos = np.searchsorted(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return self.postings[self.offsets[pos]:self.offsets[pos + 1]]
+        return np.empty(0, dtype=np.int32)
+
+    # 單一詞彙（或片語）命中的文件編號
+    def _term_docs(self, term):
+        term = normalize_text(term)
+        chars = np.frombuffer(term.encode("utf-32-le"), dtype=np.uint32)
+        if len(chars) == 0:
+            return None
+        if len(chars) == 1:
+            return self._posting(_unigram_key(chars)[0])
+        keys = np.unique(_bigram_key(chars[:-1], chars[1:]))
+        postings = sorted((self._posting(k) for k in keys), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        if len(chars) == 2:
+            return candidates
+        # 三個字以上：bigram 都出現不代表連續出現，需再確認
+        return np.array([d for d in candidates if term in self.docs[d]], dtype=np.int32)
+
+    @staticmethod
+    def parse_query(query):
+        groups, current = [], []
+        for match in QUERY_TOKEN.finditer(query):
+            phrase, word = match.groups()
+            if word is not None and word.upper() in OR_TOKENS:
+                groups.append(current)
+                current = []
+            else:
+                current.append(phrase if phrase is not None else word)
+        groups.append(current)
+        return [group for group in groups if any(t.strip() for t in group)]
+
+    # 回傳符合查詢的列號（遞增排序）；查詢為空時回傳 None
+    def search(self, query):
+        groups = self.parse_query(query)
+        if not groups:
+            return None
+        matched = np.zeros(len(self.docs) + 1, dtype=bool)  # 最後一格對應空值描述
+        for group in groups:
+            docs = None
+            for term in group:
+                term_docs = self._term_docs(term)
+                if term_docs is None:
+                    continue
+                docs = term_docs if docs is None else np.intersect1d(docs, term_docs, assume_unique=True)
+            if docs is not None:
+                matched[docs] = True
+        return np.flatnonzero(matched[self.codes])